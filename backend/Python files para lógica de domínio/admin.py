@@ -1,24 +1,68 @@
-from flask import Blueprint, render_template, redirect, url_for, request, session, flash, jsonify
+from flask import Blueprint, render_template, redirect, url_for, request, session, flash, jsonify, abort
 from src.models.user import User
 from src.models.company import Company
 from src.models.service_request import ServiceRequest
+from src.services.matching import correspondent_index
+from src.services.metrics import request_status_counts, company_status_counts, invalidate_company_counts
+from src.services.rollups import rollup_report
+from src.services.search import search_service_requests
+from src.services.storage import send_document
+from src.services.state_machine import transition
+from src.services.bulk import set_profiles_status, after_profiles_commit, price_requests, summarize, BulkItem, MAX_BULK_ITEMS
+from src.services.assignment import plan_assignments, commit_plan
+from src.services.schedule import is_booked, lock_schedule
+from src.services.exports import ADMIN_EXPORT_COLUMNS, service_request_export_query, export_response
+from src.utils.pagination import paginate_request
+from src.utils.principal import invalidate_principal
+from src.utils.routing import replica_reads
+from src.utils.loading import SERVICE_REQUEST_LIST_OPTIONS, eager_loaded
 from src import db
+from sqlalchemy.orm import contains_eager
+from datetime import datetime
 
 admin_bp = Blueprint('admin', __name__)
 
+def _paginate_profiles(model, status=None):
+    # Listas de empresas/correspondentes ordenadas pela data de cadastro do usuário
+    query = model.query.join(User).options(contains_eager(model.user))
+    status = status or request.args.get('status')
+    if status:
+        query = query.filter(User.status == status)
+    # Desempate por users.id (um usuário por perfil): usa ix_users_created_at_id
+    return paginate_request(query, User.created_at, User.id,
+                            row_key=lambda profile: (profile.user.created_at, profile.user_id))
+
+def _paginate_service_requests(status=None, descending=True):
+    query = ServiceRequest.query.options(*SERVICE_REQUEST_LIST_OPTIONS)
+    status = status or request.args.get('status')
+    if status:
+        query = query.filter(ServiceRequest.status == status)
+    if request.args.get('state'):
+        query = query.filter(ServiceRequest.state == request.args['state'].upper())
+    if request.args.get('service_type'):
+        query = query.filter(ServiceRequest.service_type == request.args['service_type'])
+    return paginate_request(query, ServiceRequest.created_at, ServiceRequest.id, descending=descending)
+
 @admin_bp.route('/dashboard')
+@replica_reads
+@eager_loaded
 def dashboard():
     if 'user_id' not in session or session.get('user_role') != 'admin':
         return redirect(url_for('auth.login'))
     
     # Obter métricas para o dashboard
-    total_companies = Company.query.count()
-    pending_companies = Company.query.join(User).filter(User.status == 'pending').count()
-    total_requests = ServiceRequest.query.count()
-    pending_requests = ServiceRequest.query.filter_by(status='pending_approval').count()
+    company_counts = company_status_counts()
+    request_counts = request_status_counts()
+    
+    total_companies = sum(company_counts.values())
+    pending_companies = company_counts.get('pending', 0)
+    total_requests = sum(request_counts.values())
+    pending_requests = request_counts.get('pending_approval', 0)
     
     # Obter solicitações recentes
-    recent_requests = ServiceRequest.query.order_by(ServiceRequest.created_at.desc()).limit(5).all()
+    recent_requests = ServiceRequest.query.options(*SERVICE_REQUEST_LIST_OPTIONS).order_by(
+        ServiceRequest.created_at.desc()
+    ).limit(5).all()
     
     return render_template('admin/dashboard.html', 
                           total_companies=total_companies,
@@ -28,20 +72,24 @@ def dashboard():
                           recent_requests=recent_requests)
 
 @admin_bp.route('/companies')
+@replica_reads
+@eager_loaded
 def companies():
     if 'user_id' not in session or session.get('user_role') != 'admin':
         return redirect(url_for('auth.login'))
     
-    companies = Company.query.join(User).all()
-    return render_template('admin/companies.html', companies=companies)
+    page = _paginate_profiles(Company)
+    return render_template('admin/companies.html', companies=page.items, page=page)
 
 @admin_bp.route('/companies/pending')
+@replica_reads
+@eager_loaded
 def pending_companies():
     if 'user_id' not in session or session.get('user_role') != 'admin':
         return redirect(url_for('auth.login'))
     
-    pending_companies = Company.query.join(User).filter(User.status == 'pending').all()
-    return render_template('admin/pending_companies.html', companies=pending_companies)
+    page = _paginate_profiles(Company, status='pending')
+    return render_template('admin/pending_companies.html', companies=page.items, page=page)
 
 @admin_bp.route('/companies/<int:company_id>')
 def company_details(company_id):
@@ -62,6 +110,9 @@ def approve_company(company_id):
     user.status = 'active'
     db.session.commit()
     
+    invalidate_company_counts()
+    invalidate_principal(user.id)
+    
     flash(f'Empresa {company.company_name} aprovada com sucesso!', 'success')
     return redirect(url_for('admin.pending_companies'))
 
@@ -76,26 +127,84 @@ def reject_company(company_id):
     user.status = 'rejected'
     db.session.commit()
     
+    invalidate_company_counts()
+    invalidate_principal(user.id)
+    
     flash(f'Empresa {company.company_name} rejeitada.', 'success')
     return redirect(url_for('admin.pending_companies'))
 
+# Ações em lote sobre cadastros: ação -> status do usuário
+PROFILE_ACTIONS = {'approve': 'active', 'reject': 'rejected'}
+
+def _bulk_ids(field):
+    ids = []
+    for value in request.form.getlist(field):
+        try:
+            ids.append(int(value))
+        except ValueError:
+            continue
+    return ids
+
+def _bulk_report(items, back_endpoint):
+    summary = summarize(items)
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({
+            'summary': summary,
+            'items': [{'id': item.id, 'outcome': item.outcome, 'label': item.label, 'status': item.status}
+                      for item in items],
+        })
+    
+    flash(f"{summary.get('applied', 0)} de {len(items)} itens processados com sucesso.",
+          'success' if summary.get('applied') else 'error')
+    return render_template('admin/bulk_result.html', items=items, summary=summary,
+                          back_url=url_for(back_endpoint))
+
+def _bulk_profiles(model, field, back_endpoint):
+    status = PROFILE_ACTIONS.get(request.form.get('action'))
+    ids = _bulk_ids(field)
+    if status is None or not ids:
+        flash('Selecione os cadastros e a ação desejada.', 'error')
+        return redirect(url_for(back_endpoint))
+    if len(ids) > MAX_BULK_ITEMS:
+        flash(f'Selecione no máximo {MAX_BULK_ITEMS} cadastros por vez.', 'error')
+        return redirect(url_for(back_endpoint))
+    
+    # Todos os itens em um único UPDATE e uma única transação
+    items = set_profiles_status(model, ids, status)
+    db.session.commit()
+    
+    after_profiles_commit(model, items, status)
+    
+    return _bulk_report(items, back_endpoint)
+
+@admin_bp.route('/companies/bulk', methods=['POST'])
+def bulk_companies():
+    if 'user_id' not in session or session.get('user_role') != 'admin':
+        return redirect(url_for('auth.login'))
+    
+    return _bulk_profiles(Company, 'company_ids', 'admin.pending_companies')
+
 @admin_bp.route('/correspondents')
+@replica_reads
+@eager_loaded
 def correspondents():
     if 'user_id' not in session or session.get('user_role') != 'admin':
         return redirect(url_for('auth.login'))
     
     from src.models.correspondent import Correspondent
-    correspondents = Correspondent.query.join(User).all()
-    return render_template('admin/correspondents.html', correspondents=correspondents)
+    page = _paginate_profiles(Correspondent)
+    return render_template('admin/correspondents.html', correspondents=page.items, page=page)
 
 @admin_bp.route('/correspondents/pending')
+@replica_reads
+@eager_loaded
 def pending_correspondents():
     if 'user_id' not in session or session.get('user_role') != 'admin':
         return redirect(url_for('auth.login'))
     
     from src.models.correspondent import Correspondent
-    pending_correspondents = Correspondent.query.join(User).filter(User.status == 'pending').all()
-    return render_template('admin/pending_correspondents.html', correspondents=pending_correspondents)
+    page = _paginate_profiles(Correspondent, status='pending')
+    return render_template('admin/pending_correspondents.html', correspondents=page.items, page=page)
 
 @admin_bp.route('/correspondents/<int:correspondent_id>')
 def correspondent_details(correspondent_id):
@@ -118,24 +227,98 @@ def approve_correspondent(correspondent_id):
     user.status = 'active'
     db.session.commit()
     
+    correspondent_index.refresh(correspondent, active=True)
+    invalidate_principal(user.id)
+    
     flash(f'Correspondente aprovado com sucesso!', 'success')
     return redirect(url_for('admin.pending_correspondents'))
 
+@admin_bp.route('/correspondents/bulk', methods=['POST'])
+def bulk_correspondents():
+    if 'user_id' not in session or session.get('user_role') != 'admin':
+        return redirect(url_for('auth.login'))
+    
+    from src.models.correspondent import Correspondent
+    return _bulk_profiles(Correspondent, 'correspondent_ids', 'admin.pending_correspondents')
+
 @admin_bp.route('/service-requests')
+@replica_reads
+@eager_loaded
 def service_requests():
     if 'user_id' not in session or session.get('user_role') != 'admin':
         return redirect(url_for('auth.login'))
     
-    requests = ServiceRequest.query.all()
-    return render_template('admin/service_requests.html', requests=requests)
+    page = _paginate_service_requests()
+    return render_template('admin/service_requests.html', requests=page.items, page=page)
 
 @admin_bp.route('/service-requests/pending')
+@replica_reads
+@eager_loaded
 def pending_requests():
     if 'user_id' not in session or session.get('user_role') != 'admin':
         return redirect(url_for('auth.login'))
     
-    pending_requests = ServiceRequest.query.filter_by(status='pending_approval').all()
-    return render_template('admin/pending_requests.html', requests=pending_requests)
+    # Fila de aprovação: mais antigas primeiro
+    page = _paginate_service_requests(status='pending_approval', descending=False)
+    return render_template('admin/pending_requests.html', requests=page.items, page=page)
+
+def _search_service_requests():
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d') if request.args.get('start') else None
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d') if request.args.get('end') else None
+    except ValueError:
+        start = end = None
+    
+    return search_service_requests(request.args.get('q'),
+                                   status=request.args.get('status'),
+                                   state=request.args.get('state'),
+                                   service_type=request.args.get('service_type'),
+                                   company_id=request.args.get('company_id', type=int),
+                                   start=start,
+                                   end=end,
+                                   page=request.args.get('page', 1, type=int),
+                                   per_page=request.args.get('per_page', 20, type=int),
+                                   options=SERVICE_REQUEST_LIST_OPTIONS)
+
+@admin_bp.route('/service-requests/search')
+@replica_reads
+@eager_loaded
+def search_requests():
+    if 'user_id' not in session or session.get('user_role') != 'admin':
+        return redirect(url_for('auth.login'))
+    
+    results = _search_service_requests()
+    
+    return render_template('admin/search.html', 
+                          requests=results.items, 
+                          results=results, 
+                          query=request.args.get('q', ''),
+                          filters=request.args)
+
+@admin_bp.route('/service-requests/search.json')
+@replica_reads
+@eager_loaded
+def search_requests_json():
+    if 'user_id' not in session or session.get('user_role') != 'admin':
+        return jsonify({'error': 'Não autorizado'}), 401
+    
+    results = _search_service_requests()
+    
+    return jsonify({
+        'page': results.page,
+        'per_page': results.per_page,
+        'has_next': results.has_next,
+        'results': [{
+            'id': r.id,
+            'service_type': r.service_type,
+            'status': r.status,
+            'city': r.city,
+            'state': r.state,
+            'date_time': r.date_time.isoformat(),
+            'company': r.company.company_name if r.company else None,
+            'documents': [d.file_name for d in r.documents],
+        } for r in results.items],
+    })
 
 @admin_bp.route('/service-requests/<int:request_id>')
 def request_details(request_id):
@@ -150,63 +333,236 @@ def set_request_value(request_id):
     if 'user_id' not in session or session.get('user_role') != 'admin':
         return redirect(url_for('auth.login'))
     
-    service_request = ServiceRequest.query.get_or_404(request_id)
+    company_value = float(request.form.get('company_value'))
     
-    if service_request.status != 'pending_approval':
+    # Define o valor e aprova em um único UPDATE condicional
+    result = transition(request_id, 'approve', values={'company_value': company_value})
+    
+    if result.not_found:
+        abort(404)
+    
+    if result.conflict:
         flash('Apenas solicitações pendentes podem ter valor definido.', 'error')
         return redirect(url_for('admin.request_details', request_id=request_id))
     
-    company_value = float(request.form.get('company_value'))
-    
-    service_request.company_value = company_value
-    service_request.status = 'approved'
     db.session.commit()
     
     flash('Valor definido e solicitação aprovada com sucesso!', 'success')
     return redirect(url_for('admin.request_details', request_id=request_id))
 
-@admin_bp.route('/service-requests/<int:request_id>/assign', methods=['GET', 'POST'])
-def assign_correspondent(request_id):
+@admin_bp.route('/service-requests/bulk-price', methods=['POST'])
+def bulk_set_request_values():
     if 'user_id' not in session or session.get('user_role') != 'admin':
         return redirect(url_for('auth.login'))
     
-    service_request = ServiceRequest.query.get_or_404(request_id)
+    ids = _bulk_ids('request_ids')
+    if not ids:
+        flash('Selecione as solicitações a aprovar.', 'error')
+        return redirect(url_for('admin.pending_requests'))
+    if len(ids) > MAX_BULK_ITEMS:
+        flash(f'Selecione no máximo {MAX_BULK_ITEMS} solicitações por vez.', 'error')
+        return redirect(url_for('admin.pending_requests'))
     
-    if service_request.status != 'approved':
-        flash('Apenas solicitações aprovadas podem receber atribuições.', 'error')
-        return redirect(url_for('admin.request_details', request_id=request_id))
+    # Valor individual (company_value_<id>) ou um valor comum a todas (company_value)
+    values = {}
+    invalid = []
+    for request_id in dict.fromkeys(ids):
+        try:
+            values[request_id] = float(request.form.get(f'company_value_{request_id}') or request.form['company_value'])
+        except (KeyError, ValueError):
+            invalid.append(BulkItem(request_id, 'invalid_value'))
+    
+    # Define os valores e aprova em um único UPDATE condicional
+    items = price_requests(values) if values else []
+    db.session.commit()
+    
+    return _bulk_report(items + invalid, 'admin.pending_requests')
+
+@admin_bp.route('/service-requests/<int:request_id>/assign', methods=['GET', 'POST'])
+def assign_correspondent(request_id):
+    if 'user_id' not in session or session.get('user_role') != 'admin':
+        return redirect(url_for('auth.login'))
     
     if request.method == 'POST':
-        from src.models.correspondent import Correspondent
-        
         correspondent_id = request.form.get('correspondent_id')
         correspondent_value = float(request.form.get('correspondent_value'))
         instructions = request.form.get('instructions')
         
-        correspondent = Correspondent.query.get(correspondent_id)
+        # O lock no correspondente serializa atribuições concorrentes para ele
+        correspondent = lock_schedule(correspondent_id)
         if not correspondent:
             flash('Correspondente não encontrado.', 'error')
             return redirect(url_for('admin.assign_correspondent', request_id=request_id))
         
-        service_request.correspondent_id = correspondent_id
-        service_request.correspondent_value = correspondent_value
-        service_request.profit_margin = service_request.company_value - correspondent_value
-        service_request.instructions = instructions
-        service_request.status = 'assigned'
+        # Atribuição atômica: falha se a solicitação deixou de estar aprovada
+        result = transition(request_id, 'assign', values={
+            'correspondent_id': correspondent.id,
+            'correspondent_value': correspondent_value,
+            'profit_margin': ServiceRequest.company_value - correspondent_value,
+            'instructions': instructions,
+        })
+        
+        if result.not_found:
+            abort(404)
+        
+        if result.conflict:
+            flash('Apenas solicitações aprovadas podem receber atribuições.', 'error')
+            return redirect(url_for('admin.request_details', request_id=request_id))
+        
+        # O correspondente não pode ter outro serviço no mesmo horário
+        if is_booked(correspondent.id, result.date_time, result.service_type, exclude=request_id):
+            db.session.rollback()
+            flash('O correspondente já tem outro serviço neste horário.', 'error')
+            return redirect(url_for('admin.assign_correspondent', request_id=request_id))
+        
         db.session.commit()
         
         flash('Correspondente atribuído com sucesso!', 'success')
         return redirect(url_for('admin.request_details', request_id=request_id))
     
     from src.models.correspondent import Correspondent
-    correspondents = Correspondent.query.join(User).filter(User.status == 'active').all()
+    
+    service_request = ServiceRequest.query.get_or_404(request_id)
+    
+    if service_request.status != 'approved':
+        flash('Apenas solicitações aprovadas podem receber atribuições.', 'error')
+        return redirect(url_for('admin.request_details', request_id=request_id))
+    
+    # Obter lista curta de correspondentes a partir do índice em memória
+    matches = correspondent_index.shortlist_for(service_request,
+                                                specialty=request.args.get('specialty'),
+                                                limit=request.args.get('limit', 10, type=int))
+    loaded = {c.id: c for c in Correspondent.query.filter(
+        Correspondent.id.in_([m.correspondent_id for m in matches])
+    ).all()} if matches else {}
+    correspondents = [loaded[m.correspondent_id] for m in matches if m.correspondent_id in loaded]
+    
     return render_template('admin/assign_correspondent.html', 
                           request=service_request, 
-                          correspondents=correspondents)
+                          correspondents=correspondents,
+                          matches=matches)
+
+@admin_bp.route('/service-requests/auto-assign', methods=['GET', 'POST'])
+def auto_assign():
+    if 'user_id' not in session or session.get('user_role') != 'admin':
+        return redirect(url_for('auth.login'))
+    
+    if request.method == 'POST':
+        # Recalcula o plano (limitado às solicitações marcadas, se houver) e aplica
+        ids = _bulk_ids('request_ids')
+        if len(ids) > MAX_BULK_ITEMS:
+            flash(f'Selecione no máximo {MAX_BULK_ITEMS} solicitações por vez.', 'error')
+            return redirect(url_for('admin.auto_assign'))
+        
+        plan = plan_assignments(ids or None)
+        results = commit_plan(plan)
+        db.session.commit()
+        
+        items = [BulkItem(result_id, result.outcome, status=result.current_status or result.status)
+                 for result_id, result in zip([p.service_request_id for p in plan.proposals], results)]
+        items += [BulkItem(request_id, 'no_candidate') for request_id in plan.unassigned]
+        return _bulk_report(items, 'admin.auto_assign')
+    
+    # Apenas a proposta, sem alterar nada
+    plan = plan_assignments()
+    
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({
+            'solver': plan.solver,
+            'elapsed_ms': round(plan.elapsed_ms, 1),
+            'total_margin': plan.total_margin,
+            'proposals': [{'service_request_id': p.service_request_id, 'correspondent_id': p.correspondent_id,
+                           'correspondent_value': p.correspondent_value, 'company_value': p.company_value,
+                           'profit_margin': p.profit_margin, 'same_city': p.same_city}
+                          for p in plan.proposals],
+            'unassigned': plan.unassigned,
+        })
+    
+    return render_template('admin/auto_assign.html', plan=plan)
+
+@admin_bp.route('/documents/<int:document_id>/download')
+def download_document(document_id):
+    if 'user_id' not in session or session.get('user_role') != 'admin':
+        return redirect(url_for('auth.login'))
+    
+    from src.models.document import Document
+    document = Document.query.get_or_404(document_id)
+    return send_document(document, as_attachment=request.args.get('download') == '1')
 
 @admin_bp.route('/reports')
+@replica_reads
 def reports():
     if 'user_id' not in session or session.get('user_role') != 'admin':
         return redirect(url_for('auth.login'))
     
-    return render_template('admin/reports.html')
+    # Relatórios financeiros a partir da tabela de consolidação
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m') if request.args.get('start') else None
+        end = datetime.strptime(request.args['end'], '%Y-%m') if request.args.get('end') else None
+    except ValueError:
+        flash('Período inválido. Use o formato AAAA-MM.', 'error')
+        start = end = None
+    
+    filters = {
+        'status': request.args.get('status', 'completed'),
+        'start': start,
+        'end': end,
+        'state': request.args.get('state'),
+        'service_type': request.args.get('service_type'),
+        'company_id': request.args.get('company_id', type=int),
+    }
+    
+    return render_template('admin/reports.html',
+                          totals=rollup_report([], **filters),
+                          by_month=rollup_report(['month'], **filters),
+                          by_state=rollup_report(['state'], **filters),
+                          by_service_type=rollup_report(['service_type'], **filters),
+                          filters=request.args)
+
+@admin_bp.route('/reports/service-requests.<fmt>')
+@replica_reads
+def export_service_requests(fmt):
+    if 'user_id' not in session or session.get('user_role') != 'admin':
+        return redirect(url_for('auth.login'))
+    
+    query = service_request_export_query(ADMIN_EXPORT_COLUMNS)
+    return export_response(query, ADMIN_EXPORT_COLUMNS, fmt, 'solicitacoes')
+
+@admin_bp.route('/jobs')
+@replica_reads
+def jobs():
+    if 'user_id' not in session or session.get('user_role') != 'admin':
+        return redirect(url_for('auth.login'))
+    
+    from src.models.job import Job
+    
+    counts = dict(db.session.query(Job.status, db.func.count(Job.id)).group_by(Job.status).all())
+    
+    query = Job.query
+    if request.args.get('status'):
+        query = query.filter(Job.status == request.args['status'])
+    if request.args.get('task'):
+        query = query.filter(Job.task == request.args['task'])
+    jobs = paginate_request(query, Job.created_at, Job.id)
+    
+    return render_template('admin/jobs.html', jobs=jobs.items, page=jobs, counts=counts)
+
+@admin_bp.route('/jobs/<int:job_id>/retry', methods=['POST'])
+def retry_job(job_id):
+    if 'user_id' not in session or session.get('user_role') != 'admin':
+        return redirect(url_for('auth.login'))
+    
+    from src.models.job import Job
+    from src.services.jobs import retry_job as requeue
+    
+    job = Job.query.get_or_404(job_id)
+    
+    if job.status != 'failed':
+        flash('Apenas tarefas com falha podem ser executadas novamente.', 'error')
+        return redirect(url_for('admin.jobs'))
+    
+    requeue(job)
+    db.session.commit()
+    
+    flash('Tarefa recolocada na fila.', 'success')
+    return redirect(url_for('admin.jobs', status='failed'))
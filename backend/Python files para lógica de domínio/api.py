@@ -0,0 +1,340 @@
+from flask import Blueprint, request, session, jsonify, g, abort
+from sqlalchemy import func, inspect
+from sqlalchemy.orm import joinedload, selectinload
+from src.models.company import Company
+from src.models.correspondent import Correspondent
+from src.models.document import Document
+from src.models.service_request import ServiceRequest
+from src.models.user import User
+from src.services.changes import changes_since
+from src.services.metrics import request_status_counts, company_status_counts
+from src.utils.conditional import weak_etag, conditional
+from src.utils.pagination import paginate_request
+from src.utils.principal import PROFILE_RELATIONSHIPS, load_principal
+from src.utils.routing import replica_reads
+from src.utils.loading import eager_loaded
+from src import db
+from werkzeug.exceptions import HTTPException
+from datetime import date, datetime
+from functools import wraps
+
+api_bp = Blueprint('api', __name__)
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def _company_summary(r):
+    return {'id': r.company.id, 'name': r.company.company_name} if r.company else None
+
+
+def _correspondent_summary(r):
+    return {'id': r.correspondent.id, 'name': r.correspondent.user.name} if r.correspondent else None
+
+
+def _document(d):
+    return {'id': d.id, 'type': d.type, 'file_name': d.file_name, 'file_size': d.file_size,
+            'status': d.status, 'created_at': _iso(d.created_at)}
+
+
+def _documents(r):
+    return [_document(d) for d in r.documents]
+
+
+# Campos disponíveis para solicitações (?fields=id,status,...)
+SERVICE_REQUEST_FIELDS = {
+    'id': lambda r: r.id,
+    'service_type': lambda r: r.service_type,
+    'status': lambda r: r.status,
+    'city': lambda r: r.city,
+    'state': lambda r: r.state,
+    'date_time': lambda r: _iso(r.date_time),
+    'deadline': lambda r: _iso(r.deadline),
+    'details': lambda r: r.details,
+    'instructions': lambda r: r.instructions,
+    'company_value': lambda r: r.company_value,
+    'correspondent_value': lambda r: r.correspondent_value,
+    'profit_margin': lambda r: r.profit_margin,
+    'company': _company_summary,
+    'correspondent': _correspondent_summary,
+    'documents': _documents,
+    'created_at': lambda r: _iso(r.created_at),
+    'updated_at': lambda r: _iso(r.updated_at),
+}
+
+# Campos que cada papel não pode ver
+HIDDEN_FIELDS = {
+    'admin': set(),
+    'company': {'correspondent_value', 'profit_margin'},
+    'correspondent': {'company_value', 'profit_margin'},
+}
+
+DEFAULT_LIST_FIELDS = ('id', 'service_type', 'status', 'city', 'state', 'date_time', 'updated_at')
+
+# Relacionamentos carregados apenas quando o campo é pedido
+FIELD_LOAD_OPTIONS = {
+    'company': joinedload(ServiceRequest.company),
+    'correspondent': joinedload(ServiceRequest.correspondent).joinedload(Correspondent.user),
+    'documents': selectinload(ServiceRequest.documents),
+}
+
+USER_PROFILE_FIELDS = ('id', 'name', 'email', 'role', 'status', 'phone', 'created_at', 'last_login')
+
+
+@api_bp.errorhandler(HTTPException)
+def _http_error(e):
+    return jsonify({'error': e.description}), e.code
+
+
+def api_role_required(*roles):
+    """
+    Equivalente a role_required para a API: responde 401/403 em JSON em vez de
+    redirecionar e aceita mais de um papel. Disponibiliza g.user, g.profile e g.role.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            role = session.get('user_role')
+            if 'user_id' not in session:
+                abort(401, 'Não autenticado')
+            if role not in roles:
+                abort(403, 'Acesso negado')
+
+            principal = load_principal(session['user_id'], role)
+            if principal is None or (role in PROFILE_RELATIONSHIPS and principal[1] is None):
+                abort(401, 'Usuário não encontrado')
+
+            g.user, g.profile = principal
+            g.role = role
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _scope_conditions():
+    """
+    Filtros que limitam as solicitações às do usuário atual
+    """
+    if g.role == 'company':
+        return [ServiceRequest.company_id == g.profile.id]
+    if g.role == 'correspondent':
+        return [ServiceRequest.correspondent_id == g.profile.id]
+    return []
+
+
+def _requested_fields(available, default):
+    """
+    Campos pedidos em ?fields=a,b,c (ou os padrões), validados contra os disponíveis
+    """
+    value = request.args.get('fields')
+    if not value:
+        return [field for field in default if field in available]
+
+    fields = list(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        abort(400, f"Campos desconhecidos: {', '.join(unknown)}")
+    return fields
+
+
+def _service_request_fields(default):
+    hidden = HIDDEN_FIELDS[g.role]
+    return _requested_fields([field for field in SERVICE_REQUEST_FIELDS if field not in hidden], default)
+
+
+def _serialize(service_request, fields):
+    return {field: SERVICE_REQUEST_FIELDS[field](service_request) for field in fields}
+
+
+def _load_options(fields):
+    return [FIELD_LOAD_OPTIONS[field] for field in fields if field in FIELD_LOAD_OPTIONS]
+
+
+def _version(conditions, fields=()):
+    """
+    Versão de um conjunto de solicitações: quantidade e última alteração.
+    Dados de outras tabelas que fazem parte da resposta (documentos, nome da
+    empresa ou do correspondente) entram com a sua própria última alteração.
+    """
+    count, last_update = db.session.query(
+        func.count(ServiceRequest.id), func.max(ServiceRequest.updated_at)
+    ).filter(*conditions).one()
+    version = [count, last_update]
+
+    if 'documents' in fields:
+        document_count, last_document_update = db.session.query(
+            func.count(Document.id), func.max(Document.updated_at)
+        ).join(ServiceRequest, Document.service_request_id == ServiceRequest.id).filter(*conditions).one()
+        version += [document_count, last_document_update]
+
+    if 'company' in fields:
+        version.append(db.session.query(func.max(Company.updated_at)).join(
+            ServiceRequest, ServiceRequest.company_id == Company.id).filter(*conditions).scalar())
+
+    if 'correspondent' in fields:
+        version.append(db.session.query(func.max(User.updated_at)).select_from(ServiceRequest).join(
+            Correspondent, Correspondent.id == ServiceRequest.correspondent_id).join(
+            User, User.id == Correspondent.user_id).filter(*conditions).scalar())
+
+    return version
+
+
+def _last_update(conditions):
+    return db.session.query(func.max(ServiceRequest.updated_at)).filter(*conditions).scalar()
+
+
+def _principal_key():
+    return [g.role, g.profile.id if g.profile is not None else g.user.id]
+
+
+@api_bp.route('/service-requests')
+@replica_reads
+@api_role_required('admin', 'company', 'correspondent')
+@eager_loaded
+def list_service_requests():
+    fields = _service_request_fields(DEFAULT_LIST_FIELDS)
+
+    conditions = _scope_conditions()
+    status = request.args.get('status')
+    if status:
+        conditions.append(ServiceRequest.status == status)
+
+    etag = weak_etag(_principal_key(), _version(conditions, fields),
+                     sorted(request.args.items(multi=True)))
+
+    def build():
+        query = ServiceRequest.query.options(*_load_options(fields)).filter(*conditions)
+        page = paginate_request(query, ServiceRequest.created_at, ServiceRequest.id)
+        return jsonify({
+            'items': [_serialize(r, fields) for r in page.items],
+            'next_cursor': page.next_cursor,
+        })
+
+    return conditional(etag, build)
+
+
+@api_bp.route('/service-requests/<int:request_id>')
+@replica_reads
+@api_role_required('admin', 'company', 'correspondent')
+@eager_loaded
+def service_request_detail(request_id):
+    fields = _service_request_fields(SERVICE_REQUEST_FIELDS)
+
+    conditions = _scope_conditions() + [ServiceRequest.id == request_id]
+    count, *version = _version(conditions, fields)
+    if not count:
+        abort(404, 'Solicitação não encontrada')
+
+    etag = weak_etag(_principal_key(), version, fields)
+
+    def build():
+        service_request = ServiceRequest.query.options(*_load_options(fields)).filter(*conditions).first_or_404()
+        return jsonify(_serialize(service_request, fields))
+
+    return conditional(etag, build)
+
+
+@api_bp.route('/dashboard')
+@replica_reads
+@api_role_required('admin', 'company', 'correspondent')
+@eager_loaded
+def dashboard():
+    conditions = _scope_conditions()
+
+    # As contagens vêm do cache dos dashboards; o ETag inclui as próprias
+    # contagens, então a resposta sempre corresponde ao seu ETag
+    if g.role == 'company':
+        counts = request_status_counts(company_id=g.profile.id)
+    elif g.role == 'correspondent':
+        counts = request_status_counts(correspondent_id=g.profile.id)
+    else:
+        counts = request_status_counts()
+    companies = company_status_counts() if g.role == 'admin' else None
+
+    etag = weak_etag(_principal_key(), counts, companies, _last_update(conditions))
+
+    def build():
+        data = {'status_counts': counts}
+
+        if g.role == 'company':
+            data['active_requests'] = sum(counts.get(status, 0) for status in ['approved', 'assigned', 'accepted', 'in_progress'])
+            data['completed_requests'] = counts.get('completed', 0)
+            recent = ServiceRequest.query.filter(*conditions).order_by(ServiceRequest.created_at.desc()).limit(5)
+            data['recent_requests'] = [_serialize(r, DEFAULT_LIST_FIELDS) for r in recent]
+        elif g.role == 'correspondent':
+            data['pending_assignments'] = counts.get('assigned', 0)
+            data['scheduled_services'] = counts.get('accepted', 0)
+            upcoming = ServiceRequest.query.filter(*conditions).filter(
+                ServiceRequest.status.in_(['assigned', 'accepted'])
+            ).order_by(ServiceRequest.date_time).limit(5)
+            data['upcoming_services'] = [_serialize(r, DEFAULT_LIST_FIELDS) for r in upcoming]
+        else:
+            data['company_counts'] = companies
+            data['pending_requests'] = counts.get('pending_approval', 0)
+
+        return jsonify(data)
+
+    return conditional(etag, build)
+
+
+@api_bp.route('/sync')
+@api_role_required('correspondent')
+@eager_loaded
+def sync():
+    """
+    Feed de alterações do correspondente: sem cursor devolve a lista completa
+    (reset), depois apenas o que mudou desde o cursor, com tombstones do que
+    saiu das suas listas (ex.: atribuição rejeitada)
+    """
+    # Sem replica_reads: o atraso da réplica poderia fazer o cursor pular alterações
+    # Os documentos vêm em uma lista própria
+    hidden = HIDDEN_FIELDS[g.role] | {'documents'}
+    fields = _requested_fields([field for field in SERVICE_REQUEST_FIELDS if field not in hidden],
+                               [field for field in SERVICE_REQUEST_FIELDS if field not in hidden])
+
+    try:
+        feed = changes_since(g.profile.id, request.args.get('cursor'), options=_load_options(fields))
+    except ValueError:
+        abort(400, 'Cursor inválido')
+
+    return jsonify({
+        'cursor': feed.cursor,
+        'reset': feed.reset,
+        'has_more': feed.has_more,
+        'service_requests': [_serialize(r, fields) for r in feed.service_requests],
+        'documents': [dict(_document(d), service_request_id=d.service_request_id) for d in feed.documents],
+        'removed': {
+            'service_requests': feed.removed_service_requests,
+            'documents': feed.removed_documents,
+        },
+    })
+
+
+def _column_values(obj, exclude=()):
+    values = {}
+    for attr in inspect(obj).mapper.column_attrs:
+        if attr.key in exclude:
+            continue
+        value = getattr(obj, attr.key)
+        values[attr.key] = _iso(value) if isinstance(value, (date, datetime)) else value
+    return values
+
+
+@api_bp.route('/profile')
+@api_role_required('admin', 'company', 'correspondent')
+def profile():
+    # Usuário e perfil já vêm do cache de principal: o ETag evita apenas o
+    # tráfego quando nada mudou
+    user = {field: getattr(g.user, field) for field in USER_PROFILE_FIELDS}
+    user['created_at'] = _iso(user['created_at'])
+    user['last_login'] = _iso(user['last_login'])
+
+    data = {'user': user}
+    if g.profile is not None:
+        data[g.role] = _column_values(g.profile, exclude=('user_id',))
+
+    fields = _requested_fields(list(data), list(data))
+    data = {field: data[field] for field in fields}
+
+    return conditional(weak_etag(data), lambda: jsonify(data))
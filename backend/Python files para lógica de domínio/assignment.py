@@ -0,0 +1,305 @@
+from src.models.service_request import ServiceRequest
+from src.services.matching import correspondent_index, _normalize
+from src.services.schedule import schedule_index, service_window, lock_schedule, booked_conflicts
+from src.services.state_machine import bulk_transition
+from src import db
+from collections import defaultdict
+import time
+
+try:
+    import numpy as np
+except ImportError:  # Sem numpy: custo par a par e atribuição gulosa
+    np = None
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+# Pesos do custo (em reais, somados ao valor cobrado pelo correspondente)
+DISTANCE_PENALTY = 40.0  # Correspondente do estado, mas de outra cidade
+SPECIALTY_PENALTY = 60.0  # Solicitação cita uma especialidade que o correspondente não tem
+LOAD_PENALTY = 15.0  # Por solicitação já em andamento com o correspondente
+RATING_BONUS = 10.0  # Por ponto de avaliação média
+
+# Solicitações em andamento por correspondente, contando as atribuídas agora
+MAX_LOAD = 5
+
+# Margem mínima (valor da empresa - valor do correspondente) para propor a atribuição
+MIN_MARGIN = 0.0
+
+MAX_BATCH = 5000
+
+INFEASIBLE = 1e9
+
+
+class Proposal:
+    """
+    Atribuição proposta para uma solicitação
+    """
+    __slots__ = ('service_request_id', 'correspondent_id', 'correspondent_value', 'company_value',
+                 'profit_margin', 'cost', 'same_city')
+
+    def __init__(self, service_request_id, correspondent_id, correspondent_value, company_value, cost, same_city):
+        self.service_request_id = service_request_id
+        self.correspondent_id = correspondent_id
+        self.correspondent_value = correspondent_value
+        self.company_value = company_value
+        self.profit_margin = company_value - correspondent_value
+        self.cost = cost
+        self.same_city = same_city
+
+
+class AssignmentPlan:
+    def __init__(self, proposals, unassigned, solver, elapsed_ms):
+        self.proposals = proposals
+        self.unassigned = unassigned  # ids sem correspondente elegível ou sem capacidade
+        self.solver = solver
+        self.elapsed_ms = elapsed_ms
+
+    @property
+    def total_margin(self):
+        return sum(p.profit_margin for p in self.proposals)
+
+
+def _mentioned_specialties(details, known):
+    text = _normalize(details)
+    return {specialty for specialty in known if specialty and specialty in text}
+
+
+def _busy_pairs(requests, candidates):
+    """
+    Pares (solicitação, correspondente) em que o correspondente já tem outro
+    serviço no horário
+    """
+    ids = [entry.correspondent_id for entry, _ in candidates]
+    return {(i, correspondent_id) for i, r in enumerate(requests)
+            for correspondent_id in schedule_index.busy_among(ids, r.date_time, r.service_type)}
+
+
+def _drop_overlaps(requests, assigned):
+    """
+    Remove atribuições que colocariam o mesmo correspondente em dois serviços
+    simultâneos deste lote (mantém a de menor custo)
+    """
+    by_correspondent = defaultdict(list)
+    for i, (correspondent_id, rate, cost, same_city) in assigned.items():
+        by_correspondent[correspondent_id].append((cost, i))
+
+    for correspondent_id, items in by_correspondent.items():
+        kept = []
+        for cost, i in sorted(items):
+            start, end = service_window(requests[i].date_time, requests[i].service_type)
+            if any(start < kept_end and kept_start < end for kept_start, kept_end in kept):
+                del assigned[i]
+            else:
+                kept.append((start, end))
+    return assigned
+
+
+def _group_cost_matrix(requests, candidates, busy):
+    """
+    Matriz de custo (solicitações x correspondentes) de um estado, montada
+    com operações vetorizadas. Pares inviáveis ficam com INFEASIBLE.
+    """
+    service_types = sorted({r.service_type for r in requests})
+    cities = sorted({_normalize(r.city) for r in requests if r.city})
+    specialties = sorted({s for entry, _ in candidates for s in entry.specialties})
+    type_index = {service_type: i for i, service_type in enumerate(service_types)}
+    city_index = {city: i for i, city in enumerate(cities)}
+    specialty_index = {specialty: i for i, specialty in enumerate(specialties)}
+
+    # Tabelas por correspondente (colunas)
+    n = len(candidates)
+    rate_table = np.full((len(service_types), n), np.inf)
+    city_table = np.zeros((len(cities) + 1, n), dtype=bool)  # Última linha: solicitação sem cidade
+    specialty_table = np.zeros((len(specialties), n), dtype=bool)
+    load = np.zeros(n)
+    rating = np.zeros(n)
+    for j, (entry, current_load) in enumerate(candidates):
+        for service_type, rate in entry.rates.items():
+            if service_type in type_index:
+                rate_table[type_index[service_type], j] = rate
+        for _, city in entry.locations:
+            if city in city_index:
+                city_table[city_index[city], j] = True
+        for specialty in entry.specialties:
+            specialty_table[specialty_index[specialty], j] = True
+        load[j] = current_load
+        rating[j] = entry.rating
+
+    # Vetores por solicitação (linhas)
+    request_types = np.array([type_index[r.service_type] for r in requests])
+    request_cities = np.array([city_index.get(_normalize(r.city), len(cities)) for r in requests])
+    request_specialties = np.zeros((len(requests), len(specialties)), dtype=bool)
+    for i, r in enumerate(requests):
+        for specialty in _mentioned_specialties(r.details, specialties):
+            request_specialties[i, specialty_index[specialty]] = True
+    company_values = np.array([r.company_value or 0.0 for r in requests])
+
+    rates = rate_table[request_types]
+    same_city = city_table[request_cities]
+    missing_specialty = request_specialties.any(axis=1)[:, None] & \
+        ~((request_specialties.astype(int) @ specialty_table.astype(int)) > 0)
+
+    cost = (rates
+            + DISTANCE_PENALTY * ~same_city
+            + SPECIALTY_PENALTY * missing_specialty
+            + LOAD_PENALTY * load[None, :]
+            - RATING_BONUS * rating[None, :])
+    feasible = np.isfinite(rates) & (company_values[:, None] - rates >= MIN_MARGIN)
+    column_index = {entry.correspondent_id: j for j, (entry, _) in enumerate(candidates)}
+    for i, correspondent_id in busy:
+        feasible[i, column_index[correspondent_id]] = False
+    return np.where(feasible, cost, INFEASIBLE), rates, same_city
+
+
+def _solve_matrix(cost, capacity):
+    """
+    Emparelhamento de custo mínimo: cada correspondente vira `capacidade`
+    colunas. Usa o scipy quando disponível e, na falta dele, atribuição gulosa.
+    Retorna pares (linha, coluna original).
+    """
+    slots = np.minimum(capacity, cost.shape[0])
+    columns = np.repeat(np.arange(cost.shape[1]), slots)
+    if not len(columns):
+        return []
+
+    if linear_sum_assignment is not None:
+        rows, slot_columns = linear_sum_assignment(cost[:, columns])
+        return [(i, columns[k]) for i, k in zip(rows, slot_columns) if cost[i, columns[k]] < INFEASIBLE]
+
+    remaining = slots.copy()
+    assigned = set()
+    pairs = []
+    flat = np.argsort(cost, axis=None)
+    for index in flat:
+        i, j = divmod(int(index), cost.shape[1])
+        if cost[i, j] >= INFEASIBLE:
+            break
+        if i in assigned or remaining[j] <= 0:
+            continue
+        assigned.add(i)
+        remaining[j] -= 1
+        pairs.append((i, j))
+    return pairs
+
+
+def _solve_greedy(requests, candidates, busy):
+    """
+    Versão sem numpy: custo calculado par a par e atribuição gulosa
+    """
+    known = {s for entry, _ in candidates for s in entry.specialties}
+    remaining = {entry.correspondent_id: MAX_LOAD - load for entry, load in candidates}
+    pairs = []
+    for i, r in enumerate(requests):
+        mentioned = _mentioned_specialties(r.details, known)
+        for entry, load in candidates:
+            rate = entry.rates.get(r.service_type)
+            if rate is None or (r.company_value or 0.0) - rate < MIN_MARGIN or (i, entry.correspondent_id) in busy:
+                continue
+            same_city = bool(r.city) and (_normalize(r.state), _normalize(r.city)) in entry.locations
+            cost = (rate + DISTANCE_PENALTY * (not same_city)
+                    + SPECIALTY_PENALTY * bool(mentioned and not mentioned & set(entry.specialties))
+                    + LOAD_PENALTY * load - RATING_BONUS * entry.rating)
+            pairs.append((cost, i, entry, rate, same_city))
+
+    pairs.sort(key=lambda pair: (pair[0], pair[1], pair[2].correspondent_id))
+    assigned = {}
+    for cost, i, entry, rate, same_city in pairs:
+        if i in assigned or remaining[entry.correspondent_id] <= 0:
+            continue
+        remaining[entry.correspondent_id] -= 1
+        assigned[i] = (entry.correspondent_id, rate, cost, same_city)
+    return assigned
+
+
+def plan_assignments(request_ids=None):
+    """
+    Propõe correspondentes para as solicitações aprovadas, minimizando o custo
+    total. Cada estado é resolvido separadamente (só há candidatos no mesmo estado).
+    """
+    started = time.perf_counter()
+
+    query = db.session.query(ServiceRequest.id, ServiceRequest.service_type, ServiceRequest.state,
+                             ServiceRequest.city, ServiceRequest.details, ServiceRequest.company_value,
+                             ServiceRequest.date_time).filter(
+        ServiceRequest.status == 'approved')
+    if request_ids:
+        query = query.filter(ServiceRequest.id.in_(request_ids))
+    requests = query.order_by(ServiceRequest.date_time, ServiceRequest.id).limit(MAX_BATCH).all()
+
+    by_state = defaultdict(list)
+    unassigned = []
+    for r in requests:
+        if r.state:
+            by_state[r.state].append(r)
+        else:
+            unassigned.append(r.id)
+
+    if np is None:
+        solver = 'greedy'
+    elif linear_sum_assignment is None:
+        solver = 'numpy-greedy'
+    else:
+        solver = 'scipy'
+
+    proposals = []
+    for state, group in sorted(by_state.items()):
+        candidates = [(entry, load) for entry, load in correspondent_index.candidates_in_state(
+            state, {r.service_type for r in group}) if load < MAX_LOAD]
+        if not candidates:
+            unassigned.extend(r.id for r in group)
+            continue
+
+        busy = _busy_pairs(group, candidates)
+        if np is not None:
+            cost, rates, same_city = _group_cost_matrix(group, candidates, busy)
+            capacity = np.array([MAX_LOAD - load for _, load in candidates])
+            assigned = {i: (candidates[j][0].correspondent_id, float(rates[i, j]), float(cost[i, j]),
+                            bool(same_city[i, j]))
+                        for i, j in _solve_matrix(cost, capacity)}
+        else:
+            assigned = _solve_greedy(group, candidates, busy)
+        assigned = _drop_overlaps(group, assigned)
+
+        for i, r in enumerate(group):
+            if i not in assigned:
+                unassigned.append(r.id)
+                continue
+            correspondent_id, rate, cost, same_city = assigned[i]
+            proposals.append(Proposal(r.id, correspondent_id, rate, r.company_value or 0.0, cost, same_city))
+
+    return AssignmentPlan(proposals, unassigned, solver, (time.perf_counter() - started) * 1000)
+
+
+def commit_plan(plan):
+    """
+    Aplica as atribuições propostas em um único UPDATE condicional (pela
+    máquina de estados). O commit da transação fica a cargo de quem chama.
+    Propostas que conflitam com a agenda atual no banco (o índice em memória
+    pode estar defasado) saem do plano e vão para plan.unassigned.
+    """
+    proposals = {p.service_request_id: p for p in plan.proposals}
+    if not proposals:
+        return []
+
+    # Locks em ordem de id, para não haver deadlock entre planos concorrentes
+    for correspondent_id in sorted({p.correspondent_id for p in proposals.values()}):
+        lock_schedule(correspondent_id)
+    booked = {row.id for row in db.session.query(
+        ServiceRequest.id, ServiceRequest.date_time, ServiceRequest.service_type
+    ).filter(ServiceRequest.id.in_(list(proposals))).all()
+              if booked_conflicts(proposals[row.id].correspondent_id, row.date_time, row.service_type, exclude=row.id)}
+    if booked:
+        plan.proposals = [p for p in plan.proposals if p.service_request_id not in booked]
+        plan.unassigned = list(plan.unassigned) + sorted(booked)
+        proposals = {p.service_request_id: p for p in plan.proposals}
+        if not proposals:
+            return []
+
+    return bulk_transition('assign', list(proposals), row_values={
+        'correspondent_id': {i: p.correspondent_id for i, p in proposals.items()},
+        'correspondent_value': {i: p.correspondent_value for i, p in proposals.items()},
+        'profit_margin': {i: p.profit_margin for i, p in proposals.items()},
+    })
@@ -1,8 +1,9 @@
 from flask import Blueprint, render_template, redirect, url_for, request, session, flash, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
 from src.models.user import User
 from src.models.company import Company
 from src.models.correspondent import Correspondent
+from src.utils.passwords import hash_password, verify_and_update, PasswordHashBusy
+from src.utils.sessions import regenerate_session
 from src import db
 
 auth_bp = Blueprint('auth', __name__)
@@ -16,11 +17,19 @@ def login():
         
         user = User.query.filter_by(email=email).first()
         
-        if user and check_password_hash(user.password_hash, password) and user.role == user_type:
+        try:
+            valid = user is not None and verify_and_update(user, password)
+        except PasswordHashBusy:
+            flash('Muitos acessos no momento. Por favor, tente novamente em instantes.', 'error')
+            return render_template('auth/login.html'), 503
+        
+        if valid and user.role == user_type:
             if user.status != 'active':
                 flash('Sua conta está pendente de aprovação ou inativa.', 'error')
                 return render_template('auth/login.html')
             
+            # Novo identificador de sessão a cada login
+            regenerate_session()
             session['user_id'] = user.id
             session['user_name'] = user.name
             session['user_role'] = user.role
@@ -50,7 +59,11 @@ def register():
             return render_template('auth/register.html')
         
         # Criar novo usuário
-        password_hash = generate_password_hash(password)
+        try:
+            password_hash = hash_password(password)
+        except PasswordHashBusy:
+            flash('Muitos acessos no momento. Por favor, tente novamente em instantes.', 'error')
+            return render_template('auth/register.html'), 503
         new_user = User(
             name=name,
             email=email,
@@ -0,0 +1,113 @@
+from sqlalchemy import update
+from src.models.user import User
+from src.models.company import Company
+from src.models.correspondent import Correspondent
+from src.services.matching import correspondent_index
+from src.services.metrics import invalidate_company_counts
+from src.services.state_machine import APPLIED, NOT_FOUND, bulk_transition
+from src.utils.principal import invalidate_principal
+from src import db
+from datetime import datetime
+
+# Limite de itens por operação em lote
+MAX_BULK_ITEMS = 500
+
+# Item já estava no status desejado
+UNCHANGED = 'unchanged'
+
+
+class BulkItem:
+    """
+    Resultado de um item de uma operação em lote
+    """
+
+    def __init__(self, id, outcome, label=None, status=None):
+        self.id = id
+        self.outcome = outcome
+        self.label = label
+        self.status = status
+
+    @property
+    def applied(self):
+        return self.outcome == APPLIED
+
+
+def summarize(items):
+    summary = {}
+    for item in items:
+        summary[item.outcome] = summary.get(item.outcome, 0) + 1
+    return summary
+
+
+def set_profiles_status(model, ids, status):
+    """
+    Altera o status dos usuários de várias empresas ou correspondentes com um
+    UPDATE por status de origem (em geral um só, o pendente). Retorna um
+    BulkItem por id, na ordem recebida.
+    """
+    ids = list(dict.fromkeys(ids))[:MAX_BULK_ITEMS]
+    if not ids:
+        return []
+
+    # Leitura com lock: os usuários lidos não mudam de status até o commit, então
+    # o UPDATE abaixo altera exatamente os candidatos
+    label = Company.company_name if model is Company else User.name
+    rows = {row.id: row for row in db.session.query(model.id, model.user_id, User.status, label.label('label'))
+            .join(User, User.id == model.user_id).filter(model.id.in_(ids)).order_by(User.id).with_for_update()}
+
+    items = {}
+    candidates = {}
+    for i in ids:
+        row = rows.get(i)
+        if row is None:
+            items[i] = BulkItem(i, NOT_FOUND)
+        elif row.status == status:
+            items[i] = BulkItem(i, UNCHANGED, row.label, row.status)
+        else:
+            candidates[row.user_id] = row
+
+    if candidates:
+        now = datetime.utcnow()
+        for previous in {row.status for row in candidates.values()}:
+            user_ids = [user_id for user_id, row in candidates.items() if row.status == previous]
+            db.session.execute(
+                update(User).where(User.id.in_(user_ids), User.status == previous)
+                .values(status=status, updated_at=now).execution_options(synchronize_session=False)
+            )
+
+        for row in candidates.values():
+            items[row.id] = BulkItem(row.id, APPLIED, row.label, status)
+
+    return [items[i] for i in ids]
+
+
+def after_profiles_commit(model, items, status):
+    """
+    Atualiza caches e o índice de correspondentes depois do commit
+    """
+    applied = [item for item in items if item.applied]
+    if not applied:
+        return
+
+    if model is Company:
+        invalidate_company_counts()
+        user_ids = db.session.query(Company.user_id).filter(Company.id.in_([item.id for item in applied]))
+    else:
+        correspondents = Correspondent.query.filter(Correspondent.id.in_([item.id for item in applied])).all()
+        for correspondent in correspondents:
+            correspondent_index.refresh(correspondent, active=status == 'active')
+        user_ids = [(correspondent.user_id,) for correspondent in correspondents]
+
+    for user_id, in user_ids:
+        invalidate_principal(user_id)
+
+
+def price_requests(values):
+    """
+    Define o valor e aprova várias solicitações pendentes ({id: valor}) em um
+    único UPDATE com CASE
+    """
+    ids = list(values)[:MAX_BULK_ITEMS]
+    results = bulk_transition('approve', ids, row_values={'company_value': values})
+    return [BulkItem(i, result.outcome, status=result.current_status or result.status)
+            for i, result in zip(ids, results)]
@@ -0,0 +1,20 @@
+from src import db
+
+class ChangeLogEntry(db.Model):
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        # Feed de alterações de cada correspondente, em ordem de sequência
+        db.Index('ix_change_log_correspondent_id_id', 'correspondent_id', 'id'),
+        db.Index('ix_change_log_created_at', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)  # Sequência monotônica usada como cursor
+    entity = db.Column(db.String(20), nullable=False)  # service_request, document
+    entity_id = db.Column(db.Integer, nullable=False)
+    service_request_id = db.Column(db.Integer, nullable=False)
+    correspondent_id = db.Column(db.Integer, nullable=False)  # Correspondente que deve receber a alteração
+    action = db.Column(db.String(10), nullable=False)  # upsert, remove
+    created_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now())  # Relógio do banco, igual para todos os workers
+
+    def __repr__(self):
+        return f'<ChangeLogEntry {self.id}>'
@@ -0,0 +1,216 @@
+from sqlalchemy import event, inspect, insert, select
+from sqlalchemy.orm import Session
+from src.models.change_log import ChangeLogEntry
+from src.models.document import Document
+from src.models.service_request import ServiceRequest
+from src.utils.pagination import encode_cursor, decode_cursor
+from src import db
+from datetime import datetime, timedelta
+
+# Entidades e ações registradas no change_log
+SERVICE_REQUEST = 'service_request'
+DOCUMENT = 'document'
+UPSERT = 'upsert'
+REMOVE = 'remove'  # Tombstone: o item saiu das listas do correspondente
+
+# Entradas mais antigas são removidas; cursores anteriores recebem a lista completa
+CHANGE_LOG_RETENTION = timedelta(days=30)
+
+# As sequências são atribuídas no INSERT, mas uma transação que começou antes
+# pode terminar depois de outra. O feed para antes da primeira entrada mais
+# nova que isso (pelo relógio do banco), para não pular sequências menores que
+# ainda não estavam visíveis.
+COMMIT_LAG = timedelta(seconds=5)
+
+SYNC_BATCH_SIZE = 500
+
+
+def _entry(entity, entity_id, service_request_id, correspondent_id, action):
+    return {'entity': entity, 'entity_id': entity_id, 'service_request_id': service_request_id,
+            'correspondent_id': correspondent_id, 'action': action}
+
+
+def _insert(connection, rows):
+    if rows:
+        connection.execute(insert(ChangeLogEntry.__table__), rows)
+
+
+@event.listens_for(Session, 'after_flush')
+def _log_flushed(session, flush_context):
+    """
+    Registra, na mesma transação, as alterações feitas pelo ORM em solicitações
+    e documentos que pertencem a algum correspondente
+    """
+    rows = []
+    documents = []
+
+    for obj in session.new | session.dirty:
+        if isinstance(obj, ServiceRequest):
+            if obj not in session.new and not session.is_modified(obj):
+                continue
+            # Troca de correspondente: tombstone para o anterior
+            for previous in inspect(obj).attrs.correspondent_id.history.deleted or ():
+                if previous is not None and previous != obj.correspondent_id:
+                    rows.append(_entry(SERVICE_REQUEST, obj.id, obj.id, previous, REMOVE))
+            if obj.correspondent_id is not None:
+                rows.append(_entry(SERVICE_REQUEST, obj.id, obj.id, obj.correspondent_id, UPSERT))
+        elif isinstance(obj, Document):
+            if obj in session.new or session.is_modified(obj):
+                documents.append((obj.id, obj.service_request_id, UPSERT))
+
+    for obj in session.deleted:
+        if isinstance(obj, ServiceRequest) and obj.correspondent_id is not None:
+            rows.append(_entry(SERVICE_REQUEST, obj.id, obj.id, obj.correspondent_id, REMOVE))
+        elif isinstance(obj, Document):
+            documents.append((obj.id, obj.service_request_id, REMOVE))
+
+    if documents:
+        owners = dict(session.connection().execute(
+            select(ServiceRequest.id, ServiceRequest.correspondent_id).where(
+                ServiceRequest.id.in_({service_request_id for _, service_request_id, _ in documents}),
+                ServiceRequest.correspondent_id.isnot(None))
+        ).fetchall())
+        for document_id, service_request_id, action in documents:
+            if service_request_id in owners:
+                rows.append(_entry(DOCUMENT, document_id, service_request_id, owners[service_request_id], action))
+
+    if rows:
+        _insert(session.connection(), rows)
+
+
+def record_transitions(results):
+    """
+    Registra transições aplicadas pela máquina de estados (UPDATE direto, fora
+    do flush da sessão). A rejeição gera o tombstone do correspondente anterior.
+    """
+    _insert(db.session.connection(), [
+        _entry(SERVICE_REQUEST, result.service_request_id, result.service_request_id, result.correspondent_id,
+               REMOVE if result.transition.clear_correspondent else UPSERT)
+        for result in results if result.correspondent_id is not None
+    ])
+
+
+class ChangeFeed:
+    """
+    Alterações entregues a um correspondente desde o cursor recebido
+    """
+
+    def __init__(self, cursor, service_requests, documents, removed_service_requests=(), removed_documents=(),
+                 has_more=False, reset=False):
+        self.cursor = cursor
+        self.service_requests = service_requests
+        self.documents = documents
+        self.removed_service_requests = list(removed_service_requests)
+        self.removed_documents = list(removed_documents)
+        self.has_more = has_more
+        self.reset = reset  # Lista completa: o cliente deve descartar o que tem
+
+
+def _database_now():
+    return db.session.query(db.func.now()).scalar()
+
+
+def _unsettled_sequence(correspondent_id, sequence, now):
+    """
+    Menor sequência do correspondente, acima da informada, registrada há menos
+    de COMMIT_LAG. Só as sequências abaixo dela podem ser entregues: uma
+    transação mais antiga ainda pode tornar visível uma sequência menor.
+    """
+    return db.session.query(db.func.min(ChangeLogEntry.id)).filter(
+        ChangeLogEntry.correspondent_id == correspondent_id,
+        ChangeLogEntry.id > sequence,
+        ChangeLogEntry.created_at > now - COMMIT_LAG
+    ).scalar()
+
+
+def _settled_sequence(correspondent_id, now):
+    query = db.session.query(db.func.max(ChangeLogEntry.id)).filter(ChangeLogEntry.correspondent_id == correspondent_id)
+    unsettled = _unsettled_sequence(correspondent_id, 0, now)
+    if unsettled is not None:
+        query = query.filter(ChangeLogEntry.id < unsettled)
+    return query.scalar() or 0
+
+
+def _snapshot(correspondent_id, now, options):
+    # A sequência é lida antes dos dados; alterações entre as duas leituras
+    # serão reenviadas na próxima sincronização (upserts são idempotentes)
+    sequence = _settled_sequence(correspondent_id, now)
+
+    service_requests = ServiceRequest.query.options(*options).filter(
+        ServiceRequest.correspondent_id == correspondent_id).order_by(ServiceRequest.id).all()
+    documents = Document.query.join(ServiceRequest, Document.service_request_id == ServiceRequest.id).filter(
+        ServiceRequest.correspondent_id == correspondent_id).order_by(Document.id).all()
+
+    return ChangeFeed(encode_cursor(now, sequence), service_requests, documents, reset=True)
+
+
+def changes_since(correspondent_id, cursor=None, limit=SYNC_BATCH_SIZE, options=()):
+    """
+    Solicitações e documentos do correspondente criados, alterados ou removidos
+    depois do cursor. Sem cursor (ou com um cursor anterior à retenção do
+    change_log), devolve a lista completa. O cursor guarda o horário da
+    sincronização (pelo relógio do banco) e a última sequência entregue.
+    """
+    now = _database_now()
+
+    position = decode_cursor(cursor) if cursor else None  # ValueError se o cursor for inválido
+    if position is None or not isinstance(position[0], datetime) or position[0] < now - CHANGE_LOG_RETENTION:
+        return _snapshot(correspondent_id, now, options)
+    sequence = position[1]
+
+    query = db.session.query(ChangeLogEntry.id, ChangeLogEntry.entity, ChangeLogEntry.entity_id,
+                             ChangeLogEntry.action).filter(
+        ChangeLogEntry.correspondent_id == correspondent_id,
+        ChangeLogEntry.id > sequence
+    )
+    unsettled = _unsettled_sequence(correspondent_id, sequence, now)
+    if unsettled is not None:
+        query = query.filter(ChangeLogEntry.id < unsettled)
+    entries = query.order_by(ChangeLogEntry.id).limit(limit + 1).all()
+
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    if entries:
+        sequence = entries[-1].id
+
+    # Vale a última ação de cada item no intervalo
+    latest = {}
+    for entry in entries:
+        latest[(entry.entity, entry.entity_id)] = entry.action
+
+    def ids(entity, action):
+        return [entity_id for (kind, entity_id), value in latest.items() if kind == entity and value == action]
+
+    upserted_requests = ids(SERVICE_REQUEST, UPSERT)
+    upserted_documents = ids(DOCUMENT, UPSERT)
+
+    # Itens alterados que já não pertencem ao correspondente também viram tombstones
+    service_requests = ServiceRequest.query.options(*options).filter(
+        ServiceRequest.id.in_(upserted_requests), ServiceRequest.correspondent_id == correspondent_id
+    ).order_by(ServiceRequest.id).all() if upserted_requests else []
+    documents = Document.query.join(ServiceRequest, Document.service_request_id == ServiceRequest.id).filter(
+        Document.id.in_(upserted_documents), ServiceRequest.correspondent_id == correspondent_id
+    ).order_by(Document.id).all() if upserted_documents else []
+
+    found_requests = {r.id for r in service_requests}
+    found_documents = {d.id for d in documents}
+
+    return ChangeFeed(
+        encode_cursor(now, sequence),
+        service_requests,
+        documents,
+        ids(SERVICE_REQUEST, REMOVE) + [i for i in upserted_requests if i not in found_requests],
+        ids(DOCUMENT, REMOVE) + [i for i in upserted_documents if i not in found_documents],
+        has_more=has_more,
+    )
+
+
+def prune_change_log(retention=CHANGE_LOG_RETENTION):
+    """
+    Remove as entradas mais antigas que a retenção
+    """
+    removed = ChangeLogEntry.query.filter(
+        ChangeLogEntry.created_at < _database_now() - retention
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
@@ -1,35 +1,34 @@
-from flask import Blueprint, render_template, redirect, url_for, request, session, flash, jsonify
-from src.models.user import User
-from src.models.company import Company
-from src.models.service_request import ServiceRequest
+from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, g, abort
+from src.models.service_request import ServiceRequest, normalize_state
+from src.models.document import Document
+from src.services.metrics import request_status_counts, invalidate_status_counts
+from src.services.storage import send_document
+from src.services.jobs import enqueue
+from src.services.state_machine import transition
+from src.services.exports import COMPANY_EXPORT_COLUMNS, service_request_export_query, export_response
+from src.utils.pagination import paginate_request
+from src.utils.principal import role_required, invalidate_principal
+from src.utils.routing import replica_reads
+from src.utils.loading import COMPANY_REQUEST_LIST_OPTIONS, eager_loaded
 from src import db
 
 company_bp = Blueprint('company', __name__)
 
 @company_bp.route('/dashboard')
+@replica_reads
+@role_required('company')
+@eager_loaded
 def dashboard():
-    if 'user_id' not in session or session.get('user_role') != 'company':
-        return redirect(url_for('auth.login'))
-    
-    user_id = session.get('user_id')
-    company = Company.query.filter_by(user_id=user_id).first()
-    
-    if not company:
-        flash('Perfil de empresa não encontrado.', 'error')
-        return redirect(url_for('auth.logout'))
+    company = g.company
     
     # Obter métricas para o dashboard
-    active_requests = ServiceRequest.query.filter_by(company_id=company.id).filter(
-        ServiceRequest.status.in_(['approved', 'assigned', 'accepted', 'in_progress'])
-    ).count()
+    counts = request_status_counts(company_id=company.id)
     
-    completed_requests = ServiceRequest.query.filter_by(
-        company_id=company.id, 
-        status='completed'
-    ).count()
+    active_requests = sum(counts.get(status, 0) for status in ['approved', 'assigned', 'accepted', 'in_progress'])
+    completed_requests = counts.get('completed', 0)
     
     # Obter solicitações recentes
-    recent_requests = ServiceRequest.query.filter_by(company_id=company.id).order_by(
+    recent_requests = ServiceRequest.query.options(*COMPANY_REQUEST_LIST_OPTIONS).filter_by(company_id=company.id).order_by(
         ServiceRequest.created_at.desc()
     ).limit(5).all()
     
@@ -40,32 +39,18 @@ def dashboard():
                           recent_requests=recent_requests)
 
 @company_bp.route('/profile')
+@role_required('company')
 def profile():
-    if 'user_id' not in session or session.get('user_role') != 'company':
-        return redirect(url_for('auth.login'))
-    
-    user_id = session.get('user_id')
-    company = Company.query.filter_by(user_id=user_id).first()
-    user = User.query.get(user_id)
-    
-    if not company:
-        flash('Perfil de empresa não encontrado.', 'error')
-        return redirect(url_for('auth.logout'))
+    company = g.company
+    user = g.user
     
     return render_template('company/profile.html', company=company, user=user)
 
 @company_bp.route('/profile/edit', methods=['GET', 'POST'])
+@role_required('company', fresh=True)
 def edit_profile():
-    if 'user_id' not in session or session.get('user_role') != 'company':
-        return redirect(url_for('auth.login'))
-    
-    user_id = session.get('user_id')
-    company = Company.query.filter_by(user_id=user_id).first()
-    user = User.query.get(user_id)
-    
-    if not company:
-        flash('Perfil de empresa não encontrado.', 'error')
-        return redirect(url_for('auth.logout'))
+    company = g.company
+    user = g.user
     
     if request.method == 'POST':
         # Atualizar dados do usuário
@@ -73,43 +58,42 @@ def edit_profile():
         user.phone = request.form.get('phone')
         
         # Atualizar dados da empresa
+        renamed = company.company_name != request.form.get('company_name')
         company.company_name = request.form.get('company_name')
         company.business_type = request.form.get('business_type')
         company.contact_name = request.form.get('contact_name')
         
+        # O nome da empresa faz parte do índice de busca das solicitações
+        if renamed:
+            enqueue('search.reindex_company', {'company_id': company.id})
+        
         db.session.commit()
         
+        invalidate_principal(user.id)
+        
         flash('Perfil atualizado com sucesso!', 'success')
         return redirect(url_for('company.profile'))
     
     return render_template('company/edit_profile.html', company=company, user=user)
 
 @company_bp.route('/service-requests')
+@replica_reads
+@role_required('company')
+@eager_loaded
 def service_requests():
-    if 'user_id' not in session or session.get('user_role') != 'company':
-        return redirect(url_for('auth.login'))
-    
-    user_id = session.get('user_id')
-    company = Company.query.filter_by(user_id=user_id).first()
+    company = g.company
     
-    if not company:
-        flash('Perfil de empresa não encontrado.', 'error')
-        return redirect(url_for('auth.logout'))
+    query = ServiceRequest.query.options(*COMPANY_REQUEST_LIST_OPTIONS).filter_by(company_id=company.id)
+    if request.args.get('status'):
+        query = query.filter(ServiceRequest.status == request.args['status'])
     
-    requests = ServiceRequest.query.filter_by(company_id=company.id).all()
-    return render_template('company/service_requests.html', requests=requests)
+    page = paginate_request(query, ServiceRequest.created_at, ServiceRequest.id)
+    return render_template('company/service_requests.html', requests=page.items, page=page)
 
 @company_bp.route('/service-requests/new', methods=['GET', 'POST'])
+@role_required('company')
 def new_request():
-    if 'user_id' not in session or session.get('user_role') != 'company':
-        return redirect(url_for('auth.login'))
-    
-    user_id = session.get('user_id')
-    company = Company.query.filter_by(user_id=user_id).first()
-    
-    if not company:
-        flash('Perfil de empresa não encontrado.', 'error')
-        return redirect(url_for('auth.logout'))
+    company = g.company
     
     if request.method == 'POST':
         service_type = request.form.get('service_type')
@@ -119,6 +103,11 @@ def new_request():
         details = request.form.get('details')
         deadline = request.form.get('deadline')
         
+        # A UF é gravada em uma coluna de duas letras
+        if (location_state or '').strip() and normalize_state(location_state) is None:
+            flash('Estado inválido. Informe a sigla da UF (ex.: SP).', 'error')
+            return redirect(url_for('company.new_request'))
+        
         location = {
             'city': location_city,
             'state': location_state
@@ -127,7 +116,7 @@ def new_request():
         new_request = ServiceRequest(
             company_id=company.id,
             service_type=service_type,
-            location=location,
+            location_dict=location,
             date_time=date_time,
             details=details,
             deadline=deadline,
@@ -137,22 +126,17 @@ def new_request():
         db.session.add(new_request)
         db.session.commit()
         
+        invalidate_status_counts(company.id)
+        
         flash('Solicitação criada com sucesso! Aguarde a aprovação e definição de valor.', 'success')
         return redirect(url_for('company.service_requests'))
     
     return render_template('company/new_request.html')
 
 @company_bp.route('/service-requests/<int:request_id>')
+@role_required('company')
 def request_details(request_id):
-    if 'user_id' not in session or session.get('user_role') != 'company':
-        return redirect(url_for('auth.login'))
-    
-    user_id = session.get('user_id')
-    company = Company.query.filter_by(user_id=user_id).first()
-    
-    if not company:
-        flash('Perfil de empresa não encontrado.', 'error')
-        return redirect(url_for('auth.logout'))
+    company = g.company
     
     service_request = ServiceRequest.query.get_or_404(request_id)
     
@@ -164,63 +148,67 @@ def request_details(request_id):
     return render_template('company/request_details.html', request=service_request)
 
 @company_bp.route('/service-requests/<int:request_id>/cancel', methods=['POST'])
+@role_required('company')
 def cancel_request(request_id):
-    if 'user_id' not in session or session.get('user_role') != 'company':
-        return redirect(url_for('auth.login'))
+    company = g.company
     
-    user_id = session.get('user_id')
-    company = Company.query.filter_by(user_id=user_id).first()
+    # Cancelamento atômico: só altera se a solicitação for desta empresa e ainda puder ser cancelada
+    result = transition(request_id, 'cancel', company_id=company.id)
     
-    if not company:
-        flash('Perfil de empresa não encontrado.', 'error')
-        return redirect(url_for('auth.logout'))
-    
-    service_request = ServiceRequest.query.get_or_404(request_id)
+    if result.not_found:
+        abort(404)
     
     # Verificar se a solicitação pertence a esta empresa
-    if service_request.company_id != company.id:
+    if result.forbidden:
         flash('Você não tem permissão para cancelar esta solicitação.', 'error')
         return redirect(url_for('company.service_requests'))
     
     # Verificar se a solicitação pode ser cancelada
-    if service_request.status not in ['pending_approval', 'approved']:
+    if result.conflict:
         flash('Esta solicitação não pode mais ser cancelada.', 'error')
         return redirect(url_for('company.request_details', request_id=request_id))
     
-    service_request.status = 'cancelled'
     db.session.commit()
     
     flash('Solicitação cancelada com sucesso!', 'success')
     return redirect(url_for('company.service_requests'))
 
 @company_bp.route('/documents')
+@replica_reads
+@role_required('company')
 def documents():
-    if 'user_id' not in session or session.get('user_role') != 'company':
-        return redirect(url_for('auth.login'))
+    company = g.company
     
-    user_id = session.get('user_id')
-    company = Company.query.filter_by(user_id=user_id).first()
+    query = Document.query.join(ServiceRequest).filter(ServiceRequest.company_id == company.id)
+    page = paginate_request(query, Document.created_at, Document.id)
     
-    if not company:
-        flash('Perfil de empresa não encontrado.', 'error')
-        return redirect(url_for('auth.logout'))
+    return render_template('company/documents.html', documents=page.items, page=page)
+
+@company_bp.route('/documents/<int:document_id>/download')
+@role_required('company')
+def download_document(document_id):
+    company = g.company
+    
+    document = Document.query.get_or_404(document_id)
     
-    # Em um sistema real, buscaríamos documentos do banco de dados
-    # Para este protótipo, apenas simulamos
-    documents = []
+    # Verificar se o documento pertence a uma solicitação desta empresa
+    if document.service_request.company_id != company.id:
+        flash('Você não tem permissão para acessar este documento.', 'error')
+        return redirect(url_for('company.documents'))
     
-    return render_template('company/documents.html', documents=documents)
+    return send_document(document, as_attachment=request.args.get('download') == '1')
 
 @company_bp.route('/reports')
+@replica_reads
+@role_required('company')
 def reports():
-    if 'user_id' not in session or session.get('user_role') != 'company':
-        return redirect(url_for('auth.login'))
-    
-    user_id = session.get('user_id')
-    company = Company.query.filter_by(user_id=user_id).first()
-    
-    if not company:
-        flash('Perfil de empresa não encontrado.', 'error')
-        return redirect(url_for('auth.logout'))
-    
     return render_template('company/reports.html')
+
+@company_bp.route('/reports/service-requests.<fmt>')
+@replica_reads
+@role_required('company')
+def export_service_requests(fmt):
+    company = g.company
+    
+    query = service_request_export_query(COMPANY_EXPORT_COLUMNS, company_id=company.id)
+    return export_response(query, COMPANY_EXPORT_COLUMNS, fmt, 'solicitacoes')
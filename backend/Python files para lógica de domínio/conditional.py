@@ -0,0 +1,29 @@
+from flask import current_app, request, make_response
+import hashlib
+import json
+
+
+def weak_etag(*parts):
+    """
+    Gera o valor de um ETag fraco a partir de partes serializáveis (datas,
+    contagens, parâmetros da requisição)
+    """
+    raw = json.dumps(parts, default=str, separators=(',', ':'), sort_keys=True)
+    return hashlib.sha1(raw.encode()).hexdigest()[:32]
+
+
+def conditional(etag, build):
+    """
+    Responde 304 sem chamar build() quando o If-None-Match do cliente contém o
+    ETag atual; caso contrário monta a resposta com build(). Em ambos os casos
+    a resposta leva o ETag e exige revalidação a cada uso.
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(build())
+
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
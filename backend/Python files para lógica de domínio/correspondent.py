@@ -1,36 +1,38 @@
-from flask import Blueprint, render_template, redirect, url_for, request, session, flash, jsonify
-from src.models.user import User
-from src.models.correspondent import Correspondent
+from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, g, abort
 from src.models.service_request import ServiceRequest
+from src.models.document import Document
+from src.services.matching import correspondent_index
+from src.services.state_machine import transition
+from src.services.schedule import is_booked, lock_schedule, COMMITTED_STATUSES
+from src.services.storage import send_document
+from src.services.tasks import process_documents
+from src.services.uploads import (UploadError, parse_streaming_form, store_file, create_upload_session,
+                                  load_upload_session, append_chunk, discard_upload_session)
+from src.services.metrics import request_status_counts
+from src.utils.pagination import paginate_request
+from src.utils.principal import role_required, invalidate_principal
+from src.utils.routing import replica_reads
+from src.utils.loading import CORRESPONDENT_REQUEST_LIST_OPTIONS, eager_loaded
 from src import db
+from werkzeug.exceptions import RequestEntityTooLarge
 
 correspondent_bp = Blueprint('correspondent', __name__)
 
 @correspondent_bp.route('/dashboard')
+@replica_reads
+@role_required('correspondent')
+@eager_loaded
 def dashboard():
-    if 'user_id' not in session or session.get('user_role') != 'correspondent':
-        return redirect(url_for('auth.login'))
-    
-    user_id = session.get('user_id')
-    correspondent = Correspondent.query.filter_by(user_id=user_id).first()
-    
-    if not correspondent:
-        flash('Perfil de correspondente não encontrado.', 'error')
-        return redirect(url_for('auth.logout'))
+    correspondent = g.correspondent
     
     # Obter métricas para o dashboard
-    pending_assignments = ServiceRequest.query.filter_by(
-        correspondent_id=correspondent.id, 
-        status='assigned'
-    ).count()
+    counts = request_status_counts(correspondent_id=correspondent.id)
     
-    scheduled_services = ServiceRequest.query.filter_by(
-        correspondent_id=correspondent.id, 
-        status='accepted'
-    ).count()
+    pending_assignments = counts.get('assigned', 0)
+    scheduled_services = counts.get('accepted', 0)
     
     # Obter próximos serviços
-    upcoming_services = ServiceRequest.query.filter_by(
+    upcoming_services = ServiceRequest.query.options(*CORRESPONDENT_REQUEST_LIST_OPTIONS).filter_by(
         correspondent_id=correspondent.id
     ).filter(
         ServiceRequest.status.in_(['assigned', 'accepted'])
@@ -45,32 +47,18 @@ def dashboard():
                           upcoming_services=upcoming_services)
 
 @correspondent_bp.route('/profile')
+@role_required('correspondent')
 def profile():
-    if 'user_id' not in session or session.get('user_role') != 'correspondent':
-        return redirect(url_for('auth.login'))
-    
-    user_id = session.get('user_id')
-    correspondent = Correspondent.query.filter_by(user_id=user_id).first()
-    user = User.query.get(user_id)
-    
-    if not correspondent:
-        flash('Perfil de correspondente não encontrado.', 'error')
-        return redirect(url_for('auth.logout'))
+    correspondent = g.correspondent
+    user = g.user
     
     return render_template('correspondent/profile.html', correspondent=correspondent, user=user)
 
 @correspondent_bp.route('/profile/edit', methods=['GET', 'POST'])
+@role_required('correspondent', fresh=True)
 def edit_profile():
-    if 'user_id' not in session or session.get('user_role') != 'correspondent':
-        return redirect(url_for('auth.login'))
-    
-    user_id = session.get('user_id')
-    correspondent = Correspondent.query.filter_by(user_id=user_id).first()
-    user = User.query.get(user_id)
-    
-    if not correspondent:
-        flash('Perfil de correspondente não encontrado.', 'error')
-        return redirect(url_for('auth.logout'))
+    correspondent = g.correspondent
+    user = g.user
     
     if request.method == 'POST':
         # Atualizar dados do usuário
@@ -102,125 +90,113 @@ def edit_profile():
         
         db.session.commit()
         
+        correspondent_index.refresh(correspondent)
+        invalidate_principal(user.id)
+        
         flash('Perfil atualizado com sucesso!', 'success')
         return redirect(url_for('correspondent.profile'))
     
     return render_template('correspondent/edit_profile.html', correspondent=correspondent, user=user)
 
 @correspondent_bp.route('/assignments')
+@replica_reads
+@role_required('correspondent')
+@eager_loaded
 def assignments():
-    if 'user_id' not in session or session.get('user_role') != 'correspondent':
-        return redirect(url_for('auth.login'))
-    
-    user_id = session.get('user_id')
-    correspondent = Correspondent.query.filter_by(user_id=user_id).first()
-    
-    if not correspondent:
-        flash('Perfil de correspondente não encontrado.', 'error')
-        return redirect(url_for('auth.logout'))
+    correspondent = g.correspondent
     
     # Obter atribuições pendentes
-    pending_assignments = ServiceRequest.query.filter_by(
-        correspondent_id=correspondent.id, 
-        status='assigned'
-    ).all()
-    
-    return render_template('correspondent/assignments.html', assignments=pending_assignments)
+    pending_assignments = paginate_request(
+        ServiceRequest.query.options(*CORRESPONDENT_REQUEST_LIST_OPTIONS).filter_by(
+            correspondent_id=correspondent.id, status='assigned'),
+        ServiceRequest.date_time, ServiceRequest.id, descending=False
+    )
+    
+    return render_template('correspondent/assignments.html', 
+                          assignments=pending_assignments.items,
+                          page=pending_assignments)
 
 @correspondent_bp.route('/assignments/<int:request_id>/accept', methods=['POST'])
+@role_required('correspondent')
 def accept_assignment(request_id):
-    if 'user_id' not in session or session.get('user_role') != 'correspondent':
-        return redirect(url_for('auth.login'))
+    correspondent = g.correspondent
     
-    user_id = session.get('user_id')
-    correspondent = Correspondent.query.filter_by(user_id=user_id).first()
+    # O lock no correspondente serializa os seus aceites concorrentes
+    lock_schedule(correspondent.id)
+    result = transition(request_id, 'accept', correspondent_id=correspondent.id)
     
-    if not correspondent:
-        flash('Perfil de correspondente não encontrado.', 'error')
-        return redirect(url_for('auth.logout'))
-    
-    service_request = ServiceRequest.query.get_or_404(request_id)
+    if result.not_found:
+        abort(404)
     
     # Verificar se a solicitação está atribuída a este correspondente
-    if service_request.correspondent_id != correspondent.id:
+    if result.forbidden:
         flash('Você não tem permissão para aceitar esta atribuição.', 'error')
         return redirect(url_for('correspondent.assignments'))
     
     # Verificar se a solicitação está no status correto
-    if service_request.status != 'assigned':
+    if result.conflict:
         flash('Esta atribuição não pode ser aceita.', 'error')
         return redirect(url_for('correspondent.assignments'))
     
-    service_request.status = 'accepted'
+    # Não aceitar dois serviços confirmados no mesmo horário
+    if is_booked(correspondent.id, result.date_time, result.service_type,
+                 exclude=request_id, statuses=COMMITTED_STATUSES):
+        db.session.rollback()
+        flash('Você já tem outro serviço confirmado neste horário.', 'error')
+        return redirect(url_for('correspondent.assignments'))
+    
     db.session.commit()
     
     flash('Atribuição aceita com sucesso!', 'success')
     return redirect(url_for('correspondent.scheduled_services'))
 
 @correspondent_bp.route('/assignments/<int:request_id>/reject', methods=['POST'])
+@role_required('correspondent')
 def reject_assignment(request_id):
-    if 'user_id' not in session or session.get('user_role') != 'correspondent':
-        return redirect(url_for('auth.login'))
+    correspondent = g.correspondent
     
-    user_id = session.get('user_id')
-    correspondent = Correspondent.query.filter_by(user_id=user_id).first()
+    result = transition(request_id, 'reject', correspondent_id=correspondent.id)
     
-    if not correspondent:
-        flash('Perfil de correspondente não encontrado.', 'error')
-        return redirect(url_for('auth.logout'))
-    
-    service_request = ServiceRequest.query.get_or_404(request_id)
+    if result.not_found:
+        abort(404)
     
     # Verificar se a solicitação está atribuída a este correspondente
-    if service_request.correspondent_id != correspondent.id:
+    if result.forbidden:
         flash('Você não tem permissão para rejeitar esta atribuição.', 'error')
         return redirect(url_for('correspondent.assignments'))
     
     # Verificar se a solicitação está no status correto
-    if service_request.status != 'assigned':
+    if result.conflict:
         flash('Esta atribuição não pode ser rejeitada.', 'error')
         return redirect(url_for('correspondent.assignments'))
     
-    service_request.status = 'rejected'
-    service_request.correspondent_id = None
     db.session.commit()
     
     flash('Atribuição rejeitada.', 'success')
     return redirect(url_for('correspondent.assignments'))
 
 @correspondent_bp.route('/scheduled-services')
+@replica_reads
+@role_required('correspondent')
+@eager_loaded
 def scheduled_services():
-    if 'user_id' not in session or session.get('user_role') != 'correspondent':
-        return redirect(url_for('auth.login'))
-    
-    user_id = session.get('user_id')
-    correspondent = Correspondent.query.filter_by(user_id=user_id).first()
-    
-    if not correspondent:
-        flash('Perfil de correspondente não encontrado.', 'error')
-        return redirect(url_for('auth.logout'))
+    correspondent = g.correspondent
     
     # Obter serviços agendados
-    scheduled_services = ServiceRequest.query.filter_by(
-        correspondent_id=correspondent.id, 
-        status='accepted'
-    ).order_by(
-        ServiceRequest.date_time
-    ).all()
-    
-    return render_template('correspondent/scheduled_services.html', services=scheduled_services)
+    scheduled_services = paginate_request(
+        ServiceRequest.query.options(*CORRESPONDENT_REQUEST_LIST_OPTIONS).filter_by(
+            correspondent_id=correspondent.id, status='accepted'),
+        ServiceRequest.date_time, ServiceRequest.id, descending=False
+    )
+    
+    return render_template('correspondent/scheduled_services.html', 
+                          services=scheduled_services.items,
+                          page=scheduled_services)
 
 @correspondent_bp.route('/service-requests/<int:request_id>')
+@role_required('correspondent')
 def request_details(request_id):
-    if 'user_id' not in session or session.get('user_role') != 'correspondent':
-        return redirect(url_for('auth.login'))
-    
-    user_id = session.get('user_id')
-    correspondent = Correspondent.query.filter_by(user_id=user_id).first()
-    
-    if not correspondent:
-        flash('Perfil de correspondente não encontrado.', 'error')
-        return redirect(url_for('auth.logout'))
+    correspondent = g.correspondent
     
     service_request = ServiceRequest.query.get_or_404(request_id)
     
@@ -232,46 +208,34 @@ def request_details(request_id):
     return render_template('correspondent/request_details.html', request=service_request)
 
 @correspondent_bp.route('/service-requests/<int:request_id>/confirm-presence', methods=['POST'])
+@role_required('correspondent')
 def confirm_presence(request_id):
-    if 'user_id' not in session or session.get('user_role') != 'correspondent':
-        return redirect(url_for('auth.login'))
-    
-    user_id = session.get('user_id')
-    correspondent = Correspondent.query.filter_by(user_id=user_id).first()
+    correspondent = g.correspondent
     
-    if not correspondent:
-        flash('Perfil de correspondente não encontrado.', 'error')
-        return redirect(url_for('auth.logout'))
+    result = transition(request_id, 'confirm_presence', correspondent_id=correspondent.id)
     
-    service_request = ServiceRequest.query.get_or_404(request_id)
+    if result.not_found:
+        abort(404)
     
     # Verificar se a solicitação está atribuída a este correspondente
-    if service_request.correspondent_id != correspondent.id:
+    if result.forbidden:
         flash('Você não tem permissão para confirmar presença nesta solicitação.', 'error')
         return redirect(url_for('correspondent.scheduled_services'))
     
     # Verificar se a solicitação está no status correto
-    if service_request.status != 'accepted':
+    if result.conflict:
         flash('Não é possível confirmar presença nesta solicitação.', 'error')
         return redirect(url_for('correspondent.request_details', request_id=request_id))
     
-    service_request.status = 'in_progress'
     db.session.commit()
     
     flash('Presença confirmada com sucesso!', 'success')
     return redirect(url_for('correspondent.request_details', request_id=request_id))
 
 @correspondent_bp.route('/service-requests/<int:request_id>/submit-documentation', methods=['GET', 'POST'])
+@role_required('correspondent')
 def submit_documentation(request_id):
-    if 'user_id' not in session or session.get('user_role') != 'correspondent':
-        return redirect(url_for('auth.login'))
-    
-    user_id = session.get('user_id')
-    correspondent = Correspondent.query.filter_by(user_id=user_id).first()
-    
-    if not correspondent:
-        flash('Perfil de correspondente não encontrado.', 'error')
-        return redirect(url_for('auth.logout'))
+    correspondent = g.correspondent
     
     service_request = ServiceRequest.query.get_or_404(request_id)
     
@@ -286,53 +250,162 @@ def submit_documentation(request_id):
         return redirect(url_for('correspondent.request_details', request_id=request_id))
     
     if request.method == 'POST':
-        report = request.form.get('report')
+        # Os arquivos são gravados em disco em blocos durante a leitura do formulário
+        try:
+            form, files = parse_streaming_form()
+        except (UploadError, RequestEntityTooLarge):
+            flash('Arquivo excede o tamanho máximo permitido.', 'error')
+            return redirect(url_for('correspondent.submit_documentation', request_id=request_id))
+        
+        report = form.get('report')
+        document_type = form.get('document_type', 'relatorio')
+        
+        # Arquivos grandes enviados antes, em partes, pelo envio retomável
+        upload_ids = form.getlist('upload_ids')
+        uploads = []
+        for upload_id in upload_ids:
+            try:
+                upload = load_upload_session(upload_id, correspondent.user_id)
+            except UploadError:
+                upload = None
+            if not upload or not upload['complete'] or upload['service_request_id'] != service_request.id:
+                for stream in files:
+                    stream.discard()
+                flash('Um dos arquivos ainda não terminou de ser enviado.', 'error')
+                return redirect(url_for('correspondent.submit_documentation', request_id=request_id))
+            uploads.append(upload)
+        
+        # Conclusão atômica: outra requisição pode ter alterado a solicitação desde a leitura acima
+        result = transition(service_request.id, 'complete', correspondent_id=correspondent.id)
+        if not result.applied:
+            for stream in files:
+                stream.discard()
+            flash('Não é possível enviar documentação para esta solicitação.', 'error')
+            return redirect(url_for('correspondent.request_details', request_id=request_id))
         
-        # Em um sistema real, processaríamos o upload de arquivos
-        # Para este protótipo, apenas simulamos
+        documents = []
+        for stream in files:
+            stream.close()
+            documents.append(Document(
+                service_request_id=service_request.id,
+                type=document_type,
+                file_name=stream.filename,
+                file_path=store_file(stream.path, stream.checksum),
+                file_size=stream.size,
+                checksum=stream.checksum,
+                uploaded_by=correspondent.user_id
+            ))
+        for upload in uploads:
+            documents.append(Document(
+                service_request_id=service_request.id,
+                type=upload['type'] or document_type,
+                file_name=upload['file_name'],
+                file_path=upload['file_path'],
+                file_size=upload['file_size'],
+                checksum=upload['checksum'],
+                uploaded_by=correspondent.user_id
+            ))
         
-        service_request.status = 'completed'
+        # Documentos e conclusão da solicitação na mesma transação
+        db.session.add_all(documents)
+        db.session.flush()
+        
+        # Miniaturas ficam para o worker de tarefas
+        process_documents(documents)
         db.session.commit()
         
+        for upload_id in upload_ids:
+            discard_upload_session(upload_id)
+        
         flash('Documentação enviada com sucesso!', 'success')
         return redirect(url_for('correspondent.request_details', request_id=request_id))
     
     return render_template('correspondent/submit_documentation.html', request=service_request)
 
-@correspondent_bp.route('/history')
-def history():
-    if 'user_id' not in session or session.get('user_role') != 'correspondent':
-        return redirect(url_for('auth.login'))
-    
-    user_id = session.get('user_id')
-    correspondent = Correspondent.query.filter_by(user_id=user_id).first()
+@correspondent_bp.route('/documents/<int:document_id>/download')
+@role_required('correspondent')
+def download_document(document_id):
+    correspondent = g.correspondent
     
-    if not correspondent:
-        flash('Perfil de correspondente não encontrado.', 'error')
-        return redirect(url_for('auth.logout'))
+    document = Document.query.get_or_404(document_id)
     
-    # Obter histórico de serviços
-    completed_services = ServiceRequest.query.filter_by(
-        correspondent_id=correspondent.id, 
-        status='completed'
-    ).order_by(
-        ServiceRequest.date_time.desc()
-    ).all()
+    # Verificar se o documento pertence a uma solicitação deste correspondente
+    if document.service_request.correspondent_id != correspondent.id:
+        flash('Você não tem permissão para acessar este documento.', 'error')
+        return redirect(url_for('correspondent.scheduled_services'))
     
-    return render_template('correspondent/history.html', services=completed_services)
+    return send_document(document, as_attachment=request.args.get('download') == '1')
 
-@correspondent_bp.route('/payments')
-def payments():
-    if 'user_id' not in session or session.get('user_role') != 'correspondent':
-        return redirect(url_for('auth.login'))
+@correspondent_bp.route('/service-requests/<int:request_id>/uploads', methods=['POST'])
+@role_required('correspondent')
+def create_upload(request_id):
+    correspondent = g.correspondent
     
-    user_id = session.get('user_id')
-    correspondent = Correspondent.query.filter_by(user_id=user_id).first()
+    service_request = ServiceRequest.query.get_or_404(request_id)
     
-    if not correspondent:
-        flash('Perfil de correspondente não encontrado.', 'error')
-        return redirect(url_for('auth.logout'))
+    if service_request.correspondent_id != correspondent.id or service_request.status != 'in_progress':
+        return jsonify({'error': 'Não é possível enviar documentação para esta solicitação.'}), 403
+    
+    data = request.get_json(silent=True) or request.form
+    try:
+        upload = create_upload_session(service_request.id,
+                                       correspondent.user_id,
+                                       data.get('file_name'),
+                                       int(data.get('file_size', 0)),
+                                       data.get('document_type', 'relatorio'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Tamanho de arquivo inválido.'}), 400
+    except UploadError as e:
+        return jsonify({'error': e.message}), e.status
+    
+    return jsonify({'upload_id': upload['upload_id'], 'offset': 0}), 201
+
+@correspondent_bp.route('/uploads/<upload_id>', methods=['GET', 'PUT'])
+@role_required('correspondent')
+def upload_chunk(upload_id):
+    correspondent = g.correspondent
+    
+    # GET informa quanto já foi recebido; PUT envia o próximo bloco (Content-Range)
+    try:
+        if request.method == 'PUT':
+            upload = append_chunk(upload_id, correspondent.user_id, request.headers.get('Content-Range'))
+        else:
+            upload = load_upload_session(upload_id, correspondent.user_id)
+    except UploadError as e:
+        return jsonify({'error': e.message, 'offset': e.offset}), e.status
+    
+    response = jsonify({
+        'upload_id': upload_id,
+        'offset': upload['offset'],
+        'file_size': upload['file_size'],
+        'complete': upload['complete'],
+        'checksum': upload.get('checksum')
+    })
+    response.headers['Upload-Offset'] = str(upload['offset'])
+    return response
+
+@correspondent_bp.route('/history')
+@replica_reads
+@role_required('correspondent')
+@eager_loaded
+def history():
+    correspondent = g.correspondent
     
+    # Obter histórico de serviços
+    completed_services = paginate_request(
+        ServiceRequest.query.options(*CORRESPONDENT_REQUEST_LIST_OPTIONS).filter_by(
+            correspondent_id=correspondent.id, status='completed'),
+        ServiceRequest.date_time, ServiceRequest.id
+    )
+    
+    return render_template('correspondent/history.html', 
+                          services=completed_services.items,
+                          page=completed_services)
+
+@correspondent_bp.route('/payments')
+@replica_reads
+@role_required('correspondent')
+def payments():
     # Em um sistema real, buscaríamos pagamentos do banco de dados
     # Para este protótipo, apenas simulamos
     pending_payments = []
@@ -10,9 +10,10 @@ class Document(db.Model):
     file_name = db.Column(db.String(255), nullable=False)
     file_path = db.Column(db.String(255), nullable=False)
     file_size = db.Column(db.Integer, nullable=False)  # Tamanho em bytes
+    checksum = db.Column(db.String(64), nullable=True, index=True)  # SHA-256 do conteúdo
     uploaded_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     status = db.Column(db.String(20), nullable=False, default='pending')  # pending, approved, rejected
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Ordenação da paginação keyset
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def __repr__(self):
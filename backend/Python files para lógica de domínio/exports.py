@@ -0,0 +1,157 @@
+from flask import Response, stream_with_context, request, abort
+from src import db
+from src.models.company import Company
+from src.models.service_request import ServiceRequest
+from datetime import datetime
+import csv
+import io
+import os
+import tempfile
+
+# Linhas lidas do banco por vez (cursor do lado do servidor)
+YIELD_PER = 2000
+
+# Linhas acumuladas antes de enviar um bloco ao cliente
+CSV_FLUSH_ROWS = 500
+
+FILE_CHUNK_SIZE = 64 * 1024
+
+# Colunas do relatório do administrador: (rótulo, expressão)
+ADMIN_EXPORT_COLUMNS = [
+    ('ID', ServiceRequest.id),
+    ('Criada em', ServiceRequest.created_at),
+    ('Data/hora', ServiceRequest.date_time),
+    ('Empresa', Company.company_name),
+    ('Correspondente', ServiceRequest.correspondent_id),
+    ('Tipo de serviço', ServiceRequest.service_type),
+    ('Cidade', ServiceRequest.city),
+    ('UF', ServiceRequest.state),
+    ('Status', ServiceRequest.status),
+    ('Valor empresa', ServiceRequest.company_value),
+    ('Valor correspondente', ServiceRequest.correspondent_value),
+    ('Margem', ServiceRequest.profit_margin),
+]
+
+# A empresa não vê o valor pago ao correspondente nem a margem
+COMPANY_EXPORT_COLUMNS = [
+    ('ID', ServiceRequest.id),
+    ('Criada em', ServiceRequest.created_at),
+    ('Data/hora', ServiceRequest.date_time),
+    ('Tipo de serviço', ServiceRequest.service_type),
+    ('Cidade', ServiceRequest.city),
+    ('UF', ServiceRequest.state),
+    ('Status', ServiceRequest.status),
+    ('Valor', ServiceRequest.company_value),
+]
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def service_request_export_query(columns, company_id=None):
+    """
+    Consulta apenas as colunas exportadas, com os filtros da requisição atual
+    """
+    query = db.session.query(*[column for _, column in columns]).select_from(ServiceRequest)
+    if any(column is Company.company_name for _, column in columns):
+        query = query.join(Company, Company.id == ServiceRequest.company_id)
+    if company_id is not None:
+        query = query.filter(ServiceRequest.company_id == company_id)
+
+    if request.args.get('status'):
+        query = query.filter(ServiceRequest.status == request.args['status'])
+    if request.args.get('state'):
+        query = query.filter(ServiceRequest.state == request.args['state'].upper())
+    if request.args.get('service_type'):
+        query = query.filter(ServiceRequest.service_type == request.args['service_type'])
+    try:
+        if request.args.get('start'):
+            query = query.filter(ServiceRequest.date_time >= datetime.strptime(request.args['start'], '%Y-%m-%d'))
+        if request.args.get('end'):
+            query = query.filter(ServiceRequest.date_time < datetime.strptime(request.args['end'], '%Y-%m-%d'))
+    except ValueError:
+        abort(400)
+
+    return query.order_by(ServiceRequest.id).execution_options(stream_results=True).yield_per(YIELD_PER)
+
+
+def _format(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M')
+    if isinstance(value, float):
+        return f'{value:.2f}'
+    return value
+
+
+def iter_csv(query, columns):
+    """
+    Gera o CSV em blocos, sem manter o resultado completo em memória
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+
+    # BOM para o Excel reconhecer UTF-8
+    buffer.write('\ufeff')
+    writer.writerow([label for label, _ in columns])
+
+    pending = 0
+    for row in query:
+        writer.writerow([_format(value) for value in row])
+        pending += 1
+        if pending >= CSV_FLUSH_ROWS:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    yield buffer.getvalue().encode('utf-8')
+
+
+def iter_xlsx(query, columns):
+    """
+    Gera a planilha com o openpyxl em modo somente escrita, gravando as linhas
+    em um arquivo temporário e enviando-o em blocos. O formato XLSX é um ZIP, então
+    os bytes só podem ser enviados depois que a última linha for gravada.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Solicitações')
+    sheet.append([label for label, _ in columns])
+    for row in query:
+        sheet.append(list(row))
+
+    handle, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(handle)
+    try:
+        workbook.save(path)
+        with open(path, 'rb') as stream:
+            while True:
+                chunk = stream.read(FILE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def export_response(query, columns, fmt, filename):
+    if fmt == 'csv':
+        generator = iter_csv(query, columns)
+    elif fmt == 'xlsx':
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            abort(501)
+        generator = iter_xlsx(query, columns)
+    else:
+        abort(404)
+
+    response = Response(stream_with_context(generator), content_type=CONTENT_TYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,34 @@
+from src.utils.routing import RoutingSQLAlchemy
+
+# Extensões criadas sem aplicação; create_app() as associa a cada instância
+db = RoutingSQLAlchemy()
+
+
+def init_extensions(app):
+    db.init_app(app)
+
+    # Instrumentação de consultas SQL (opcional)
+    from src.utils.instrumentation import init_instrumentation
+    init_instrumentation(app)
+
+    # Detecção de carregamentos preguiçosos inesperados (opcional)
+    from src.utils.loading import init_lazy_load_detection
+    init_lazy_load_detection(app)
+
+    # Leituras em réplicas com leitura das próprias escritas
+    from src.utils.routing import init_replica_routing
+    init_replica_routing(app)
+
+    # Sessões no servidor, compartilhadas entre workers e servidores
+    from src.utils.sessions import init_sessions
+    init_sessions(app)
+
+
+def dispose_engines(app):
+    """
+    Fecha as conexões herdadas do processo pai (ex.: após o fork do gunicorn)
+    """
+    with app.app_context():
+        db.get_engine(app).dispose()
+        for bind in app.config.get('SQLALCHEMY_BINDS') or {}:
+            db.get_engine(app, bind=bind).dispose()
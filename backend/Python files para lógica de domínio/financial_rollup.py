@@ -0,0 +1,26 @@
+from src import db
+from datetime import datetime
+
+class FinancialRollup(db.Model):
+    __tablename__ = 'financial_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('month', 'state', 'service_type', 'company_id', 'status',
+                            name='uq_financial_rollups_key'),
+        db.Index('ix_financial_rollups_month_state', 'month', 'state'),
+        db.Index('ix_financial_rollups_company_month', 'company_id', 'month'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Date, nullable=False)  # Primeiro dia do mês do serviço
+    state = db.Column(db.String(2), nullable=False, default='')  # Vazio quando a solicitação não tem UF
+    service_type = db.Column(db.String(50), nullable=False)
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # completed, cancelled
+    request_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)  # Soma de company_value
+    cost = db.Column(db.Float, nullable=False, default=0)  # Soma de correspondent_value
+    margin = db.Column(db.Float, nullable=False, default=0)  # Soma de profit_margin
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<FinancialRollup {self.month} {self.state} {self.service_type} {self.company_id} {self.status}>'
@@ -0,0 +1,92 @@
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import json
+import logging
+import time
+
+logger = logging.getLogger('jurisconnect.performance')
+
+# Quantidade de consultas mais lentas registradas no log de requisições lentas
+SLOWEST_STATEMENTS = 5
+
+
+class QueryStats:
+    """
+    Estatísticas das consultas SQL executadas durante uma requisição
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.count = 0
+        self.total_time = 0.0
+        self.statements = []
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.total_time += duration
+        self.statements.append((duration, statement))
+
+    def slowest(self, limit=SLOWEST_STATEMENTS):
+        return sorted(self.statements, key=lambda item: item[0], reverse=True)[:limit]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'query_stats' in g:
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context() or 'query_stats' not in g:
+        return
+    start_times = conn.info.get('query_start_time')
+    if not start_times:
+        return
+    g.query_stats.record(statement, time.perf_counter() - start_times.pop())
+
+
+def init_instrumentation(app):
+    """
+    Ativa a instrumentação de consultas SQL por requisição quando
+    SQL_INSTRUMENTATION está habilitado na configuração
+    """
+    if not app.config.get('SQL_INSTRUMENTATION'):
+        return
+
+    threshold = app.config.get('SLOW_REQUEST_THRESHOLD_MS', 500)
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = QueryStats()
+
+    @app.after_request
+    def emit_query_stats(response):
+        stats = g.pop('query_stats', None)
+        if stats is None:
+            return response
+
+        total_ms = (time.perf_counter() - stats.started_at) * 1000
+        db_ms = stats.total_time * 1000
+
+        response.headers.add('Server-Timing', f'db;dur={db_ms:.1f};desc="{stats.count} queries"')
+        response.headers.add('Server-Timing', f'app;dur={total_ms:.1f}')
+
+        if total_ms >= threshold:
+            logger.warning(json.dumps({
+                'event': 'slow_request',
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'duration_ms': round(total_ms, 1),
+                'db_ms': round(db_ms, 1),
+                'query_count': stats.count,
+                'slowest': [{'duration_ms': round(duration * 1000, 1), 'statement': statement}
+                            for duration, statement in stats.slowest()],
+            }, ensure_ascii=False))
+
+        return response
@@ -0,0 +1,34 @@
+from src import db
+from datetime import datetime
+import json
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # Busca das próximas tarefas a executar
+        db.Index('ix_jobs_status_priority_run_at', 'status', 'priority', 'run_at'),
+        db.Index('ix_jobs_status_locked_until', 'status', 'locked_until'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    task = db.Column(db.String(100), nullable=False)  # Nome registrado da tarefa
+    payload = db.Column(db.Text, nullable=True)  # Argumentos em JSON
+    priority = db.Column(db.Integer, nullable=False, default=0)  # Maior executa primeiro
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Não executar antes de
+    locked_by = db.Column(db.String(100), nullable=True)  # Worker que está executando
+    locked_until = db.Column(db.DateTime, nullable=True)  # Fim do prazo de visibilidade
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Ordenação da paginação keyset
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def payload_dict(self):
+        if self.payload:
+            return json.loads(self.payload)
+        return {}
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.task}>'
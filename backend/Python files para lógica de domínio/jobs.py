@@ -0,0 +1,262 @@
+from flask import current_app
+from sqlalchemy import and_, or_, update
+from src.models.job import Job
+from src import db
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import traceback
+
+logger = logging.getLogger('jurisconnect.jobs')
+
+PRIORITY_HIGH = 10
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = -10
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_VISIBILITY_TIMEOUT = 300  # Segundos que uma tarefa fica reservada para um worker
+DEFAULT_POLL_INTERVAL = 1.0
+
+# Espera entre tentativas: RETRY_BASE_DELAY * 2^(tentativas - 1), limitada a RETRY_MAX_DELAY
+RETRY_BASE_DELAY = 10
+RETRY_MAX_DELAY = 60 * 60
+
+# Tarefas registradas: nome -> (função, prioridade padrão, máximo de tentativas)
+TASKS = {}
+
+
+def task(name, priority=PRIORITY_NORMAL, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Registra uma função como tarefa executável pelo worker. A função recebe
+    os argumentos do payload e roda dentro do contexto da aplicação.
+    """
+    def decorator(function):
+        TASKS[name] = (function, priority, max_attempts)
+        return function
+    return decorator
+
+
+def enqueue(name, payload=None, priority=None, delay=None, max_attempts=None):
+    """
+    Agenda uma tarefa. A tarefa é gravada na sessão atual e só fica visível para
+    os workers quando a transação da requisição for confirmada, junto com a
+    alteração que a originou.
+    """
+    _, default_priority, default_attempts = TASKS.get(name, (None, PRIORITY_NORMAL, DEFAULT_MAX_ATTEMPTS))
+    job = Job(
+        task=name,
+        payload=json.dumps(payload or {}),
+        priority=default_priority if priority is None else priority,
+        max_attempts=default_attempts if max_attempts is None else max_attempts,
+        run_at=datetime.utcnow() + timedelta(seconds=delay or 0),
+    )
+    db.session.add(job)
+    return job
+
+
+def retry_delay(attempts):
+    return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** max(0, attempts - 1))
+
+
+def _claimable(now):
+    # Tarefas na fila já liberadas, ou reservadas por um worker cujo prazo expirou
+    return or_(
+        and_(Job.status == 'queued', Job.run_at <= now),
+        and_(Job.status == 'running', Job.locked_until < now, Job.attempts < Job.max_attempts),
+    )
+
+
+def claim_jobs(worker_id, limit, visibility_timeout):
+    """
+    Reserva até `limit` tarefas para este worker. Cada reserva é um UPDATE
+    condicional; se outro worker reservou a mesma tarefa antes, ela é ignorada.
+    Retorna tuplas (id, tarefa, payload).
+    """
+    now = datetime.utcnow()
+
+    # Tarefas abandonadas que já esgotaram as tentativas
+    db.session.execute(
+        update(Job).where(Job.status == 'running', Job.locked_until < now, Job.attempts >= Job.max_attempts)
+        .values(status='failed', finished_at=now, locked_by=None, locked_until=None,
+                last_error='Prazo de execução esgotado.')
+        .execution_options(synchronize_session=False)
+    )
+
+    candidates = db.session.query(Job.id, Job.task, Job.payload).filter(_claimable(now)).order_by(
+        Job.priority.desc(), Job.run_at, Job.id
+    ).limit(limit * 2).all()
+
+    claimed = []
+    for job_id, name, payload in candidates:
+        if len(claimed) >= limit:
+            break
+        result = db.session.execute(
+            update(Job).where(Job.id == job_id, _claimable(now))
+            .values(status='running', locked_by=worker_id, attempts=Job.attempts + 1,
+                    locked_until=now + timedelta(seconds=visibility_timeout))
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            claimed.append((job_id, name, payload))
+    db.session.commit()
+    return claimed
+
+
+def extend_leases(worker_id, job_ids, visibility_timeout):
+    """
+    Renova o prazo das tarefas ainda em execução, para que não sejam
+    reservadas por outro worker enquanto este estiver ativo
+    """
+    if not job_ids:
+        return
+    db.session.execute(
+        update(Job).where(Job.id.in_(job_ids), Job.locked_by == worker_id, Job.status == 'running')
+        .values(locked_until=datetime.utcnow() + timedelta(seconds=visibility_timeout))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def finish_job(job_id, worker_id, error=None):
+    """
+    Registra o resultado de uma execução. Em caso de erro, a tarefa volta para
+    a fila com espera exponencial até atingir o máximo de tentativas.
+    """
+    now = datetime.utcnow()
+    owned = [Job.id == job_id, Job.locked_by == worker_id, Job.status == 'running']
+
+    if error is None:
+        values = {'status': 'done', 'finished_at': now, 'last_error': None}
+    else:
+        job = db.session.query(Job.attempts, Job.max_attempts).filter(Job.id == job_id).first()
+        if job is None:
+            return
+        attempts, max_attempts = job
+        if attempts >= max_attempts:
+            values = {'status': 'failed', 'finished_at': now, 'last_error': error}
+        else:
+            values = {'status': 'queued', 'run_at': now + timedelta(seconds=retry_delay(attempts)),
+                      'last_error': error}
+
+    db.session.execute(
+        update(Job).where(*owned).values(locked_by=None, locked_until=None, **values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def retry_job(job):
+    """
+    Recoloca na fila uma tarefa que falhou definitivamente
+    """
+    job.status = 'queued'
+    job.attempts = 0
+    job.run_at = datetime.utcnow()
+    job.finished_at = None
+
+
+# Execução nos processos filhos
+
+# Aplicação do processo filho, criada uma vez no início do processo
+_process_app = None
+
+
+def _init_process():
+    # Processos iniciados com "spawn" não herdam conexões do processo principal
+    global _process_app
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    from src import create_app
+    _process_app = create_app()
+    import src.services.tasks  # noqa: F401  (registra as tarefas)
+
+
+def execute_job(name, payload):
+    """
+    Executa uma tarefa em um processo filho. Retorna None em caso de sucesso
+    ou o traceback do erro.
+    """
+    entry = TASKS.get(name)
+    if entry is None:
+        return f'Tarefa desconhecida: {name}'
+
+    with _process_app.app_context():
+        try:
+            entry[0](**json.loads(payload or '{}'))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            return traceback.format_exc()
+        finally:
+            db.session.remove()
+    return None
+
+
+class Worker:
+    """
+    Busca tarefas no banco e as executa em um pool de processos. Não depende
+    de nenhum serviço externo além do próprio banco da aplicação.
+    """
+
+    def __init__(self, processes=None, poll_interval=None, visibility_timeout=None, worker_id=None):
+        config = current_app.config
+        self.processes = processes or config.get('JOB_WORKER_PROCESSES', 2)
+        self.poll_interval = poll_interval or config.get('JOB_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+        self.visibility_timeout = visibility_timeout or config.get('JOB_VISIBILITY_TIMEOUT',
+                                                                   DEFAULT_VISIBILITY_TIMEOUT)
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        self._stopping = False
+
+    def stop(self, *args):
+        # Termina as tarefas em andamento e encerra
+        self._stopping = True
+
+    def run(self, burst=False):
+        """
+        Laço principal. Com burst=True, encerra quando a fila estiver vazia.
+        """
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        context = multiprocessing.get_context('spawn')
+        running = {}
+        renew_at = time.monotonic() + self.visibility_timeout / 3
+
+        with ProcessPoolExecutor(max_workers=self.processes, mp_context=context,
+                                 initializer=_init_process) as pool:
+            while running or not self._stopping:
+                free = self.processes - len(running)
+                if free > 0 and not self._stopping:
+                    for job_id, name, payload in claim_jobs(self.worker_id, free, self.visibility_timeout):
+                        running[pool.submit(execute_job, name, payload)] = (job_id, name, time.monotonic())
+
+                if not running:
+                    if burst:
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+
+                done, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id, name, started = running.pop(future)
+                    try:
+                        error = future.result()
+                    except Exception:
+                        error = traceback.format_exc()
+                    finish_job(job_id, self.worker_id, error)
+                    elapsed = (time.monotonic() - started) * 1000
+                    if error:
+                        logger.warning('Tarefa %s (%s) falhou em %.0fms:\n%s', job_id, name, elapsed, error)
+                    else:
+                        logger.info('Tarefa %s (%s) concluída em %.0fms', job_id, name, elapsed)
+
+                if time.monotonic() >= renew_at:
+                    extend_leases(self.worker_id, [job_id for job_id, _, _ in running.values()],
+                                  self.visibility_timeout)
+                    renew_at = time.monotonic() + self.visibility_timeout / 3
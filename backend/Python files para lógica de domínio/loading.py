@@ -0,0 +1,67 @@
+from flask import current_app, g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload, selectinload
+from src.models.correspondent import Correspondent
+from src.models.service_request import ServiceRequest
+from functools import wraps
+
+
+class LazyLoadError(Exception):
+    """
+    Carregamento preguiçoso inesperado em uma rota com carregamento declarado
+    """
+
+
+# Opções de carregamento das listagens de solicitações
+SERVICE_REQUEST_LIST_OPTIONS = (
+    joinedload(ServiceRequest.company),
+    joinedload(ServiceRequest.correspondent).joinedload(Correspondent.user),
+    selectinload(ServiceRequest.documents),
+)
+
+# Listagens da empresa: a própria empresa já está carregada
+COMPANY_REQUEST_LIST_OPTIONS = (
+    joinedload(ServiceRequest.correspondent).joinedload(Correspondent.user),
+    selectinload(ServiceRequest.documents),
+)
+
+# Listagens do correspondente
+CORRESPONDENT_REQUEST_LIST_OPTIONS = (
+    joinedload(ServiceRequest.company),
+    selectinload(ServiceRequest.documents),
+)
+
+
+def _check_lazy_load(orm_execute_state):
+    if orm_execute_state.lazy_loaded_from is None:
+        return
+    if not has_request_context() or not g.get('strict_loading'):
+        return
+    raise LazyLoadError(
+        f'Carregamento preguiçoso em {orm_execute_state.lazy_loaded_from.class_.__name__} '
+        f'durante a rota {g.strict_loading}'
+    )
+
+
+def init_lazy_load_detection(app):
+    """
+    Com RAISE_ON_LAZY_LOAD habilitado, qualquer carregamento preguiçoso em uma
+    rota marcada com eager_loaded gera LazyLoadError (uso em testes e depuração)
+    """
+    if not app.config.get('RAISE_ON_LAZY_LOAD'):
+        return
+    if not event.contains(Session, 'do_orm_execute', _check_lazy_load):
+        event.listen(Session, 'do_orm_execute', _check_lazy_load)
+
+
+def eager_loaded(view):
+    """
+    Marca uma rota de listagem cujos relacionamentos são carregados
+    explicitamente; qualquer outro carregamento preguiçoso é um N+1
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if current_app.config.get('RAISE_ON_LAZY_LOAD'):
+            g.strict_loading = view.__qualname__
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,244 @@
+from src import db
+from src.models.user import User
+from src.models.service_request import ServiceRequest
+from collections import defaultdict
+import heapq
+import json
+import threading
+import time
+
+# Status em que uma solicitação ocupa o correspondente
+ACTIVE_STATUSES = ('assigned', 'accepted', 'in_progress')
+
+# Tempo máximo (em segundos) antes de reconstruir o índice a partir do banco.
+# Cada worker mantém sua própria cópia, então isso limita a defasagem entre processos.
+REBUILD_INTERVAL = 300
+
+# Distância aproximada: mesma cidade ou apenas mesmo estado
+SAME_CITY = 0
+SAME_STATE = 1
+
+
+def _json_value(value, default):
+    if value is None or value == '':
+        return default
+    if isinstance(value, (list, dict)):
+        return value
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _normalize(value):
+    return (value or '').strip().casefold()
+
+
+class _Entry:
+    __slots__ = ('correspondent_id', 'rates', 'locations', 'specialties', 'rating', 'keys')
+
+    def __init__(self, correspondent_id, rates, locations, specialties, rating):
+        self.correspondent_id = correspondent_id
+        self.rates = rates
+        self.locations = locations
+        self.specialties = specialties
+        self.rating = rating
+        self.keys = set()
+
+
+class Match:
+    """
+    Resultado de uma busca no índice de correspondentes
+    """
+    __slots__ = ('correspondent_id', 'rate', 'distance', 'load', 'rating')
+
+    def __init__(self, correspondent_id, rate, distance, load, rating):
+        self.correspondent_id = correspondent_id
+        self.rate = rate
+        self.distance = distance
+        self.load = load
+        self.rating = rating
+
+    def __repr__(self):
+        return f'<Match {self.correspondent_id} rate={self.rate} distance={self.distance} load={self.load}>'
+
+
+class CorrespondentIndex:
+    """
+    Índice em memória dos correspondentes ativos, organizado por
+    (estado, cidade, especialidade, tipo de serviço)
+    """
+
+    def __init__(self, rebuild_interval=REBUILD_INTERVAL):
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._buckets = defaultdict(set)
+        self._load = defaultdict(int)
+        self._built_at = None
+
+    def _keys_for(self, entry):
+        keys = set()
+        specialties = [None] + entry.specialties
+        for state, city in entry.locations:
+            for specialty in specialties:
+                for service_type in entry.rates:
+                    keys.add((state, city, specialty, service_type))
+                    keys.add((state, None, specialty, service_type))
+        return keys
+
+    def _entry_for(self, correspondent):
+        rates = {}
+        for service_type, rate in _json_value(correspondent.rates, {}).items():
+            try:
+                rate = float(rate)
+            except (TypeError, ValueError):
+                continue
+            if rate > 0:
+                rates[service_type] = rate
+
+        locations = set()
+        for location in _json_value(correspondent.locations, []):
+            if isinstance(location, dict) and location.get('state'):
+                locations.add((_normalize(location.get('state')), _normalize(location.get('city'))))
+
+        specialties = sorted({_normalize(s) for s in _json_value(correspondent.specialties, []) if s})
+
+        return _Entry(correspondent.id, rates, sorted(locations), specialties,
+                      correspondent.average_rating or 0)
+
+    def _add(self, entry):
+        entry.keys = self._keys_for(entry)
+        for key in entry.keys:
+            self._buckets[key].add(entry.correspondent_id)
+        self._entries[entry.correspondent_id] = entry
+
+    def _discard(self, correspondent_id):
+        entry = self._entries.pop(correspondent_id, None)
+        if entry is None:
+            return
+        for key in entry.keys:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(correspondent_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def rebuild(self):
+        """
+        Reconstrói o índice a partir do banco de dados
+        """
+        from src.models.correspondent import Correspondent
+
+        correspondents = Correspondent.query.join(User).filter(User.status == 'active').all()
+        load = db.session.query(
+            ServiceRequest.correspondent_id, db.func.count(ServiceRequest.id)
+        ).filter(
+            ServiceRequest.correspondent_id.isnot(None),
+            ServiceRequest.status.in_(ACTIVE_STATUSES)
+        ).group_by(ServiceRequest.correspondent_id).all()
+
+        with self._lock:
+            self._entries = {}
+            self._buckets = defaultdict(set)
+            self._load = defaultdict(int, {correspondent_id: count for correspondent_id, count in load})
+            for correspondent in correspondents:
+                self._add(self._entry_for(correspondent))
+            self._built_at = time.monotonic()
+
+    def ensure_fresh(self):
+        if self._built_at is None or time.monotonic() - self._built_at > self.rebuild_interval:
+            self.rebuild()
+
+    def refresh(self, correspondent, active=None):
+        """
+        Atualiza a entrada de um correspondente após edição de perfil ou aprovação
+        """
+        if active is None:
+            active = correspondent.user is not None and correspondent.user.status == 'active'
+
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._discard(correspondent.id)
+            if active:
+                self._add(self._entry_for(correspondent))
+
+    def remove(self, correspondent_id):
+        with self._lock:
+            self._discard(correspondent_id)
+
+    def adjust_load(self, correspondent_id, delta):
+        """
+        Ajusta a carga atual de um correspondente (solicitações em andamento)
+        """
+        if correspondent_id is None:
+            return
+        with self._lock:
+            self._load[int(correspondent_id)] = max(0, self._load[int(correspondent_id)] + delta)
+
+    def candidates_in_state(self, state, service_types):
+        """
+        Correspondentes ativos que atendem o estado em algum dos tipos de
+        serviço informados, com a carga atual de cada um
+        """
+        self.ensure_fresh()
+
+        state = _normalize(state)
+        with self._lock:
+            ids = set()
+            for service_type in service_types:
+                ids.update(self._buckets.get((state, None, None, service_type), ()))
+            return [(self._entries[correspondent_id], self._load[correspondent_id]) for correspondent_id in sorted(ids)]
+
+    def shortlist(self, service_type, state, city=None, specialty=None, limit=10, available=None):
+        """
+        Retorna os melhores correspondentes para o serviço, ordenados por
+        valor cobrado, distância e carga atual. available(correspondent_id),
+        se informado, descarta os indisponíveis.
+        """
+        self.ensure_fresh()
+
+        state = _normalize(state)
+        city = _normalize(city) or None
+        specialty = _normalize(specialty) or None
+
+        with self._lock:
+            candidates = {}
+            if city:
+                for correspondent_id in self._buckets.get((state, city, specialty, service_type), ()):
+                    candidates[correspondent_id] = SAME_CITY
+            for correspondent_id in self._buckets.get((state, None, specialty, service_type), ()):
+                candidates.setdefault(correspondent_id, SAME_STATE)
+
+            matches = (
+                Match(correspondent_id,
+                      self._entries[correspondent_id].rates[service_type],
+                      distance,
+                      self._load[correspondent_id],
+                      self._entries[correspondent_id].rating)
+                for correspondent_id, distance in candidates.items()
+                if available is None or available(correspondent_id)
+            )
+            return heapq.nsmallest(limit, matches,
+                                   key=lambda m: (m.rate, m.distance, m.load, -m.rating))
+
+    def shortlist_for(self, service_request, specialty=None, limit=10):
+        from src.services.schedule import schedule_index
+        schedule_index.ensure_fresh()
+
+        # Descarta quem já tem outro serviço no mesmo horário
+        def available(correspondent_id):
+            return not schedule_index.is_busy(correspondent_id, service_request.date_time,
+                                              service_request.service_type, exclude=service_request.id)
+
+        location = service_request.location_dict
+        return self.shortlist(service_request.service_type,
+                              location.get('state'),
+                              location.get('city'),
+                              specialty=specialty,
+                              limit=limit,
+                              available=available)
+
+
+correspondent_index = CorrespondentIndex()
@@ -0,0 +1,85 @@
+from src import db
+from src.models.user import User
+from src.models.company import Company
+from src.models.service_request import ServiceRequest
+import threading
+import time
+
+# Tempo (em segundos) que as contagens dos dashboards ficam em cache.
+# O cache é local a cada processo; o TTL curto limita a defasagem entre workers.
+DASHBOARD_CACHE_TTL = 30
+
+
+class TTLCache:
+    """
+    Cache simples em memória com expiração por tempo
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def get_or_set(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._data.get(key)
+            if cached is not None and cached[0] > now:
+                return cached[1]
+        value = loader()
+        with self._lock:
+            self._data[key] = (now + self.ttl, value)
+        return value
+
+    def discard(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_cache = TTLCache(DASHBOARD_CACHE_TTL)
+
+
+def request_status_counts(company_id=None, correspondent_id=None):
+    """
+    Contagem de solicitações por status em uma única consulta GROUP BY,
+    opcionalmente restrita a uma empresa ou correspondente
+    """
+    def load():
+        query = db.session.query(ServiceRequest.status, db.func.count(ServiceRequest.id))
+        if company_id is not None:
+            query = query.filter(ServiceRequest.company_id == company_id)
+        if correspondent_id is not None:
+            query = query.filter(ServiceRequest.correspondent_id == correspondent_id)
+        return dict(query.group_by(ServiceRequest.status).all())
+
+    return _cache.get_or_set(('requests', company_id, correspondent_id), load)
+
+
+def company_status_counts():
+    """
+    Contagem de empresas por status do usuário em uma única consulta GROUP BY
+    """
+    def load():
+        return dict(db.session.query(User.status, db.func.count(Company.id))
+                    .join(Company, Company.user_id == User.id)
+                    .group_by(User.status).all())
+
+    return _cache.get_or_set(('companies',), load)
+
+
+def invalidate_status_counts(company_id=None, correspondent_id=None):
+    """
+    Remove do cache as contagens afetadas pela mudança de status de uma solicitação
+    """
+    _cache.discard(('requests', None, None),
+                   ('requests', company_id, None),
+                   ('requests', None, correspondent_id))
+
+
+def invalidate_company_counts():
+    _cache.discard(('companies',))
@@ -0,0 +1,118 @@
+from flask import request, url_for, abort
+from sqlalchemy import and_, or_
+from datetime import datetime
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(sort_value, row_id):
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decodifica um cursor gerado por encode_cursor. Retorna (valor de ordenação, id)
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+        row_id = int(row_id)
+    except (TypeError, ValueError):
+        raise ValueError('Cursor inválido')
+    if isinstance(sort_value, str):
+        try:
+            sort_value = datetime.fromisoformat(sort_value)
+        except ValueError:
+            pass
+    return sort_value, row_id
+
+
+class KeysetPage:
+    """
+    Página de resultados obtida por paginação keyset (cursor)
+    """
+
+    def __init__(self, items, limit, next_cursor=None):
+        self.items = items
+        self.limit = limit
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def next_url(self):
+        """
+        URL da próxima página, preservando os filtros da requisição atual
+        """
+        if not self.has_next:
+            return None
+        args = request.args.to_dict()
+        args.update(request.view_args or {})
+        args['cursor'] = self.next_cursor
+        return url_for(request.endpoint, **args)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def paginate_keyset(query, sort_column, id_column, cursor=None, limit=DEFAULT_PAGE_SIZE,
+                    descending=True, row_key=None):
+    """
+    Pagina a consulta por (sort_column, id_column) sem OFFSET, de forma que o
+    custo de cada página não dependa da quantidade de linhas anteriores.
+    row_key extrai (valor de ordenação, id) de um item quando a ordenação usa
+    uma coluna de outra tabela do join.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        if descending:
+            query = query.filter(or_(sort_column < sort_value,
+                                     and_(sort_column == sort_value, id_column < row_id)))
+        else:
+            query = query.filter(or_(sort_column > sort_value,
+                                     and_(sort_column == sort_value, id_column > row_id)))
+
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    # Buscar uma linha extra para saber se existe próxima página
+    rows = query.limit(limit + 1).all()
+    items = rows[:limit]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        if row_key is not None:
+            next_cursor = encode_cursor(*row_key(last))
+        else:
+            next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+
+    return KeysetPage(items, limit, next_cursor)
+
+
+def paginate_request(query, sort_column, id_column, descending=True, row_key=None):
+    """
+    Aplica paginação keyset usando os parâmetros cursor e limit da requisição atual
+    """
+    try:
+        return paginate_keyset(query, sort_column, id_column,
+                               cursor=request.args.get('cursor'),
+                               limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+                               descending=descending,
+                               row_key=row_key)
+    except ValueError:
+        abort(400)
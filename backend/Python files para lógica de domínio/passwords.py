@@ -0,0 +1,103 @@
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import threading
+
+DEFAULT_HASH_METHOD = 'pbkdf2:sha256'
+DEFAULT_HASH_WORKERS = 2
+DEFAULT_HASH_TIMEOUT = 10
+DEFAULT_WORKER_THREADS = 8
+
+
+class PasswordHashBusy(Exception):
+    """
+    O pool de verificação de senhas está cheio
+    """
+
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+
+
+def _pool():
+    # O pool é criado sob demanda em cada processo (depois do fork do gunicorn)
+    global _executor, _slots
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                workers = current_app.config.get('PASSWORD_HASH_WORKERS', DEFAULT_HASH_WORKERS)
+                threads = current_app.config.get('WORKER_THREADS', DEFAULT_WORKER_THREADS)
+                queue_size = current_app.config.get('PASSWORD_HASH_QUEUE_SIZE')
+                if queue_size is None:
+                    queue_size = max(threads // 2 - workers, 0)
+                # Menos vagas que threads no worker: senão o limite nunca é atingido
+                # e um pico de logins ocupa todas as threads
+                _slots = threading.BoundedSemaphore(max(min(workers + queue_size, threads - 1), 1))
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+    return _executor, _slots
+
+
+def _run(fn, *args):
+    """
+    Executa o cálculo de hash no pool limitado. O PBKDF2 libera o GIL, então as
+    demais threads do worker continuam atendendo outras rotas enquanto isso.
+    """
+    executor, slots = _pool()
+    timeout = current_app.config.get('PASSWORD_HASH_TIMEOUT', DEFAULT_HASH_TIMEOUT)
+
+    # Pool cheio: falha na hora (503) em vez de prender mais uma thread do worker
+    if not slots.acquire(blocking=False):
+        raise PasswordHashBusy()
+    try:
+        future = executor.submit(fn, *args)
+    except Exception:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        raise PasswordHashBusy()
+
+
+def _normalize_method(method):
+    # O werkzeug grava o número de iterações no hash mesmo quando ele não é informado
+    parts = method.split(':')
+    if parts[0] == 'pbkdf2' and len(parts) == 2:
+        parts.append(str(DEFAULT_PBKDF2_ITERATIONS))
+    return ':'.join(parts)
+
+
+def hash_method():
+    return _normalize_method(current_app.config.get('PASSWORD_HASH_METHOD', DEFAULT_HASH_METHOD))
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, hash_method())
+
+
+def verify_password(password_hash, password):
+    if not password_hash or password is None:
+        return False
+    return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """
+    Indica se o hash armazenado usa algoritmo ou custo diferente do configurado
+    """
+    return _normalize_method(password_hash.split('$', 1)[0]) != hash_method()
+
+
+def verify_and_update(user, password):
+    """
+    Verifica a senha do usuário e, se estiver correta, regrava o hash com o
+    algoritmo/custo configurado quando necessário (sem commit)
+    """
+    if not verify_password(user.password_hash, password):
+        return False
+    if needs_rehash(user.password_hash):
+        user.password_hash = hash_password(password)
+    return True
@@ -0,0 +1,150 @@
+from flask import current_app, session, g, redirect, url_for, flash
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, make_transient_to_detached, set_committed_value
+from src.models.user import User
+from src import db
+from collections import OrderedDict, defaultdict
+from functools import wraps
+import threading
+import time
+
+# Relacionamento de perfil carregado para cada papel
+PROFILE_RELATIONSHIPS = {
+    'company': 'company',
+    'correspondent': 'correspondent',
+}
+
+PROFILE_NOT_FOUND_MESSAGES = {
+    'company': 'Perfil de empresa não encontrado.',
+    'correspondent': 'Perfil de correspondente não encontrado.',
+}
+
+PRINCIPAL_CACHE_SIZE = 10000
+
+
+def _snapshot(obj):
+    if obj is None:
+        return None
+    mapper = inspect(obj).mapper
+    return mapper.class_, {attr.key: getattr(obj, attr.key) for attr in mapper.column_attrs}
+
+
+def _restore(snapshot):
+    # Recria a instância como persistente na sessão atual sem consultar o banco
+    cls, values = snapshot
+    obj = cls(**values)
+    make_transient_to_detached(obj)
+    return db.session.merge(obj, load=False)
+
+
+class PrincipalCache:
+    """
+    Cache local ao processo dos dados de usuário e perfil, por user_id.
+    Cada entrada guarda o carimbo de versão vigente quando foi criada; uma
+    invalidação incrementa a versão e descarta entradas antigas, inclusive as
+    gravadas por carregamentos que começaram antes da invalidação.
+    """
+
+    def __init__(self, max_size=PRINCIPAL_CACHE_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._versions = defaultdict(int)
+
+    def version(self, user_id):
+        with self._lock:
+            return self._versions[user_id]
+
+    def get(self, user_id, ttl):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            version, stored_at, value = entry
+            if version != self._versions[user_id] or time.monotonic() - stored_at > ttl:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return value
+
+    def set(self, user_id, version, value):
+        with self._lock:
+            if version != self._versions[user_id]:
+                return
+            self._entries[user_id] = (version, time.monotonic(), value)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._versions[user_id] += 1
+            self._entries.pop(user_id, None)
+
+
+principal_cache = PrincipalCache()
+
+
+def invalidate_principal(user_id):
+    principal_cache.invalidate(user_id)
+
+
+def load_principal(user_id, role, fresh=False):
+    """
+    Carrega o usuário e o perfil do papel em uma única consulta (joined load).
+    Retorna (user, profile) ou None se o usuário não existir.
+    """
+    relationship = PROFILE_RELATIONSHIPS.get(role)
+    ttl = current_app.config.get('PRINCIPAL_CACHE_TTL', 0)
+
+    if ttl and not fresh:
+        cached = principal_cache.get(user_id, ttl)
+        if cached is not None:
+            user_snapshot, profile_snapshot = cached
+            user = _restore(user_snapshot)
+            profile = _restore(profile_snapshot) if profile_snapshot else None
+            if relationship:
+                set_committed_value(user, relationship, profile)
+            return user, profile
+
+    version = principal_cache.version(user_id)
+
+    query = User.query
+    if relationship:
+        query = query.options(joinedload(getattr(User, relationship)))
+    user = query.filter(User.id == user_id).first()
+    if user is None:
+        return None
+
+    profile = getattr(user, relationship) if relationship else None
+
+    if ttl:
+        principal_cache.set(user_id, version, (_snapshot(user), _snapshot(profile)))
+
+    return user, profile
+
+
+def role_required(role, fresh=False):
+    """
+    Verifica o papel do usuário na sessão e carrega usuário e perfil uma única
+    vez por requisição, disponibilizando-os em g.user e g.<papel>.
+    Use fresh=True em rotas que alteram o perfil, para não usar o cache.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if 'user_id' not in session or session.get('user_role') != role:
+                return redirect(url_for('auth.login'))
+
+            principal = load_principal(session['user_id'], role, fresh=fresh)
+            if principal is None or (role in PROFILE_RELATIONSHIPS and principal[1] is None):
+                flash(PROFILE_NOT_FOUND_MESSAGES.get(role, 'Usuário não encontrado.'), 'error')
+                return redirect(url_for('auth.logout'))
+
+            g.user, g.profile = principal
+            if role in PROFILE_RELATIONSHIPS:
+                setattr(g, role, g.profile)
+
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,138 @@
+from src import db
+from src.models.financial_rollup import FinancialRollup
+from src.models.service_request import ServiceRequest
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from datetime import date, datetime
+
+# Status finais consolidados nos relatórios
+ROLLUP_STATUSES = ('completed', 'cancelled')
+
+ROLLUP_DIMENSIONS = {
+    'month': FinancialRollup.month,
+    'state': FinancialRollup.state,
+    'service_type': FinancialRollup.service_type,
+    'company_id': FinancialRollup.company_id,
+    'status': FinancialRollup.status,
+}
+
+
+def _key(service_request, status):
+    month = service_request.date_time.date().replace(day=1)
+    return {
+        'month': month,
+        'state': service_request.state or '',
+        'service_type': service_request.service_type,
+        'company_id': service_request.company_id,
+        'status': status,
+    }
+
+
+def apply_transition(service_request, status, sign=1):
+    """
+    Acumula uma solicitação que chegou a um status final na tabela de
+    consolidação. Deve ser chamada na mesma transação da mudança de status.
+    """
+    if status not in ROLLUP_STATUSES:
+        return
+
+    key = _key(service_request, status)
+    revenue = (service_request.company_value or 0) * sign
+    cost = (service_request.correspondent_value or 0) * sign
+    margin = (service_request.profit_margin or 0) * sign
+
+    increment = update(FinancialRollup).where(
+        *[ROLLUP_DIMENSIONS[name] == value for name, value in key.items()]
+    ).values(
+        request_count=FinancialRollup.request_count + sign,
+        revenue=FinancialRollup.revenue + revenue,
+        cost=FinancialRollup.cost + cost,
+        margin=FinancialRollup.margin + margin,
+        updated_at=datetime.utcnow(),
+    ).execution_options(synchronize_session=False)
+
+    if db.session.execute(increment).rowcount:
+        return
+
+    # Primeira solicitação desta combinação; outra requisição pode criar a linha ao mesmo tempo
+    try:
+        with db.session.begin_nested():
+            db.session.add(FinancialRollup(request_count=sign, revenue=revenue, cost=cost,
+                                           margin=margin, **key))
+    except IntegrityError:
+        db.session.execute(increment)
+
+
+def _month_expression():
+    if db.engine.dialect.name == 'sqlite':
+        return db.func.strftime('%Y-%m-01', ServiceRequest.date_time)
+    if db.engine.dialect.name == 'mysql':
+        return db.func.date_format(ServiceRequest.date_time, '%Y-%m-01')
+    return db.func.date_trunc('month', ServiceRequest.date_time)
+
+
+def rebuild_rollups():
+    """
+    Recalcula toda a tabela de consolidação a partir de service_requests
+    """
+    month = _month_expression()
+    state = db.func.coalesce(ServiceRequest.state, '')
+
+    source = select(
+        month,
+        state,
+        ServiceRequest.service_type,
+        ServiceRequest.company_id,
+        ServiceRequest.status,
+        db.func.count(ServiceRequest.id),
+        db.func.coalesce(db.func.sum(ServiceRequest.company_value), 0),
+        db.func.coalesce(db.func.sum(ServiceRequest.correspondent_value), 0),
+        db.func.coalesce(db.func.sum(ServiceRequest.profit_margin), 0),
+        db.func.now(),
+    ).where(
+        ServiceRequest.status.in_(ROLLUP_STATUSES)
+    ).group_by(
+        month, state, ServiceRequest.service_type, ServiceRequest.company_id, ServiceRequest.status
+    )
+
+    table = FinancialRollup.__table__
+    db.session.execute(table.delete())
+    db.session.execute(table.insert().from_select(
+        ['month', 'state', 'service_type', 'company_id', 'status',
+         'request_count', 'revenue', 'cost', 'margin', 'updated_at'],
+        source
+    ))
+    db.session.commit()
+
+
+def rollup_report(group_by, status='completed', start=None, end=None, state=None,
+                  service_type=None, company_id=None):
+    """
+    Receita, custo e margem agregados pelas dimensões informadas, lidos da tabela de consolidação
+    """
+    dimensions = [ROLLUP_DIMENSIONS[name].label(name) for name in group_by]
+    query = db.session.query(
+        *dimensions,
+        db.func.sum(FinancialRollup.request_count).label('request_count'),
+        db.func.sum(FinancialRollup.revenue).label('revenue'),
+        db.func.sum(FinancialRollup.cost).label('cost'),
+        db.func.sum(FinancialRollup.margin).label('margin'),
+    )
+
+    if status:
+        query = query.filter(FinancialRollup.status == status)
+    if start:
+        query = query.filter(FinancialRollup.month >= date(start.year, start.month, 1))
+    if end:
+        query = query.filter(FinancialRollup.month <= date(end.year, end.month, 1))
+    if state:
+        query = query.filter(FinancialRollup.state == state.upper())
+    if service_type:
+        query = query.filter(FinancialRollup.service_type == service_type)
+    if company_id:
+        query = query.filter(FinancialRollup.company_id == company_id)
+
+    if dimensions:
+        query = query.group_by(*[ROLLUP_DIMENSIONS[name] for name in group_by]).order_by(
+            *[ROLLUP_DIMENSIONS[name] for name in group_by])
+    return query.all()
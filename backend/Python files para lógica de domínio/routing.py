@@ -0,0 +1,111 @@
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm
+from functools import wraps
+import random
+import time
+
+# Binds cujo nome começa com este prefixo são réplicas somente leitura do banco principal
+REPLICA_BIND_PREFIX = 'replica'
+
+# Instante da última escrita do usuário, guardado na sessão do Flask
+LAST_WRITE_KEY = '_db_last_write'
+
+
+def engine_options(uri, pool_size=10, max_overflow=20, pool_timeout=30, pool_recycle=1800, pool_pre_ping=True):
+    """
+    Opções do pool de conexões. O SQLite usa um pool próprio, sem tamanho configurável.
+    """
+    options = {'pool_pre_ping': pool_pre_ping}
+    if not uri.startswith('sqlite'):
+        options.update(pool_size=pool_size, max_overflow=max_overflow,
+                       pool_timeout=pool_timeout, pool_recycle=pool_recycle)
+    return options
+
+
+def replica_binds(urls):
+    """
+    Monta SQLALCHEMY_BINDS a partir de uma lista de URLs separadas por vírgula
+    """
+    urls = [url.strip() for url in (urls or '').split(',') if url.strip()]
+    return {f'{REPLICA_BIND_PREFIX}_{i}': url for i, url in enumerate(urls)}
+
+
+def _replica_keys():
+    binds = current_app.config.get('SQLALCHEMY_BINDS') or {}
+    return [key for key in binds if key.startswith(REPLICA_BIND_PREFIX)]
+
+
+def _mark_write():
+    if has_request_context():
+        g.db_wrote = True
+
+
+def _replica_key():
+    """
+    Réplica a usar na leitura atual, ou None para o banco principal
+    """
+    if not has_request_context() or not g.get('use_replica') or g.get('db_wrote'):
+        return None
+    if 'replica_key' not in g:
+        keys = _replica_keys()
+        window = current_app.config.get('REPLICA_READ_YOUR_WRITES', 0)
+        # Logo após uma escrita do próprio usuário a réplica pode ainda não ter a alteração
+        if not keys or session.get(LAST_WRITE_KEY, 0) + window > time.time():
+            g.replica_key = None
+        else:
+            # A mesma réplica durante toda a requisição
+            g.replica_key = random.choice(keys)
+    return g.replica_key
+
+
+class RoutingSession(SignallingSession):
+    """
+    Sessão que envia as leituras das rotas marcadas com @replica_reads para uma
+    réplica e todo o resto (flush, INSERT/UPDATE/DELETE) para o banco principal
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        # Modelos com __bind_key__ próprio seguem a regra padrão
+        if mapper is not None and mapper.persist_selectable.info.get('bind_key') is not None:
+            return super().get_bind(mapper, clause)
+
+        if self._flushing or getattr(clause, 'is_dml', False):
+            _mark_write()
+            return super().get_bind(mapper, clause)
+
+        replica = _replica_key()
+        if replica:
+            return self.db.get_engine(self.app, bind=replica)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def replica_reads(view):
+    """
+    Permite que as leituras de uma rota GET sejam feitas em uma réplica
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            g.use_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def init_replica_routing(app):
+    @app.after_request
+    def record_write(response):
+        if g.get('db_wrote') and app.config.get('SQLALCHEMY_BINDS'):
+            session[LAST_WRITE_KEY] = time.time()
+        if app.config.get('SQL_INSTRUMENTATION'):
+            response.headers['X-Database-Route'] = g.get('replica_key') or 'primary'
+        return response
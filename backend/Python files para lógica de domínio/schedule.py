@@ -0,0 +1,181 @@
+from src import db
+from src.models.correspondent import Correspondent
+from src.models.service_request import ServiceRequest
+from src.services.matching import ACTIVE_STATUSES
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import datetime, timedelta
+import threading
+import time
+
+# Duração estimada de cada tipo de serviço, já incluindo o deslocamento
+SERVICE_DURATIONS = {
+    'audiencia_conciliacao': timedelta(hours=2),
+    'audiencia_instrucao': timedelta(hours=3),
+    'copia_processos': timedelta(hours=1),
+    'protocolo': timedelta(hours=1),
+}
+DEFAULT_DURATION = timedelta(hours=2)
+MAX_DURATION = max(list(SERVICE_DURATIONS.values()) + [DEFAULT_DURATION])
+
+# Status que comprometem a agenda do correspondente (o aceite confirma o horário)
+COMMITTED_STATUSES = ('accepted', 'in_progress')
+
+# Serviços mais antigos que isso não entram no índice
+HISTORY_WINDOW = timedelta(days=1)
+
+REBUILD_INTERVAL = 300
+
+
+def service_window(date_time, service_type):
+    return date_time, date_time + SERVICE_DURATIONS.get(service_type, DEFAULT_DURATION)
+
+
+class ScheduleIndex:
+    """
+    Agenda em memória dos correspondentes: para cada um, os serviços em
+    andamento ordenados pelo horário de início. Como a duração de um serviço é
+    limitada (MAX_DURATION), um conflito com [início, fim) só pode vir de
+    serviços iniciados em [início - MAX_DURATION, fim), localizados por busca
+    binária.
+    """
+
+    def __init__(self, rebuild_interval=REBUILD_INTERVAL):
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.RLock()
+        self._slots = defaultdict(list)  # correspondent_id -> [(início, fim, service_request_id, status)]
+        self._by_request = {}  # service_request_id -> (correspondent_id, entrada em _slots)
+        self._built_at = None
+
+    def rebuild(self):
+        """
+        Reconstrói a agenda a partir do banco de dados
+        """
+        rows = db.session.query(
+            ServiceRequest.id, ServiceRequest.correspondent_id, ServiceRequest.date_time,
+            ServiceRequest.service_type, ServiceRequest.status
+        ).filter(
+            ServiceRequest.correspondent_id.isnot(None),
+            ServiceRequest.status.in_(ACTIVE_STATUSES),
+            ServiceRequest.date_time >= datetime.utcnow() - HISTORY_WINDOW
+        ).order_by(ServiceRequest.correspondent_id, ServiceRequest.date_time, ServiceRequest.id).all()
+
+        with self._lock:
+            self._slots = defaultdict(list)
+            self._by_request = {}
+            for row in rows:
+                start, end = service_window(row.date_time, row.service_type)
+                slot = (start, end, row.id, row.status)
+                self._slots[row.correspondent_id].append(slot)
+                self._by_request[row.id] = (row.correspondent_id, slot)
+            self._built_at = time.monotonic()
+
+    def ensure_fresh(self):
+        if self._built_at is None or time.monotonic() - self._built_at > self.rebuild_interval:
+            self.rebuild()
+
+    def _discard(self, service_request_id):
+        current = self._by_request.pop(service_request_id, None)
+        if current is None:
+            return
+        correspondent_id, slot = current
+        slots = self._slots.get(correspondent_id)
+        if slots:
+            index = bisect_left(slots, slot)
+            if index < len(slots) and slots[index] == slot:
+                del slots[index]
+            if not slots:
+                del self._slots[correspondent_id]
+
+    def update(self, service_request_id, correspondent_id, date_time, service_type, status):
+        """
+        Registra (ou move) o horário de uma solicitação após uma mudança de status
+        """
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._discard(service_request_id)
+            if correspondent_id is None or status not in ACTIVE_STATUSES or date_time is None:
+                return
+            start, end = service_window(date_time, service_type)
+            slot = (start, end, service_request_id, status)
+            insort(self._slots[int(correspondent_id)], slot)
+            self._by_request[service_request_id] = (int(correspondent_id), slot)
+
+    def remove(self, service_request_id):
+        with self._lock:
+            self._discard(service_request_id)
+
+    def conflicts(self, correspondent_id, date_time, service_type, exclude=None, statuses=ACTIVE_STATUSES):
+        """
+        Solicitações do correspondente (nos status informados) cujo horário se
+        sobrepõe ao do serviço
+        """
+        self.ensure_fresh()
+
+        start, end = service_window(date_time, service_type)
+        with self._lock:
+            slots = self._slots.get(correspondent_id)
+            if not slots:
+                return []
+            low = bisect_left(slots, (start - MAX_DURATION,))
+            high = bisect_left(slots, (end,))
+            return [service_request_id for slot_start, slot_end, service_request_id, status in slots[low:high]
+                    if slot_end > start and service_request_id != exclude and status in statuses]
+
+    def is_busy(self, correspondent_id, date_time, service_type, exclude=None, statuses=ACTIVE_STATUSES):
+        return bool(self.conflicts(correspondent_id, date_time, service_type, exclude, statuses))
+
+    def busy_among(self, correspondent_ids, date_time, service_type, statuses=ACTIVE_STATUSES):
+        """
+        Subconjunto dos correspondentes informados que já têm serviço no horário
+        """
+        self.ensure_fresh()
+
+        with self._lock:
+            scheduled = [correspondent_id for correspondent_id in correspondent_ids if correspondent_id in self._slots]
+        return {correspondent_id for correspondent_id in scheduled
+                if self.conflicts(correspondent_id, date_time, service_type, statuses=statuses)}
+
+
+schedule_index = ScheduleIndex()
+
+
+def lock_schedule(correspondent_id):
+    """
+    Bloqueia a linha do correspondente (SELECT ... FOR UPDATE) até o fim da
+    transação, serializando atribuições e aceites que mexem na sua agenda.
+    Deve ser chamada antes da transição, para que todas as transações
+    concorrentes peguem os locks na mesma ordem.
+    """
+    return db.session.query(Correspondent).filter(Correspondent.id == correspondent_id).with_for_update().first()
+
+
+def booked_conflicts(correspondent_id, date_time, service_type, exclude=None, statuses=ACTIVE_STATUSES):
+    """
+    Mesma verificação de ScheduleIndex.conflicts, feita no banco de dados (usa
+    ix_service_requests_correspondent_status_date_time_id). A leitura é com
+    lock, então enxerga o que outras transações já confirmaram mesmo depois de
+    lock_schedule ter esperado por elas.
+    """
+    start, end = service_window(date_time, service_type)
+    query = db.session.query(ServiceRequest.id, ServiceRequest.date_time, ServiceRequest.service_type).filter(
+        ServiceRequest.correspondent_id == correspondent_id,
+        ServiceRequest.status.in_(statuses),
+        ServiceRequest.date_time >= start - MAX_DURATION,
+        ServiceRequest.date_time < end
+    )
+    if exclude is not None:
+        query = query.filter(ServiceRequest.id != exclude)
+    return [row.id for row in query.with_for_update().all()
+            if service_window(row.date_time, row.service_type)[1] > start]
+
+
+def is_booked(correspondent_id, date_time, service_type, exclude=None, statuses=ACTIVE_STATUSES):
+    """
+    Verificação usada antes de gravar uma atribuição ou aceite. Consulta sempre
+    o banco: o índice em memória de cada worker pode estar defasado nos dois
+    sentidos (serviços novos ou já liberados em outros processos) e serve
+    apenas para as listas de candidatos.
+    """
+    return bool(booked_conflicts(correspondent_id, date_time, service_type, exclude, statuses))
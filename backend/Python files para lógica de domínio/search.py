@@ -0,0 +1,212 @@
+from sqlalchemy import DDL, event, inspect, select, delete, insert, table, column, literal_column
+from sqlalchemy.orm import Session
+from src.models.company import Company
+from src.models.document import Document
+from src.models.search_entry import SearchEntry
+from src.models.service_request import ServiceRequest
+from src import db
+import re
+
+# Campos que alteram o texto ou os filtros da busca
+INDEXED_FIELDS = ('details', 'instructions', 'service_type', 'city', 'state', 'company_id', 'status')
+
+MAX_TERMS = 10
+MAX_RESULTS = 1000
+DEFAULT_PER_PAGE = 20
+REBUILD_BATCH_SIZE = 1000
+
+# Índice FTS5 usado no SQLite local; a linha do FTS tem rowid = service_request_id
+search_fts = table('search_fts', column('rowid'), column('content'))
+
+# MySQL: índice FULLTEXT mantido pelo próprio InnoDB
+event.listen(SearchEntry.__table__, 'after_create', DDL(
+    'ALTER TABLE search_entries ADD FULLTEXT INDEX ft_search_entries_content (content)'
+).execute_if(dialect='mysql'))
+
+# SQLite: tabela virtual FTS5, atualizada junto com search_entries
+event.listen(SearchEntry.__table__, 'after_create', DDL(
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(content, tokenize='unicode61 remove_diacritics 2')"
+).execute_if(dialect='sqlite'))
+
+
+def _dialect(connection):
+    return connection.dialect.name
+
+
+def _content(row, file_names):
+    parts = [row.details, row.instructions, (row.service_type or '').replace('_', ' '),
+             row.city, row.state, row.company_name]
+    parts.extend(file_names)
+    return ' '.join(part for part in parts if part)
+
+
+def index_service_requests(connection, ids):
+    """
+    Regrava as linhas de busca das solicitações informadas. Solicitações que não
+    existem mais são removidas do índice.
+    """
+    ids = list(ids)
+    if not ids:
+        return
+
+    rows = connection.execute(
+        select(ServiceRequest.id, ServiceRequest.company_id, ServiceRequest.status, ServiceRequest.state,
+               ServiceRequest.service_type, ServiceRequest.created_at, ServiceRequest.details,
+               ServiceRequest.instructions, ServiceRequest.city, Company.company_name)
+        .select_from(ServiceRequest.__table__)
+        .outerjoin(Company.__table__, Company.id == ServiceRequest.company_id)
+        .where(ServiceRequest.id.in_(ids))
+    ).fetchall()
+
+    file_names = {}
+    for service_request_id, file_name in connection.execute(
+            select(Document.service_request_id, Document.file_name)
+            .where(Document.service_request_id.in_(ids))):
+        file_names.setdefault(service_request_id, []).append(file_name)
+
+    entries = [{
+        'service_request_id': row.id,
+        'company_id': row.company_id,
+        'status': row.status,
+        'state': row.state,
+        'service_type': row.service_type,
+        'created_at': row.created_at,
+        'content': _content(row, file_names.get(row.id, [])),
+    } for row in rows]
+
+    entry_table = SearchEntry.__table__
+    connection.execute(delete(entry_table).where(entry_table.c.service_request_id.in_(ids)))
+    if entries:
+        connection.execute(insert(entry_table), entries)
+
+    if _dialect(connection) == 'sqlite':
+        connection.execute(delete(search_fts).where(search_fts.c.rowid.in_(ids)))
+        if entries:
+            connection.execute(insert(search_fts), [
+                {'rowid': entry['service_request_id'], 'content': entry['content']} for entry in entries
+            ])
+
+
+@event.listens_for(Session, 'after_flush')
+def _index_flushed(session, flush_context):
+    """
+    Atualiza o índice na mesma transação das alterações, uma vez por flush
+    """
+    ids = set()
+    for obj in session.new | session.deleted:
+        if isinstance(obj, ServiceRequest):
+            ids.add(obj.id)
+        elif isinstance(obj, Document):
+            ids.add(obj.service_request_id)
+    for obj in session.dirty:
+        if isinstance(obj, ServiceRequest):
+            state = inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in INDEXED_FIELDS):
+                ids.add(obj.id)
+        elif isinstance(obj, Document) and inspect(obj).attrs.file_name.history.has_changes():
+            ids.add(obj.service_request_id)
+    ids.discard(None)
+    if ids:
+        index_service_requests(session.connection(), ids)
+
+
+def reindex_company(company_id):
+    """
+    Regrava as linhas de busca de uma empresa (após troca do nome)
+    """
+    ids = [row[0] for row in db.session.query(ServiceRequest.id).filter(ServiceRequest.company_id == company_id)]
+    for start in range(0, len(ids), REBUILD_BATCH_SIZE):
+        index_service_requests(db.session.connection(), ids[start:start + REBUILD_BATCH_SIZE])
+        db.session.commit()
+
+
+def rebuild_search_index(batch_size=REBUILD_BATCH_SIZE):
+    """
+    Recria o índice inteiro a partir de service_requests, em lotes por id
+    """
+    connection = db.session.connection()
+    connection.execute(delete(SearchEntry.__table__))
+    if _dialect(connection) == 'sqlite':
+        connection.execute(delete(search_fts))
+    db.session.commit()
+
+    last_id = 0
+    total = 0
+    while True:
+        ids = [row[0] for row in db.session.query(ServiceRequest.id).filter(
+            ServiceRequest.id > last_id).order_by(ServiceRequest.id).limit(batch_size)]
+        if not ids:
+            break
+        index_service_requests(db.session.connection(), ids)
+        db.session.commit()
+        last_id = ids[-1]
+        total += len(ids)
+    return total
+
+
+def _terms(text):
+    return re.findall(r'\w+', (text or '').lower())[:MAX_TERMS]
+
+
+class SearchResults:
+    """
+    Página de resultados ordenados por relevância
+    """
+
+    def __init__(self, items, page, per_page, has_next):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.has_next = has_next
+
+
+def search_service_requests(text, status=None, state=None, service_type=None, company_id=None,
+                            start=None, end=None, page=1, per_page=DEFAULT_PER_PAGE, options=()):
+    """
+    Busca textual nas solicitações (detalhes, instruções, tipo, local, empresa e
+    nomes dos documentos), com filtros e ordenação por relevância
+    """
+    page = max(1, page)
+    per_page = max(1, min(per_page, 100))
+    terms = _terms(text)
+    if not terms or page * per_page > MAX_RESULTS:
+        return SearchResults([], page, per_page, False)
+
+    query = db.session.query(SearchEntry.service_request_id)
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == 'sqlite':
+        fts = literal_column('search_fts')
+        query = query.join(search_fts, search_fts.c.rowid == SearchEntry.service_request_id).filter(
+            fts.op('MATCH')(' '.join(f'"{term}"*' for term in terms))
+        ).order_by(db.func.bm25(fts))
+    elif dialect == 'mysql':
+        # Termos abaixo do tamanho mínimo do InnoDB (3) não estão no índice
+        terms = [term for term in terms if len(term) >= 3]
+        if not terms:
+            return SearchResults([], page, per_page, False)
+        score = SearchEntry.content.match(' '.join(f'+{term}*' for term in terms))
+        query = query.filter(score).order_by(score.desc())
+    else:
+        query = query.filter(*[SearchEntry.content.ilike(f'%{term}%') for term in terms]).order_by(
+            SearchEntry.created_at.desc())
+
+    if status:
+        query = query.filter(SearchEntry.status == status)
+    if state:
+        query = query.filter(SearchEntry.state == state.upper())
+    if service_type:
+        query = query.filter(SearchEntry.service_type == service_type)
+    if company_id:
+        query = query.filter(SearchEntry.company_id == company_id)
+    if start:
+        query = query.filter(SearchEntry.created_at >= start)
+    if end:
+        query = query.filter(SearchEntry.created_at < end)
+
+    ids = [row[0] for row in query.offset((page - 1) * per_page).limit(per_page + 1)]
+    has_next = len(ids) > per_page
+    ids = ids[:per_page]
+
+    loaded = {r.id: r for r in ServiceRequest.query.options(*options).filter(ServiceRequest.id.in_(ids))} if ids else {}
+    return SearchResults([loaded[i] for i in ids if i in loaded], page, per_page, has_next)
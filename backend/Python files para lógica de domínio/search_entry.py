@@ -0,0 +1,22 @@
+from src import db
+from datetime import datetime
+
+class SearchEntry(db.Model):
+    __tablename__ = 'search_entries'
+    __table_args__ = (
+        db.Index('ix_search_entries_status_created_at', 'status', 'created_at'),
+        db.Index('ix_search_entries_company_id', 'company_id'),
+    )
+
+    # Uma linha por solicitação, com o texto pesquisável já desnormalizado
+    service_request_id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # Sem FK: a linha é removida junto com a solicitação
+    company_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    state = db.Column(db.String(2), nullable=True)
+    service_type = db.Column(db.String(50), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=True)  # Data de criação da solicitação
+    content = db.Column(db.Text, nullable=False)  # Detalhes, instruções, local, empresa e nomes de arquivos
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SearchEntry {self.service_request_id}>'
@@ -1,15 +1,61 @@
 from src import db
 from datetime import datetime
 import json
+import unicodedata
+
+# Unidades federativas aceitas na coluna state (sigla: nome)
+BRAZILIAN_STATES = {
+    'AC': 'Acre', 'AL': 'Alagoas', 'AP': 'Amapá', 'AM': 'Amazonas', 'BA': 'Bahia', 'CE': 'Ceará',
+    'DF': 'Distrito Federal', 'ES': 'Espírito Santo', 'GO': 'Goiás', 'MA': 'Maranhão', 'MT': 'Mato Grosso',
+    'MS': 'Mato Grosso do Sul', 'MG': 'Minas Gerais', 'PA': 'Pará', 'PB': 'Paraíba', 'PR': 'Paraná',
+    'PE': 'Pernambuco', 'PI': 'Piauí', 'RJ': 'Rio de Janeiro', 'RN': 'Rio Grande do Norte',
+    'RS': 'Rio Grande do Sul', 'RO': 'Rondônia', 'RR': 'Roraima', 'SC': 'Santa Catarina', 'SP': 'São Paulo',
+    'SE': 'Sergipe', 'TO': 'Tocantins',
+}
+
+
+def _fold(value):
+    return unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode().strip().upper()
+
+
+_STATES_BY_NAME = {_fold(name): uf for uf, name in BRAZILIAN_STATES.items()}
+
+
+def normalize_state(value):
+    """
+    Sigla da UF a partir da sigla ou do nome do estado (com ou sem acentos).
+    Retorna None para valores vazios ou desconhecidos.
+    """
+    folded = _fold(value or '')
+    if folded in BRAZILIAN_STATES:
+        return folded
+    return _STATES_BY_NAME.get(folded)
+
 
 class ServiceRequest(db.Model):
     __tablename__ = 'service_requests'
+    __table_args__ = (
+        db.Index('ix_service_requests_state_city_date_time', 'state', 'city', 'date_time'),
+        db.Index('ix_service_requests_state_created_at', 'state', 'created_at'),
+        # Índices de suporte à paginação keyset das listagens
+        db.Index('ix_service_requests_created_at_id', 'created_at', 'id'),
+        db.Index('ix_service_requests_status_created_at_id', 'status', 'created_at', 'id'),
+        db.Index('ix_service_requests_company_created_at_id', 'company_id', 'created_at', 'id'),
+        db.Index('ix_service_requests_correspondent_status_date_time_id',
+                 'correspondent_id', 'status', 'date_time', 'id'),
+        # Índices de suporte aos ETags da API (MAX(updated_at) por escopo)
+        db.Index('ix_service_requests_updated_at', 'updated_at'),
+        db.Index('ix_service_requests_company_updated_at', 'company_id', 'updated_at'),
+        db.Index('ix_service_requests_correspondent_updated_at', 'correspondent_id', 'updated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
     correspondent_id = db.Column(db.Integer, db.ForeignKey('correspondents.id'), nullable=True)
     service_type = db.Column(db.String(50), nullable=False)  # audiencia_conciliacao, audiencia_instrucao, copia_processos, protocolo, etc.
-    location = db.Column(db.Text, nullable=False)  # JSON object com city, state
+    location = db.Column(db.Text, nullable=False)  # JSON object com city, state (mantido por compatibilidade)
+    city = db.Column(db.String(100), nullable=True)
+    state = db.Column(db.String(2), nullable=True)
     date_time = db.Column(db.DateTime, nullable=False)
     status = db.Column(db.String(20), nullable=False)  # pending_approval, approved, assigned, accepted, rejected, in_progress, completed, cancelled
     company_value = db.Column(db.Float, nullable=True)  # Valor cobrado da empresa
@@ -18,21 +64,38 @@ class ServiceRequest(db.Model):
     details = db.Column(db.Text)  # Detalhes da solicitação
     instructions = db.Column(db.Text)  # Instruções para o correspondente
     deadline = db.Column(db.DateTime, nullable=True)  # Prazo para entrega de documentação
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Ordenação da paginação keyset
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relacionamentos
     documents = db.relationship('Document', backref='service_request', lazy=True, cascade="all, delete-orphan")
+    company = db.relationship('Company', lazy=True)
+    correspondent = db.relationship('Correspondent', lazy=True)
     
     def __repr__(self):
         return f'<ServiceRequest {self.id}>'
     
     @property
     def location_dict(self):
+        if self.state is not None or self.city is not None:
+            return {'city': self.city, 'state': self.state}
         if self.location:
             return json.loads(self.location)
         return {}
     
     @location_dict.setter
     def location_dict(self, value):
-        self.location = json.dumps(value)
+        value = value or {}
+        self.city = value.get('city')
+        self.state = normalize_state(value.get('state'))  # Valores desconhecidos ficam sem UF
+        self.location = json.dumps({'city': self.city, 'state': self.state})
+    
+    @classmethod
+    def in_location(cls, state, city=None):
+        """
+        Filtra solicitações por estado (e opcionalmente cidade) usando as colunas indexadas
+        """
+        query = cls.query.filter(cls.state == state.strip().upper())
+        if city:
+            query = query.filter(cls.city == city)
+        return query
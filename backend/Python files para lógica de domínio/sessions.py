@@ -0,0 +1,433 @@
+from flask import current_app, session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import Signer, BadSignature
+from sqlalchemy import delete, insert, select, update
+from src.models.stored_session import StoredSession
+from src import db
+from werkzeug.datastructures import CallbackDict
+from collections import OrderedDict
+from datetime import datetime
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+SESSION_CACHE_SIZE = 10000
+
+# Tentativas de gravação quando outra requisição alterou a sessão ao mesmo tempo
+SAVE_ATTEMPTS = 3
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Marca de chave removida nas alterações pendentes de uma sessão
+_DELETED = object()
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """
+    Sessão guardada no servidor; o cookie leva apenas o identificador e a
+    versão, assinados. As alterações feitas na requisição ficam registradas
+    para serem reaplicadas sobre a versão mais recente em caso de conflito.
+    """
+
+    def __init__(self, initial=None, sid=None, expires_at=None, version=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.version = version
+        self.new = sid is None
+        self.modified = False
+        self.accessed = False
+        self.previous_sid = None
+        self.from_cache = False
+        self.changes = {}
+        self.cleared = False
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def __setitem__(self, key, value):
+        self.changes[key] = value
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self.changes[key] = _DELETED
+        super().__delitem__(key)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        if key not in self:
+            self[key] = default
+        return super().__getitem__(key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def pop(self, key, *default):
+        if key in self:
+            self.changes[key] = _DELETED
+        return super().pop(key, *default)
+
+    def popitem(self):
+        key, value = super().popitem()
+        self.changes[key] = _DELETED
+        return key, value
+
+    def clear(self):
+        self.changes = {}
+        self.cleared = True
+        super().clear()
+
+    def rebase(self, data, version, expires_at):
+        """
+        Reaplica as alterações desta requisição sobre o conteúdo gravado por outra
+        """
+        merged = {} if self.cleared else dict(data)
+        for key, value in self.changes.items():
+            if value is _DELETED:
+                merged.pop(key, None)
+            else:
+                merged[key] = value
+        dict.clear(self)
+        dict.update(self, merged)
+        self.version = version
+        self.expires_at = expires_at
+
+    def regenerate(self):
+        """
+        Troca o identificador mantendo o conteúdo (após o login, contra fixação de sessão)
+        """
+        if self.sid is not None:
+            self.previous_sid = self.sid
+        self.sid = None
+        self.version = None
+        self.modified = True
+
+
+class DatabaseSessionStore:
+    """
+    Sessões na tabela sessions do banco principal, compartilhada por todos os
+    workers e servidores. Usa conexões próprias, fora da transação da requisição.
+    """
+    table = StoredSession.__table__
+
+    def load(self, sid):
+        with db.engine.connect() as connection:
+            row = connection.execute(
+                select(self.table.c.data, self.table.c.expires_at, self.table.c.version)
+                .where(self.table.c.id == sid)
+            ).first()
+        if row is None:
+            return None
+        return row.data, (row.expires_at - _EPOCH).total_seconds(), row.version
+
+    def insert(self, sid, data, expires_at):
+        with db.engine.begin() as connection:
+            connection.execute(insert(self.table).values(
+                id=sid, data=data, expires_at=datetime.utcfromtimestamp(expires_at), version=1,
+                updated_at=datetime.utcnow()))
+        return 1
+
+    def save(self, sid, data, expires_at, version):
+        """
+        Grava apenas se a sessão continuar na versão lida. Retorna a nova versão
+        ou None (sessão alterada ou removida por outra requisição).
+        """
+        with db.engine.begin() as connection:
+            updated = connection.execute(
+                update(self.table).where(self.table.c.id == sid, self.table.c.version == version).values(
+                    data=data, expires_at=datetime.utcfromtimestamp(expires_at), version=version + 1,
+                    updated_at=datetime.utcnow())
+            ).rowcount
+        return version + 1 if updated else None
+
+    def delete(self, sid):
+        with db.engine.begin() as connection:
+            connection.execute(delete(self.table).where(self.table.c.id == sid))
+
+    def sweep(self, now):
+        with db.engine.begin() as connection:
+            return connection.execute(
+                delete(self.table).where(self.table.c.expires_at < datetime.utcfromtimestamp(now))
+            ).rowcount
+
+
+class SqliteSessionStore:
+    """
+    Sessões em um arquivo SQLite local, compartilhado pelos workers de um
+    mesmo servidor. Uma conexão por thread e por processo (após o fork).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL, '
+                               'expires_at REAL NOT NULL, version INTEGER NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_sessions_expires_at ON sessions (expires_at)')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def load(self, sid):
+        return self._connection().execute('SELECT data, expires_at, version FROM sessions WHERE id = ?',
+                                          (sid,)).fetchone()
+
+    def insert(self, sid, data, expires_at):
+        self._connection().execute('INSERT INTO sessions (id, data, expires_at, version) VALUES (?, ?, ?, 1)',
+                                   (sid, data, expires_at))
+        return 1
+
+    def save(self, sid, data, expires_at, version):
+        updated = self._connection().execute(
+            'UPDATE sessions SET data = ?, expires_at = ?, version = ? WHERE id = ? AND version = ?',
+            (data, expires_at, version + 1, sid, version)).rowcount
+        return version + 1 if updated else None
+
+    def delete(self, sid):
+        self._connection().execute('DELETE FROM sessions WHERE id = ?', (sid,))
+
+    def sweep(self, now):
+        return self._connection().execute('DELETE FROM sessions WHERE expires_at < ?', (now,)).rowcount
+
+
+class SessionCache:
+    """
+    Cache LRU local ao processo das sessões já lidas do armazenamento. Uma
+    entrada só é usada quando sua versão é a mesma informada no cookie, de
+    modo que o cliente sempre enxerga as próprias gravações, feitas em
+    qualquer worker.
+    """
+
+    def __init__(self, max_size=SESSION_CACHE_SIZE, ttl=5):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, sid, version):
+        if not self.ttl or version is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if value[2] != version or time.monotonic() - stored_at > self.ttl:
+                del self._entries[sid]
+                return None
+            self._entries.move_to_end(sid)
+            return value
+
+    def set(self, sid, data, expires_at, version):
+        if not self.ttl:
+            return
+        with self._lock:
+            self._entries[sid] = (time.monotonic(), (data, expires_at, version))
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+
+class ServerSessionInterface(SessionInterface):
+    """
+    Sessões no servidor com leitura pelo cache local. Toda gravação é um
+    compare-and-set pela versão: em caso de conflito, as alterações da
+    requisição são reaplicadas sobre a versão atual, e uma sessão removida
+    (logout em outro worker) não é recriada. Sessões sem alteração só são
+    regravadas quando passam da metade da validade; as expiradas são
+    removidas periodicamente.
+    """
+    serializer = TaggedJSONSerializer()
+    session_class = ServerSession
+    salt = 'server-session'
+
+    def __init__(self, store, cache, sweep_interval=300):
+        self.store = store
+        self.cache = cache
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=self.salt)
+
+    def _parse_cookie(self, app, cookie):
+        sid, _, version = self._signer(app).unsign(cookie).decode().partition(':')
+        try:
+            return sid, int(version)
+        except ValueError:
+            return sid, None
+
+    def _delete(self, sid):
+        self.store.delete(sid)
+        self.cache.discard(sid)
+
+    def _sweep(self):
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.sweep_interval
+        self.store.sweep(time.time())
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(app.session_cookie_name)
+        if not cookie:
+            return self.session_class()
+        try:
+            sid, version = self._parse_cookie(app, cookie)
+        except BadSignature:
+            return self.session_class()
+
+        stored = self.cache.get(sid, version)
+        from_cache = stored is not None
+        if stored is None:
+            stored = self.store.load(sid)
+            if stored is not None:
+                self.cache.set(sid, *stored)
+        if stored is None or stored[1] <= time.time():
+            return self.session_class()
+
+        data, expires_at, version = stored
+        try:
+            session = self.session_class(self.serializer.loads(data), sid=sid, expires_at=expires_at, version=version)
+        except ValueError:
+            return self.session_class()
+        session.from_cache = from_cache
+        return session
+
+    def _refresh(self, session, now):
+        """
+        Reaplica as alterações da requisição sobre a versão gravada; retorna
+        False se a sessão foi removida (ex.: logout em outro worker)
+        """
+        self.cache.discard(session.sid)
+        stored = self.store.load(session.sid)
+        if stored is None or stored[1] <= now:
+            return False
+        session.rebase(self.serializer.loads(stored[0]), stored[2], stored[1])
+        session.from_cache = False
+        return True
+
+    def _write(self, session, lifetime):
+        """
+        Grava a sessão; retorna False se ela foi removida por outra requisição
+        """
+        now = time.time()
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+            session.expires_at = now + lifetime
+            data = self.serializer.dumps(dict(session))
+            session.version = self.store.insert(session.sid, data, session.expires_at)
+            self.cache.set(session.sid, data, session.expires_at, session.version)
+            return True
+
+        # Cópia vinda do cache: parte da versão gravada antes de alterar
+        if session.from_cache and not self._refresh(session, now):
+            return False
+
+        for attempt in range(SAVE_ATTEMPTS):
+            data = self.serializer.dumps(dict(session))
+            version = self.store.save(session.sid, data, now + lifetime, session.version)
+            if version is not None:
+                session.version = version
+                session.expires_at = now + lifetime
+                self.cache.set(session.sid, data, session.expires_at, version)
+                return True
+
+            # Conflito: outra requisição gravou a sessão depois da leitura
+            if not self._refresh(session, now):
+                return False
+
+        current_app.logger.warning('Sessão não gravada após %s conflitos seguidos', SAVE_ATTEMPTS)
+        return True
+
+    def save_session(self, app, session, response):
+        name = app.session_cookie_name
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        self._sweep()
+
+        if session.previous_sid is not None:
+            self._delete(session.previous_sid)
+
+        # Sessão esvaziada (logout): remove do armazenamento e apaga o cookie
+        if not session:
+            if session.sid is not None and session.modified:
+                self._delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        if not session.modified and session.sid is not None and session.expires_at - time.time() > lifetime / 2:
+            return
+
+        if not self._write(session, lifetime):
+            response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        response.set_cookie(
+            name,
+            self._signer(app).sign(f'{session.sid}:{session.version}').decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+def regenerate_session():
+    """
+    Novo identificador para a sessão atual (sem efeito com sessões em cookie)
+    """
+    regenerate = getattr(session, 'regenerate', None)
+    if regenerate is not None:
+        regenerate()
+
+
+def init_sessions(app):
+    """
+    Troca a sessão em cookie do Flask pela sessão no servidor indicada em
+    SESSION_BACKEND: database (tabela sessions), sqlite (arquivo local) ou cookie
+    """
+    backend = app.config.get('SESSION_BACKEND', 'cookie')
+    if backend == 'cookie':
+        return
+
+    if backend == 'database':
+        store = DatabaseSessionStore()
+    elif backend == 'sqlite':
+        store = SqliteSessionStore(app.config.get('SESSION_SQLITE_PATH') or
+                                   os.path.join(app.instance_path, 'sessions.sqlite3'))
+    else:
+        raise ValueError(f'SESSION_BACKEND desconhecido: {backend}')
+
+    cache = SessionCache(app.config.get('SESSION_CACHE_SIZE', SESSION_CACHE_SIZE), app.config.get('SESSION_CACHE_TTL', 5))
+    app.session_interface = ServerSessionInterface(store, cache, app.config.get('SESSION_SWEEP_INTERVAL', 300))
@@ -0,0 +1,94 @@
+from src.utils.routing import engine_options, replica_binds
+from datetime import timedelta
+import os
+import secrets
+import tempfile
+import time
+
+
+def _database_url():
+    return os.getenv('DATABASE_URL') or f"mysql+pymysql://{os.getenv('DB_USERNAME', 'root')}:{os.getenv('DB_PASSWORD', 'password')}@{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '3306')}/{os.getenv('DB_NAME', 'mydb')}"
+
+
+def _secret_key(app):
+    """
+    SECRET_KEY da variável de ambiente ou, na falta dela, de um arquivo na pasta
+    instance, criado uma única vez e compartilhado por todos os workers
+    """
+    if os.getenv('SECRET_KEY'):
+        return os.getenv('SECRET_KEY')
+
+    path = os.path.join(app.instance_path, 'secret_key')
+    os.makedirs(app.instance_path, exist_ok=True)
+
+    # A chave é gravada em um arquivo temporário e só então ligada ao nome
+    # definitivo (os.link falha se ele já existir): quem chega depois nunca lê
+    # um arquivo criado mas ainda vazio
+    handle, temp_path = tempfile.mkstemp(dir=app.instance_path, prefix='.secret_key.')
+    try:
+        key = secrets.token_hex(32)
+        with os.fdopen(handle, 'w') as stream:
+            stream.write(key)
+            stream.flush()
+            os.fsync(stream.fileno())
+        try:
+            os.link(temp_path, path)
+            return key
+        except FileExistsError:
+            pass
+    finally:
+        os.remove(temp_path)
+
+    for attempt in range(5):
+        with open(path) as stream:
+            key = stream.read().strip()
+        if key:
+            return key
+        time.sleep(0.1 * (attempt + 1))
+    raise RuntimeError(f'Arquivo de SECRET_KEY vazio: {path}')
+
+
+def load_settings(app, overrides=None):
+    """
+    Carrega a configuração da aplicação a partir das variáveis de ambiente
+    """
+    app.config['SECRET_KEY'] = _secret_key(app)
+    app.config['SQLALCHEMY_DATABASE_URI'] = _database_url()
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(
+        app.config['SQLALCHEMY_DATABASE_URI'],
+        pool_size=int(os.getenv('DB_POOL_SIZE', '10')),
+        max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '20')),
+        pool_timeout=int(os.getenv('DB_POOL_TIMEOUT', '30')),
+        pool_recycle=int(os.getenv('DB_POOL_RECYCLE', '1800')),  # Abaixo do wait_timeout do MySQL
+        pool_pre_ping=os.getenv('DB_POOL_PRE_PING', '1') == '1'
+    )
+    app.config['SQLALCHEMY_BINDS'] = replica_binds(os.getenv('REPLICA_DATABASE_URLS'))  # Réplicas de leitura, separadas por vírgula
+    app.config['REPLICA_READ_YOUR_WRITES'] = int(os.getenv('REPLICA_READ_YOUR_WRITES', '5'))  # Segundos lendo do principal após uma escrita
+    app.config['PRINCIPAL_CACHE_TTL'] = int(os.getenv('PRINCIPAL_CACHE_TTL', '0'))  # Cache de usuário/perfil (segundos, 0 desativa)
+    app.config['SQL_INSTRUMENTATION'] = os.getenv('SQL_INSTRUMENTATION', '0') == '1'  # Server-Timing e log de requisições lentas
+    app.config['SLOW_REQUEST_THRESHOLD_MS'] = int(os.getenv('SLOW_REQUEST_THRESHOLD_MS', '500'))
+    app.config['RAISE_ON_LAZY_LOAD'] = os.getenv('RAISE_ON_LAZY_LOAD', '0') == '1'  # Detecta N+1 nas listagens (testes/depuração)
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')  # Ex.: pbkdf2:sha256:150000
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+    app.config['WORKER_THREADS'] = int(os.getenv('GUNICORN_THREADS', '8'))  # Threads por worker (a mesma variável do gunicorn.conf.py)
+    app.config['PASSWORD_HASH_QUEUE_SIZE'] = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', str(max(
+        app.config['WORKER_THREADS'] // 2 - app.config['PASSWORD_HASH_WORKERS'], 0))))  # Padrão: até metade das threads do worker com senhas
+    app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER')  # Padrão: <app>/uploads
+    app.config['MAX_UPLOAD_SIZE'] = int(os.getenv('MAX_UPLOAD_SIZE', str(1024 * 1024 * 1024)))
+    app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE', '0') == '1'  # Downloads entregues pelo servidor web
+    app.config['JOB_WORKER_PROCESSES'] = int(os.getenv('JOB_WORKER_PROCESSES', '2'))  # Fila de tarefas (worker.py)
+    app.config['JOB_POLL_INTERVAL'] = float(os.getenv('JOB_POLL_INTERVAL', '1.0'))
+    app.config['JOB_VISIBILITY_TIMEOUT'] = int(os.getenv('JOB_VISIBILITY_TIMEOUT', '300'))
+    app.config['SESSION_BACKEND'] = os.getenv('SESSION_BACKEND', 'database')  # database, sqlite (arquivo local) ou cookie
+    app.config['SESSION_SQLITE_PATH'] = os.getenv('SESSION_SQLITE_PATH')  # Padrão: instance/sessions.sqlite3
+    app.config['SESSION_CACHE_SIZE'] = int(os.getenv('SESSION_CACHE_SIZE', '10000'))
+    app.config['SESSION_CACHE_TTL'] = int(os.getenv('SESSION_CACHE_TTL', '5'))  # Segundos; 0 desativa o cache local
+    app.config['SESSION_SWEEP_INTERVAL'] = int(os.getenv('SESSION_SWEEP_INTERVAL', '300'))  # Remoção das sessões expiradas
+    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=int(os.getenv('SESSION_LIFETIME_HOURS', '24')))  # Validade sem uso
+
+    if overrides:
+        app.config.update(overrides)
+        # Opções do pool dependem do banco efetivamente usado
+        if 'SQLALCHEMY_DATABASE_URI' in overrides and 'SQLALCHEMY_ENGINE_OPTIONS' not in overrides:
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
@@ -0,0 +1,273 @@
+from sqlalchemy import case, event, update
+from sqlalchemy.orm import Session
+from src.models.service_request import ServiceRequest
+from src.services.changes import record_transitions
+from src.services.matching import correspondent_index
+from src.services.metrics import invalidate_status_counts
+from src.services.rollups import apply_transition
+from src.services.schedule import schedule_index
+from src.services.search import index_service_requests
+from src.services.tasks import notify_status_change
+from src import db
+from datetime import datetime
+
+# Resultados de uma transição
+APPLIED = 'applied'
+NOT_FOUND = 'not_found'
+FORBIDDEN = 'forbidden'  # A solicitação não pertence à empresa/correspondente informado
+CONFLICT = 'conflict'  # A solicitação já não está em um dos status de origem
+
+# Chave em Session.info com as transições aguardando o commit
+PENDING_KEY = 'pending_transitions'
+
+
+class Transition:
+    """
+    Mudança de status permitida: status de origem, status de destino e efeito
+    sobre a carga do correspondente
+    """
+
+    def __init__(self, name, sources, target, load_delta=0, clear_correspondent=False):
+        self.name = name
+        self.sources = sources
+        self.target = target
+        self.load_delta = load_delta
+        self.clear_correspondent = clear_correspondent
+
+
+TRANSITIONS = {transition.name: transition for transition in [
+    Transition('approve', ('pending_approval',), 'approved'),
+    Transition('assign', ('approved',), 'assigned', load_delta=1),
+    Transition('accept', ('assigned',), 'accepted'),
+    Transition('reject', ('assigned',), 'rejected', load_delta=-1, clear_correspondent=True),
+    Transition('confirm_presence', ('accepted',), 'in_progress'),
+    Transition('complete', ('in_progress',), 'completed', load_delta=-1),
+    Transition('cancel', ('pending_approval', 'approved'), 'cancelled'),
+]}
+
+
+class TransitionResult:
+    def __init__(self, transition, outcome, service_request=None, current_status=None,
+                 company_id=None, correspondent_id=None, date_time=None, service_type=None):
+        self.transition = transition
+        self.outcome = outcome
+        self.service_request = service_request
+        self.current_status = current_status
+        # Valores copiados no momento da transição (os ganchos de commit não acessam o banco)
+        self.service_request_id = service_request.id if service_request is not None else None
+        self.company_id = company_id
+        self.correspondent_id = correspondent_id
+        self.date_time = date_time
+        self.service_type = service_type
+
+    @property
+    def status(self):
+        return self.transition.target
+
+    @property
+    def applied(self):
+        return self.outcome == APPLIED
+
+    @property
+    def not_found(self):
+        return self.outcome == NOT_FOUND
+
+    @property
+    def forbidden(self):
+        return self.outcome == FORBIDDEN
+
+    @property
+    def conflict(self):
+        return self.outcome == CONFLICT
+
+
+# Ganchos: 'flush' roda dentro da transação, logo após o UPDATE;
+# 'commit' roda depois do commit e não deve acessar o banco
+_hooks = {'flush': [], 'commit': []}
+
+
+def on_transition(phase, statuses=None):
+    """
+    Registra uma função chamada com a lista de TransitionResult aplicados em
+    uma operação (opcionalmente só os de alguns status de destino)
+    """
+    def decorator(function):
+        _hooks[phase].append((statuses, function))
+        return function
+    return decorator
+
+
+def _run_hooks(phase, results):
+    for statuses, function in _hooks[phase]:
+        selected = [result for result in results if statuses is None or result.status in statuses]
+        if selected:
+            function(selected)
+
+
+def _applied(results):
+    _run_hooks('flush', results)
+    db.session.info.setdefault(PENDING_KEY, []).extend(results)
+
+
+def _diagnose(transition, service_request_id, company_id, correspondent_id):
+    row = db.session.query(ServiceRequest.status, ServiceRequest.company_id, ServiceRequest.correspondent_id).filter(
+        ServiceRequest.id == service_request_id).first()
+    if row is None:
+        return TransitionResult(transition, NOT_FOUND)
+    if (company_id is not None and row.company_id != company_id) or \
+            (correspondent_id is not None and row.correspondent_id != correspondent_id):
+        return TransitionResult(transition, FORBIDDEN, current_status=row.status)
+    return TransitionResult(transition, CONFLICT, current_status=row.status)
+
+
+def transition(service_request_id, name, company_id=None, correspondent_id=None, values=None):
+    """
+    Aplica a transição em um único UPDATE condicional
+    (WHERE id = ? AND status IN (...) [AND company_id = ?] [AND correspondent_id = ?]).
+    Se a solicitação já mudou de status, nada é alterado e o resultado indica o
+    conflito. O commit fica a cargo de quem chama.
+    """
+    spec = TRANSITIONS[name]
+
+    conditions = [ServiceRequest.id == service_request_id, ServiceRequest.status.in_(spec.sources)]
+    if company_id is not None:
+        conditions.append(ServiceRequest.company_id == company_id)
+    if correspondent_id is not None:
+        conditions.append(ServiceRequest.correspondent_id == correspondent_id)
+
+    changes = dict(values or {})
+    changes['status'] = spec.target
+    changes['updated_at'] = datetime.utcnow()
+    if spec.clear_correspondent:
+        changes['correspondent_id'] = None
+
+    updated = db.session.execute(
+        update(ServiceRequest).where(*conditions).values(**changes).execution_options(synchronize_session=False)
+    ).rowcount
+    if not updated:
+        return _diagnose(spec, service_request_id, company_id, correspondent_id)
+
+    # Recarrega a linha já alterada (bloqueada por este UPDATE até o commit)
+    service_request = ServiceRequest.query.populate_existing().get(service_request_id)
+    result = TransitionResult(
+        spec, APPLIED, service_request,
+        company_id=service_request.company_id,
+        correspondent_id=correspondent_id if spec.clear_correspondent else service_request.correspondent_id,
+        date_time=service_request.date_time,
+        service_type=service_request.service_type,
+    )
+
+    _applied([result])
+    return result
+
+
+def bulk_transition(name, ids, values=None, row_values=None):
+    """
+    Aplica a mesma transição a várias solicitações em um único UPDATE
+    condicional. row_values traz valores por solicitação ({coluna: {id: valor}}),
+    gravados com CASE. Retorna um TransitionResult por id, na ordem recebida.
+    """
+    spec = TRANSITIONS[name]
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return []
+
+    # Leitura com lock (em ordem de id): as candidatas não mudam de status até o
+    # commit, então o UPDATE abaixo altera exatamente essas linhas
+    current = dict(db.session.query(ServiceRequest.id, ServiceRequest.status).filter(
+        ServiceRequest.id.in_(ids)).order_by(ServiceRequest.id).with_for_update())
+    candidates = [i for i in ids if current.get(i) in spec.sources]
+
+    results = {}
+    for i in ids:
+        if i not in current:
+            results[i] = TransitionResult(spec, NOT_FOUND)
+        elif i not in candidates:
+            results[i] = TransitionResult(spec, CONFLICT, current_status=current[i])
+
+    if candidates:
+        changes = dict(values or {})
+        for column, by_id in (row_values or {}).items():
+            changes[column] = case({i: by_id[i] for i in candidates}, value=ServiceRequest.id)
+        changes['status'] = spec.target
+        changes['updated_at'] = datetime.utcnow()
+        if spec.clear_correspondent:
+            changes['correspondent_id'] = None
+
+        db.session.execute(
+            update(ServiceRequest).where(ServiceRequest.id.in_(candidates), ServiceRequest.status.in_(spec.sources))
+            .values(**changes).execution_options(synchronize_session=False)
+        )
+
+        applied = []
+        for service_request in ServiceRequest.query.populate_existing().filter(ServiceRequest.id.in_(candidates)):
+            result = TransitionResult(spec, APPLIED, service_request, company_id=service_request.company_id,
+                                      correspondent_id=service_request.correspondent_id,
+                                      date_time=service_request.date_time,
+                                      service_type=service_request.service_type)
+            results[service_request.id] = result
+            applied.append(result)
+        for i in candidates:
+            results.setdefault(i, TransitionResult(spec, CONFLICT))
+
+        _applied(applied)
+
+    return [results[i] for i in ids]
+
+
+@event.listens_for(Session, 'after_commit')
+def _run_commit_hooks(session):
+    pending = session.info.pop(PENDING_KEY, [])
+    if pending:
+        _run_hooks('commit', pending)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(PENDING_KEY, None)
+
+
+# Ganchos padrão do ciclo de vida das solicitações
+
+@on_transition('flush', statuses=('completed', 'cancelled'))
+def _accumulate_rollups(results):
+    for result in results:
+        apply_transition(result.service_request, result.status)
+
+
+@on_transition('flush')
+def _reindex_search(results):
+    # O UPDATE direto não passa pelo flush da sessão, que atualiza o índice
+    index_service_requests(db.session.connection(), [result.service_request.id for result in results])
+
+
+@on_transition('flush')
+def _log_changes(results):
+    # Feed de sincronização dos correspondentes (inclui tombstones de rejeição)
+    record_transitions(results)
+
+
+@on_transition('flush')
+def _notify(results):
+    for result in results:
+        notify_status_change(result.service_request)
+
+
+@on_transition('commit')
+def _invalidate_counts(results):
+    for result in results:
+        invalidate_status_counts(result.company_id, result.correspondent_id)
+
+
+@on_transition('commit')
+def _adjust_load(results):
+    for result in results:
+        if result.transition.load_delta and result.correspondent_id:
+            correspondent_index.adjust_load(result.correspondent_id, result.transition.load_delta)
+
+
+@on_transition('commit')
+def _update_schedule(results):
+    for result in results:
+        schedule_index.update(result.service_request_id, result.correspondent_id, result.date_time,
+                              result.service_type, result.status)
@@ -0,0 +1,161 @@
+from flask import current_app, send_file, abort
+from sqlalchemy import event, update, insert, or_
+from sqlalchemy.exc import IntegrityError
+from src.models.document import Document
+from src.models.stored_blob import StoredBlob
+from src import db
+from datetime import datetime, timedelta
+import mimetypes
+import os
+
+# Prefixo de Document.file_path para arquivos no armazenamento por conteúdo
+BLOB_PREFIX = 'blobs'
+
+DOWNLOAD_MAX_AGE = 24 * 60 * 60
+
+# Arquivos sem referências só são apagados depois desse prazo: um envio em
+# partes grava o arquivo horas antes de o documento ser criado
+BLOB_GC_GRACE = timedelta(hours=48)
+
+# Tipos que podem ser exibidos no navegador; os demais (inclusive HTML e SVG,
+# cujo nome de arquivo vem de quem enviou) são sempre baixados como anexo
+INLINE_MIMETYPES = ('application/pdf', 'image/png', 'image/jpeg', 'image/gif')
+
+
+def storage_root():
+    return current_app.config.get('UPLOAD_FOLDER') or os.path.join(current_app.root_path, 'uploads')
+
+
+def blob_relative_path(checksum):
+    # Dois níveis de diretório pelo início do hash para não concentrar milhões de arquivos em um só
+    return '/'.join([BLOB_PREFIX, checksum[:2], checksum[2:4], checksum])
+
+
+def absolute_path(file_path):
+    root = os.path.realpath(storage_root())
+    path = os.path.realpath(os.path.join(root, file_path.lstrip('/')))
+    if not path.startswith(root + os.sep):
+        return None
+    return path
+
+
+def put_blob(temp_path, checksum):
+    """
+    Move um arquivo recebido para o armazenamento endereçado pelo conteúdo.
+    Se já existir um arquivo com o mesmo hash, o temporário é descartado.
+    Retorna o caminho relativo a ser gravado em Document.file_path.
+    """
+    relative_path = blob_relative_path(checksum)
+    destination = absolute_path(relative_path)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+    # Antes de olhar o disco: se a coleta já estiver apagando esse conteúdo, a
+    # gravação espera pelo lock da linha e depois o arquivo já não existe
+    _hold_blob(checksum, os.path.getsize(temp_path))
+
+    if os.path.exists(destination):
+        os.remove(temp_path)
+    else:
+        os.replace(temp_path, destination)
+    return relative_path
+
+
+def _hold_blob(checksum, size):
+    """
+    Registra o arquivo (sem referências) ou renova a sua carência, se já estava
+    sem referências. Usa uma transação própria, porque o documento pode ser
+    criado só em outra requisição, ou nunca: nesse caso a coleta apaga o
+    arquivo depois da carência.
+    """
+    table = StoredBlob.__table__
+    now = datetime.utcnow()
+    with db.engine.begin() as connection:
+        if connection.execute(update(table).where(table.c.checksum == checksum, table.c.ref_count <= 0)
+                              .values(released_at=now)).rowcount:
+            return
+        try:
+            with connection.begin_nested():
+                connection.execute(insert(table).values(checksum=checksum, size=size, ref_count=0,
+                                                        released_at=now))
+        except IntegrityError:
+            pass  # Já referenciado por algum documento
+
+
+def _is_blob(target):
+    return bool(target.checksum) and (target.file_path or '').startswith(BLOB_PREFIX + '/')
+
+
+@event.listens_for(Document, 'after_insert')
+def _add_reference(mapper, connection, target):
+    if not _is_blob(target):
+        return
+    table = StoredBlob.__table__
+    increment = update(table).where(table.c.checksum == target.checksum).values(ref_count=table.c.ref_count + 1)
+    if connection.execute(increment).rowcount:
+        return
+    try:
+        with connection.begin_nested():
+            connection.execute(insert(table).values(checksum=target.checksum, size=target.file_size,
+                                                    ref_count=1))
+    except IntegrityError:
+        connection.execute(increment)
+
+
+@event.listens_for(Document, 'after_delete')
+def _release_reference(mapper, connection, target):
+    if not _is_blob(target):
+        return
+    table = StoredBlob.__table__
+    connection.execute(update(table).where(table.c.checksum == target.checksum)
+                       .values(ref_count=table.c.ref_count - 1, released_at=datetime.utcnow()))
+
+
+def collect_garbage(batch_size=1000, grace=BLOB_GC_GRACE):
+    """
+    Remove arquivos que não são referenciados por nenhum documento há mais
+    que o prazo de carência
+    """
+    cutoff = datetime.utcnow() - grace
+    unreferenced = (StoredBlob.ref_count <= 0,
+                    or_(StoredBlob.released_at.is_(None), StoredBlob.released_at < cutoff))
+
+    removed = 0
+    while True:
+        blobs = StoredBlob.query.filter(*unreferenced).limit(batch_size).all()
+        if not blobs:
+            break
+        for blob in blobs:
+            path = absolute_path(blob_relative_path(blob.checksum))
+            # Apaga a linha apenas se continuar sem referências; o arquivo sai
+            # antes do commit, enquanto a linha ainda está bloqueada
+            deleted = StoredBlob.query.filter(StoredBlob.checksum == blob.checksum,
+                                              *unreferenced).delete(synchronize_session=False)
+            if deleted and path and os.path.exists(path):
+                os.remove(path)
+                removed += 1
+            db.session.commit()
+    return removed
+
+
+def send_document(document, as_attachment=False):
+    """
+    Envia o arquivo do documento com suporte a Range, If-None-Match e
+    If-Modified-Since. O corpo é entregue pelo wsgi.file_wrapper (sendfile no
+    gunicorn) ou, com USE_X_SENDFILE, pelo servidor web.
+    """
+    path = absolute_path(document.file_path)
+    if not path or not os.path.isfile(path):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(document.file_name)[0] or 'application/octet-stream'
+    response = send_file(path,
+                         mimetype=mimetype,
+                         as_attachment=as_attachment or mimetype not in INLINE_MIMETYPES,
+                         download_name=document.file_name,
+                         conditional=True,
+                         etag=document.checksum or True,
+                         max_age=DOWNLOAD_MAX_AGE)
+    # O conteúdo é do usuário: sem adivinhação de tipo e sem scripts na origem da aplicação
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.headers['Content-Security-Policy'] = 'sandbox'
+    return response
@@ -0,0 +1,14 @@
+from src import db
+from datetime import datetime
+
+class StoredBlob(db.Model):
+    __tablename__ = 'stored_blobs'
+    
+    checksum = db.Column(db.String(64), primary_key=True)  # SHA-256 do conteúdo
+    size = db.Column(db.BigInteger, nullable=False)  # Tamanho em bytes
+    ref_count = db.Column(db.Integer, nullable=False, default=0)  # Documentos que apontam para o arquivo
+    released_at = db.Column(db.DateTime, nullable=True)  # Última liberação de referência ou novo envio do conteúdo (carência da coleta)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<StoredBlob {self.checksum}>'
@@ -0,0 +1,14 @@
+from src import db
+from datetime import datetime
+
+class StoredSession(db.Model):
+    __tablename__ = 'sessions'
+
+    id = db.Column(db.String(64), primary_key=True)  # Identificador aleatório (o cookie leva o id e a versão, assinados)
+    data = db.Column(db.Text, nullable=False)  # Conteúdo da sessão serializado (JSON com tags do Flask)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    version = db.Column(db.Integer, nullable=False, default=1)  # Incrementada a cada gravação (compare-and-set)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StoredSession {self.id[:8]}>'
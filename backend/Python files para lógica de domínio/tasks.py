@@ -0,0 +1,107 @@
+from flask import current_app
+from src.models.document import Document
+from src.models.service_request import ServiceRequest
+from src.services.changes import prune_change_log
+from src.services.jobs import task, enqueue, PRIORITY_HIGH, PRIORITY_LOW
+from src.services.storage import absolute_path, collect_garbage
+from src.services.rollups import rebuild_rollups
+from src.services.search import reindex_company, rebuild_search_index
+from src.services.uploads import upload_folder, sweep_uploads
+import logging
+import os
+
+logger = logging.getLogger('jurisconnect.notifications')
+
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp')
+
+
+@task('notifications.status_changed', priority=PRIORITY_HIGH)
+def send_status_notification(service_request_id, status):
+    """
+    Avisa a empresa e o correspondente sobre a mudança de status
+    """
+    service_request = ServiceRequest.query.get(service_request_id)
+    if service_request is None:
+        return
+
+    recipients = []
+    if service_request.company is not None:
+        recipients.append(service_request.company.user.email)
+    if service_request.correspondent is not None:
+        recipients.append(service_request.correspondent.user.email)
+
+    # Em um sistema real, enviaríamos e-mail; aqui apenas registramos o aviso
+    logger.info('Solicitação %s: status %s, avisar %s', service_request.id, status, ', '.join(recipients))
+
+
+@task('documents.thumbnail', priority=PRIORITY_LOW, max_attempts=3)
+def create_document_thumbnail(document_id):
+    """
+    Gera a miniatura de documentos de imagem (fotos de protocolo, atas digitalizadas)
+    """
+    document = Document.query.get(document_id)
+    if document is None or not document.checksum:
+        return
+    if not document.file_name.lower().endswith(THUMBNAIL_EXTENSIONS):
+        return
+
+    from PIL import Image
+
+    destination = os.path.join(upload_folder('thumbnails'), f'{document.checksum}.jpg')
+    if os.path.exists(destination):
+        return
+
+    with Image.open(absolute_path(document.file_path)) as image:
+        image.thumbnail(THUMBNAIL_SIZE)
+        image.convert('RGB').save(destination + '.tmp', 'JPEG', quality=80)
+    os.replace(destination + '.tmp', destination)
+
+
+@task('storage.collect_garbage', priority=PRIORITY_LOW, max_attempts=1)
+def collect_garbage_task():
+    removed = collect_garbage()
+    current_app.logger.info('%s arquivos sem referência removidos.', removed)
+
+
+@task('uploads.sweep', priority=PRIORITY_LOW, max_attempts=1)
+def sweep_uploads_task():
+    removed = sweep_uploads()
+    current_app.logger.info('%s envios abandonados removidos.', removed)
+
+
+@task('change_log.prune', priority=PRIORITY_LOW, max_attempts=1)
+def prune_change_log_task():
+    removed = prune_change_log()
+    current_app.logger.info('%s entradas antigas do change_log removidas.', removed)
+
+
+@task('rollups.rebuild', priority=PRIORITY_LOW, max_attempts=1)
+def rebuild_rollups_task():
+    rebuild_rollups()
+
+
+@task('search.reindex_company', priority=PRIORITY_LOW)
+def reindex_company_task(company_id):
+    reindex_company(company_id)
+
+
+@task('search.rebuild', priority=PRIORITY_LOW, max_attempts=1)
+def rebuild_search_index_task():
+    rebuild_search_index()
+
+
+def notify_status_change(service_request):
+    """
+    Agenda o aviso de mudança de status; chamar antes do commit da transação
+    """
+    return enqueue('notifications.status_changed',
+                   {'service_request_id': service_request.id, 'status': service_request.status})
+
+
+def process_documents(documents):
+    """
+    Agenda o processamento dos documentos recebidos (os ids precisam existir)
+    """
+    for document in documents:
+        enqueue('documents.thumbnail', {'document_id': document.id})
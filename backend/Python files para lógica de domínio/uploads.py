@@ -0,0 +1,361 @@
+from flask import current_app, request
+from werkzeug.formparser import parse_form_data
+from src.services.storage import put_blob
+from collections import OrderedDict
+from contextlib import contextmanager
+import fcntl
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_UPLOAD_SIZE = 1024 * 1024 * 1024  # 1GB
+
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+# Envios em partes (e temporários) sem atividade há mais tempo que isso são
+# apagados por sweep_uploads; fica abaixo da carência da coleta de arquivos
+UPLOAD_MAX_AGE = 24 * 60 * 60
+
+
+class UploadError(Exception):
+    """
+    Erro de envio de arquivo; status é o código HTTP sugerido
+    """
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.offset = offset
+
+
+def upload_folder(*parts):
+    root = current_app.config.get('UPLOAD_FOLDER') or os.path.join(current_app.root_path, 'uploads')
+    path = os.path.join(root, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _chunk_size():
+    return current_app.config.get('UPLOAD_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+
+def _max_upload_size():
+    return current_app.config.get('MAX_UPLOAD_SIZE', DEFAULT_MAX_UPLOAD_SIZE)
+
+
+class HashingFile:
+    """
+    Arquivo temporário em disco que calcula tamanho e SHA-256 à medida que
+    os blocos são gravados
+    """
+
+    def __init__(self, directory, filename=None):
+        handle, self.path = tempfile.mkstemp(dir=directory, suffix='.part')
+        self._file = os.fdopen(handle, 'w+b')
+        self._hash = hashlib.sha256()
+        self.filename = filename
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > _max_upload_size():
+            raise UploadError('Arquivo excede o tamanho máximo permitido.', 413)
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def flush(self):
+        return self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @property
+    def checksum(self):
+        return self._hash.hexdigest()
+
+
+def parse_streaming_form():
+    """
+    Lê o formulário multipart gravando cada arquivo direto em disco, em blocos,
+    sem manter o arquivo inteiro em memória. Deve ser chamada antes de qualquer
+    acesso a request.form/request.files.
+    Retorna (form, [HashingFile]).
+    """
+    directory = upload_folder('tmp')
+    created = []
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        stream = HashingFile(directory, filename)
+        created.append(stream)
+        return stream
+
+    try:
+        _, form, files = parse_form_data(request.environ, stream_factory=stream_factory,
+                                         max_content_length=_max_upload_size(), silent=False)
+    except Exception:
+        for stream in created:
+            stream.discard()
+        raise
+
+    streams = []
+    for storage in files.values():
+        stream = storage.stream
+        if stream.size == 0 and not storage.filename:
+            stream.discard()
+            continue
+        stream.filename = storage.filename
+        streams.append(stream)
+    return form, streams
+
+
+def store_file(temp_path, checksum):
+    """
+    Move o arquivo recebido para o armazenamento definitivo (deduplicado pelo hash)
+    """
+    return put_blob(temp_path, checksum)
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as stream:
+        for chunk in iter(lambda: stream.read(_chunk_size()), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Envio retomável: o cliente cria uma sessão e envia o arquivo em partes com
+# Content-Range; em caso de queda, consulta o offset recebido e continua dali.
+
+def _session_paths(upload_id):
+    if not re.fullmatch(r'[0-9a-f]{32}', upload_id or ''):
+        raise UploadError('Envio não encontrado.', 404)
+    directory = upload_folder('partial')
+    return os.path.join(directory, f'{upload_id}.json'), os.path.join(directory, f'{upload_id}.part')
+
+
+@contextmanager
+def _session_lock(upload_id, shared=False):
+    """
+    Lock entre processos de uma sessão de envio. Fica em um arquivo próprio,
+    porque o arquivo parcial é movido na conclusão.
+    """
+    with open(os.path.join(upload_folder('partial'), f'{upload_id}.lock'), 'a') as handle:
+        fcntl.flock(handle, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+# O SHA-256 em andamento de cada envio, atualizado a cada bloco gravado. O
+# estado do hashlib não pode ser serializado no arquivo da sessão, então fica
+# no processo; se o bloco final cair em outro worker, o arquivo é relido.
+_running_hashes = OrderedDict()  # upload_id -> (offset, hash)
+_running_hashes_lock = threading.Lock()
+MAX_RUNNING_HASHES = 256
+
+
+def _take_hash(upload_id, offset):
+    with _running_hashes_lock:
+        entry = _running_hashes.pop(upload_id, None)
+    if entry is not None and entry[0] == offset:
+        return entry[1]
+    return hashlib.sha256() if offset == 0 else None
+
+
+def _keep_hash(upload_id, offset, digest):
+    with _running_hashes_lock:
+        _running_hashes[upload_id] = (offset, digest)
+        while len(_running_hashes) > MAX_RUNNING_HASHES:
+            _running_hashes.popitem(last=False)
+
+
+def create_upload_session(service_request_id, user_id, file_name, file_size, document_type):
+    if file_size <= 0 or file_size > _max_upload_size():
+        raise UploadError('Tamanho de arquivo inválido.', 413)
+
+    upload_id = uuid.uuid4().hex
+    state_path, data_path = _session_paths(upload_id)
+    state = {
+        'upload_id': upload_id,
+        'service_request_id': service_request_id,
+        'user_id': user_id,
+        'file_name': file_name,
+        'file_size': file_size,
+        'type': document_type,
+        'complete': False,
+    }
+    open(data_path, 'wb').close()
+    _write_state(state_path, state)
+    return state
+
+
+def _write_state(state_path, state):
+    # Grava em um temporário e troca o arquivo, para nunca ler um estado pela metade
+    temp_path = f'{state_path}.{uuid.uuid4().hex}.tmp'
+    with open(temp_path, 'w') as stream:
+        json.dump({key: value for key, value in state.items() if key != 'offset'}, stream)
+    os.replace(temp_path, state_path)
+
+
+def _read_state(state_path, data_path, user_id):
+    # Sem o arquivo parcial de um envio não concluído (queda durante a
+    # conclusão), o envio precisa ser refeito
+    try:
+        with open(state_path) as stream:
+            state = json.load(stream)
+        if state['user_id'] != user_id:
+            raise UploadError('Envio não encontrado.', 404)
+        state['offset'] = state['file_size'] if state['complete'] else os.path.getsize(data_path)
+    except FileNotFoundError:
+        raise UploadError('Envio não encontrado.', 404)
+    return state
+
+
+def load_upload_session(upload_id, user_id):
+    state_path, data_path = _session_paths(upload_id)
+    if not os.path.exists(state_path):
+        raise UploadError('Envio não encontrado.', 404)
+    with _session_lock(upload_id, shared=True):
+        return _read_state(state_path, data_path, user_id)
+
+
+def append_chunk(upload_id, user_id, content_range):
+    """
+    Grava no arquivo parcial o bloco recebido no corpo da requisição. O bloco
+    precisa começar exatamente no offset já recebido.
+    """
+    state = load_upload_session(upload_id, user_id)
+    state_path, data_path = _session_paths(upload_id)
+
+    match = CONTENT_RANGE.match(content_range or '')
+    if not match:
+        raise UploadError('Cabeçalho Content-Range inválido.', 400, state['offset'])
+    start, end, total = (int(value) for value in match.groups())
+    if total != state['file_size'] or end < start or end >= total:
+        raise UploadError('Faixa de bytes inválida.', 416, state['offset'])
+    if state['complete']:
+        return state
+
+    with _session_lock(upload_id):
+        # Outra requisição pode ter concluído o envio enquanto esperávamos o lock
+        state = _read_state(state_path, data_path, user_id)
+        if state['complete']:
+            return state
+
+        # Arquivo completo, mas a conclusão falhou antes (ex.: queda ao mover):
+        # uma nova tentativa do último bloco só conclui
+        offset = state['offset']
+        if offset == state['file_size']:
+            _finalize(state_path, data_path, state, file_checksum(data_path))
+            return state
+        if start != offset:
+            raise UploadError('Faixa fora de ordem.', 409, offset)
+
+        digest = _take_hash(upload_id, offset)
+        with open(data_path, 'ab') as output:
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = request.stream.read(min(_chunk_size(), remaining))
+                if not chunk:
+                    break
+                output.write(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+                remaining -= len(chunk)
+        state['offset'] = os.path.getsize(data_path)
+
+        # Conclusão ainda com o lock, para que quem estiver esperando já
+        # encontre o envio concluído
+        if state['offset'] == state['file_size']:
+            checksum = digest.hexdigest() if digest is not None else file_checksum(data_path)
+            _finalize(state_path, data_path, state, checksum)
+        elif digest is not None:
+            _keep_hash(upload_id, state['offset'], digest)
+
+    return state
+
+
+def _finalize(state_path, data_path, state, checksum):
+    # O arquivo é movido antes de o estado ser marcado como concluído: um envio
+    # concluído sempre aponta para um arquivo que existe (put_blob pode ser
+    # repetido com o mesmo conteúdo)
+    state['file_path'] = store_file(data_path, checksum)
+    state['checksum'] = checksum
+    state['complete'] = True
+    _write_state(state_path, state)
+
+
+def discard_upload_session(upload_id):
+    state_path, data_path = _session_paths(upload_id)
+    with _running_hashes_lock:
+        _running_hashes.pop(upload_id, None)
+    for path in (state_path, data_path, os.path.join(upload_folder('partial'), f'{upload_id}.lock')):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _modified_at(path):
+    try:
+        return os.path.getmtime(path)
+    except FileNotFoundError:
+        return None
+
+
+def sweep_uploads(max_age=UPLOAD_MAX_AGE):
+    """
+    Remove envios em partes abandonados (sem novos blocos há mais que max_age),
+    arquivos parciais sem estado e temporários de formulários interrompidos
+    """
+    cutoff = time.time() - max_age
+    removed = 0
+
+    directory = upload_folder('partial')
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        upload_id, extension = os.path.splitext(name)
+        if extension == '.json':
+            # O último bloco recebido atualiza o arquivo parcial
+            modified = [value for value in (_modified_at(path), _modified_at(path[:-len('.json')] + '.part'))
+                        if value is not None]
+            if modified and max(modified) < cutoff:
+                discard_upload_session(upload_id)
+                removed += 1
+        elif extension in ('.part', '.lock', '.tmp'):
+            # Parcial ou lock sem estado (ou estado gravado pela metade)
+            modified = _modified_at(path)
+            if modified is not None and modified < cutoff and (
+                    extension == '.tmp' or not os.path.exists(os.path.join(directory, f'{upload_id}.json'))):
+                os.remove(path)
+                removed += 1
+
+    directory = upload_folder('tmp')
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        modified = _modified_at(path)
+        if modified is not None and modified < cutoff:
+            os.remove(path)
+            removed += 1
+
+    return removed
@@ -0,0 +1,18 @@
+from src import create_app, db
+from src.services.assignment import plan_assignments, commit_plan
+import argparse
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Propõe (ou aplica) correspondentes para as solicitações aprovadas')
+    parser.add_argument('--commit', action='store_true', help='Aplicar as atribuições propostas')
+    args = parser.parse_args()
+
+    with create_app().app_context():
+        plan = plan_assignments()
+        print(f"{len(plan.proposals)} atribuições propostas, {len(plan.unassigned)} sem candidato "
+              f"({plan.solver}, {plan.elapsed_ms:.1f}ms). Margem total: R$ {plan.total_margin:.2f}")
+
+        if args.commit:
+            results = commit_plan(plan)
+            db.session.commit()
+            print(f"{sum(1 for result in results if result.applied)} atribuições aplicadas.")
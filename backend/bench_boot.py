@@ -0,0 +1,49 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Executado em um processo novo a cada medição: importação + create_app()
+BOOT_SCRIPT = """
+import json, time
+started = time.perf_counter()
+from src import create_app
+imported = time.perf_counter()
+app = create_app()
+print(json.dumps({'import_ms': (imported - started) * 1000,
+                  'factory_ms': app.boot_time_ms,
+                  'total_ms': (time.perf_counter() - started) * 1000}))
+"""
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def measure_boot():
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+    output = subprocess.run([sys.executable, '-c', BOOT_SCRIPT], env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mede o cold start de um worker (importação + create_app)')
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    results = [measure_boot() for _ in range(args.runs)]
+
+    print(f"{'etapa':<14}{'p50 (ms)':>12}{'p95 (ms)':>12}{'máx (ms)':>12}")
+    for key in ('import_ms', 'factory_ms', 'total_ms'):
+        values = [result[key] for result in results]
+        print(f"{key:<14}{_percentile(values, 50):>12.1f}{_percentile(values, 95):>12.1f}{max(values):>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
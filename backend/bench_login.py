@@ -0,0 +1,74 @@
+from src import create_app
+from src.utils import passwords
+from werkzeug.security import generate_password_hash
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import time
+
+app = create_app()
+
+DEFAULT_COSTS = [50000, 100000, 150000, 260000, 600000]
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def bench_cost(iterations, concurrency, duration):
+    """
+    Mede quantas verificações de senha (logins) por segundo o pool de hash
+    suporta para um determinado custo de PBKDF2
+    """
+    method = f'pbkdf2:sha256:{iterations}'
+    password_hash = generate_password_hash('senha-de-teste', method)
+    deadline = time.perf_counter() + duration
+
+    def client():
+        latencies = []
+        with app.app_context():
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                passwords.verify_password(password_hash, 'senha-de-teste')
+                latencies.append(time.perf_counter() - started)
+        return latencies
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        results = [f.result() for f in [clients.submit(client) for _ in range(concurrency)]]
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for result in results for latency in result]
+    return {
+        'method': method,
+        'logins_per_second': len(latencies) / elapsed,
+        'p50_ms': _percentile(latencies, 50) * 1000,
+        'p95_ms': _percentile(latencies, 95) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de vazão de login por custo de hash')
+    parser.add_argument('--costs', type=int, nargs='+', default=DEFAULT_COSTS,
+                        help='Iterações de PBKDF2 a testar')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='Requisições de login simultâneas (ex.: threads do gunicorn)')
+    parser.add_argument('--workers', type=int, default=app.config.get('PASSWORD_HASH_WORKERS', 2),
+                        help='Tamanho do pool de verificação')
+    parser.add_argument('--duration', type=float, default=5.0, help='Segundos por custo')
+    args = parser.parse_args()
+
+    app.config['PASSWORD_HASH_WORKERS'] = args.workers
+
+    print(f"{'método':<28}{'logins/s':>12}{'p50 (ms)':>12}{'p95 (ms)':>12}")
+    for iterations in args.costs:
+        result = bench_cost(iterations, args.concurrency, args.duration)
+        print(f"{result['method']:<28}{result['logins_per_second']:>12.1f}"
+              f"{result['p50_ms']:>12.1f}{result['p95_ms']:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
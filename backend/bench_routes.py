@@ -0,0 +1,207 @@
+import os
+import sys
+
+# Banco local e instrumentação precisam estar configurados antes de importar a aplicação
+os.environ.setdefault('DATABASE_URL', 'sqlite:///bench_routes.db')
+os.environ['SQL_INSTRUMENTATION'] = '1'
+
+from flask import url_for
+from src import create_app, db
+from src.models.user import User
+from src.models.company import Company
+from src.models.correspondent import Correspondent
+from src.models.service_request import ServiceRequest
+from generate_data import generate_dataset
+from werkzeug.security import generate_password_hash
+from datetime import datetime
+import argparse
+import json
+import platform
+import re
+import time
+
+app = create_app()
+
+BLUEPRINT_ROLES = {
+    'auth': None,
+    'admin': 'admin',
+    'company': 'company',
+    'correspondent': 'correspondent',
+}
+
+# Rotas que encerram a sessão ou não fazem sentido repetir
+SKIPPED_ENDPOINTS = {'auth.logout', 'auth.reset_password'}
+
+SERVER_TIMING_QUERIES = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def _principals():
+    """
+    Escolhe um usuário de cada papel com dados suficientes para exercitar as rotas
+    """
+    admin = User.query.filter_by(role='admin', status='active').first()
+    if admin is None:
+        admin = User(name='Administrador Benchmark', email='admin@bench.jurisconnect.test',
+                     password_hash=generate_password_hash('admin123'), role='admin', status='active')
+        db.session.add(admin)
+        db.session.commit()
+
+    company_id = db.session.query(ServiceRequest.company_id).group_by(ServiceRequest.company_id).order_by(
+        db.func.count(ServiceRequest.id).desc()).limit(1).scalar()
+    correspondent_id = db.session.query(ServiceRequest.correspondent_id).filter(
+        ServiceRequest.correspondent_id.isnot(None)).group_by(ServiceRequest.correspondent_id).order_by(
+        db.func.count(ServiceRequest.id).desc()).limit(1).scalar()
+
+    company = Company.query.get(company_id)
+    correspondent = Correspondent.query.get(correspondent_id)
+
+    return {
+        'admin': {'user': admin, 'args': {
+            'company_id': company.id,
+            'correspondent_id': correspondent.id,
+            'request_id': ServiceRequest.query.order_by(ServiceRequest.id.desc()).first().id,
+        }},
+        'company': {'user': company.user, 'args': {
+            'request_id': ServiceRequest.query.filter_by(company_id=company.id).first().id,
+        }},
+        'correspondent': {'user': correspondent.user, 'args': {
+            'request_id': ServiceRequest.query.filter_by(correspondent_id=correspondent.id).first().id,
+        }},
+    }
+
+
+def _endpoints():
+    for rule in app.url_map.iter_rules():
+        blueprint = rule.endpoint.split('.', 1)[0]
+        if blueprint not in BLUEPRINT_ROLES or 'GET' not in rule.methods:
+            continue
+        if rule.endpoint in SKIPPED_ENDPOINTS:
+            continue
+        yield rule, BLUEPRINT_ROLES[blueprint]
+
+
+def bench_endpoint(client, rule, role, principals, iterations, warmup):
+    args = principals[role]['args'] if role else {}
+    if any(argument not in args for argument in rule.arguments):
+        return None
+    with app.test_request_context():
+        url = url_for(rule.endpoint, **{argument: args[argument] for argument in rule.arguments})
+
+    with client.session_transaction() as session:
+        session.clear()
+        if role:
+            user = principals[role]['user']
+            session['user_id'] = user.id
+            session['user_name'] = user.name
+            session['user_role'] = user.role
+
+    latencies, queries, db_times, statuses = [], [], [], {}
+    for i in range(warmup + iterations):
+        started = time.perf_counter()
+        response = client.get(url)
+        elapsed = time.perf_counter() - started
+        response.close()
+        if i < warmup:
+            continue
+
+        latencies.append(elapsed * 1000)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        match = SERVER_TIMING_QUERIES.search(', '.join(response.headers.getlist('Server-Timing')))
+        if match:
+            db_times.append(float(match.group(1)))
+            queries.append(int(match.group(2)))
+
+    return {
+        'url': url,
+        'role': role,
+        'iterations': iterations,
+        'status_codes': {str(code): count for code, count in statuses.items()},
+        'p50_ms': round(_percentile(latencies, 50), 2),
+        'p95_ms': round(_percentile(latencies, 95), 2),
+        'p99_ms': round(_percentile(latencies, 99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'db_mean_ms': round(sum(db_times) / len(db_times), 2) if db_times else None,
+        'queries_per_request': max(queries) if queries else None,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compara com uma execução anterior e retorna as regressões encontradas
+    """
+    regressions = []
+    for endpoint, current in results['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(endpoint)
+        if not previous:
+            continue
+        if previous['p95_ms'] and current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{endpoint}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if (previous.get('queries_per_request') is not None and current.get('queries_per_request') is not None
+                and current['queries_per_request'] > previous['queries_per_request']):
+            regressions.append(f"{endpoint}: consultas {previous['queries_per_request']} -> "
+                               f"{current['queries_per_request']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark das rotas dos blueprints auth, admin, company e correspondent')
+    parser.add_argument('--scale', type=float, default=0.01, help='Escala da massa de dados (ver generate_data.py)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reuse-data', action='store_true', help='Não recriar a massa de dados')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--output', default='bench_routes.json')
+    parser.add_argument('--compare', help='Arquivo JSON de uma execução anterior')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Piora aceitável de p95 (fração)')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if not args.reuse_data:
+            # Só recria a massa de dados em um banco SQLite local
+            if db.engine.url.get_backend_name() != 'sqlite':
+                sys.exit('Use --reuse-data com bancos que não sejam SQLite locais.')
+            db.drop_all()
+            generate_dataset(scale=args.scale, seed=args.seed)
+        principals = _principals()
+
+        results = {
+            'started_at': datetime.utcnow().isoformat(),
+            'database': db.engine.url.render_as_string(hide_password=True),
+            'python': platform.python_version(),
+            'scale': args.scale,
+            'seed': args.seed,
+            'endpoints': {},
+        }
+
+        client = app.test_client()
+        for rule, role in sorted(_endpoints(), key=lambda item: item[0].endpoint):
+            result = bench_endpoint(client, rule, role, principals, args.iterations, args.warmup)
+            if result is None:
+                continue
+            results['endpoints'][rule.endpoint] = result
+            print(f"{rule.endpoint:<45}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+                  f"  consultas={result['queries_per_request']}")
+
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2, ensure_ascii=False)
+    print(f"Resultados salvos em {args.output}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSÃO {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+from src import create_app, db
+from src.services.storage import collect_garbage
+
+if __name__ == '__main__':
+    with create_app().app_context():
+        db.create_all()
+        removed = collect_garbage()
+        print(f"{removed} arquivos sem referência removidos.")
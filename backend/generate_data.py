@@ -0,0 +1,288 @@
+from src import create_app, db
+from src.models.user import User
+from src.models.company import Company
+from src.models.correspondent import Correspondent
+from src.models.service_request import ServiceRequest
+from src.models.document import Document
+from src.services.search import rebuild_search_index
+from werkzeug.security import generate_password_hash
+from datetime import datetime, timedelta
+import argparse
+import json
+import random
+import time
+
+# Volumes de referência (escala 1.0)
+BASE_COMPANIES = 10000
+BASE_CORRESPONDENTS = 50000
+BASE_REQUESTS = 5000000
+
+BATCH_SIZE = 10000
+
+LOCATIONS = [
+    ('São Paulo', 'SP', 30), ('Campinas', 'SP', 6), ('Santos', 'SP', 3), ('Ribeirão Preto', 'SP', 3),
+    ('Rio de Janeiro', 'RJ', 14), ('Niterói', 'RJ', 3), ('Belo Horizonte', 'MG', 8), ('Uberlândia', 'MG', 2),
+    ('Brasília', 'DF', 6), ('Curitiba', 'PR', 5), ('Porto Alegre', 'RS', 5), ('Salvador', 'BA', 4),
+    ('Recife', 'PE', 3), ('Fortaleza', 'CE', 3), ('Goiânia', 'GO', 2), ('Florianópolis', 'SC', 2),
+    ('Manaus', 'AM', 1), ('Belém', 'PA', 1),
+]
+
+# Tipo de serviço: (peso, valor médio cobrado da empresa)
+SERVICE_TYPES = {
+    'audiencia_conciliacao': (35, 300.0),
+    'audiencia_instrucao': (25, 450.0),
+    'copia_processos': (20, 180.0),
+    'protocolo': (20, 140.0),
+}
+
+SPECIALTIES = ['cível', 'trabalhista', 'família', 'criminal', 'tributário', 'previdenciário', 'consumidor']
+
+# Distribuição de status para serviços passados e futuros
+PAST_STATUS_MIX = [('completed', 82), ('cancelled', 9), ('rejected', 3), ('in_progress', 2),
+                   ('accepted', 2), ('assigned', 1), ('approved', 1)]
+FUTURE_STATUS_MIX = [('pending_approval', 20), ('approved', 15), ('assigned', 20), ('accepted', 35),
+                     ('cancelled', 7), ('rejected', 3)]
+
+DOCUMENT_TYPES = ['relatorio', 'ata', 'protocolo', 'copia']
+
+
+def _choices(rng, weighted):
+    values = [item[0] for item in weighted]
+    weights = [item[-1] for item in weighted]
+    return lambda: rng.choices(values, weights)[0]
+
+
+def _next_id(model):
+    return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+
+def _insert(model, rows):
+    if rows:
+        db.session.execute(model.__table__.insert(), rows)
+        db.session.commit()
+
+
+def _batches(total, batch_size):
+    for start in range(0, total, batch_size):
+        yield start, min(batch_size, total - start)
+
+
+def generate_users_and_companies(rng, count, password_hash, now, batch_size):
+    pick_location = _choices(rng, LOCATIONS)
+    user_id = _next_id(User)
+    company_id = _next_id(Company)
+    company_ids = []
+
+    for start, size in _batches(count, batch_size):
+        users, companies = [], []
+        for i in range(start, start + size):
+            created_at = now - timedelta(days=rng.randint(30, 1500))
+            users.append({
+                # E-mail pelo id alocado: novas execuções não colidem com users.email
+                'id': user_id, 'name': f'Empresa {i + 1}', 'email': f'empresa{user_id}@carga.jurisconnect.test',
+                'password_hash': password_hash, 'role': 'company',
+                'status': 'active' if rng.random() < 0.95 else 'pending',
+                'phone': f'(11) 9{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}',
+                'created_at': created_at, 'updated_at': created_at,
+            })
+            locations = {pick_location()[:2] for _ in range(rng.randint(1, 3))}
+            companies.append({
+                'id': company_id, 'user_id': user_id,
+                'document': f'{rng.randint(10, 99)}.{rng.randint(100, 999)}.{rng.randint(100, 999)}/0001-{rng.randint(10, 99)}',
+                'company_name': f'Empresa Jurídica {i + 1} Ltda', 'business_type': 'law_firm',
+                'contact_name': f'Contato {i + 1}',
+                'monthly_volume': rng.choice(['1_to_10', 'above_10']),
+                'locations': json.dumps([{'city': city, 'state': state} for city, state in locations]),
+                'products_of_interest': json.dumps(['audiências', 'diligências', 'protocolos']),
+            })
+            company_ids.append(company_id)
+            user_id += 1
+            company_id += 1
+        _insert(User, users)
+        _insert(Company, companies)
+
+    return company_ids
+
+
+def generate_users_and_correspondents(rng, count, password_hash, now, batch_size):
+    pick_location = _choices(rng, LOCATIONS)
+    user_id = _next_id(User)
+    correspondent_id = _next_id(Correspondent)
+    by_state = {}
+    rates_by_id = {}
+    user_by_id = {}
+
+    for start, size in _batches(count, batch_size):
+        users, correspondents = [], []
+        for i in range(start, start + size):
+            created_at = now - timedelta(days=rng.randint(30, 1500))
+            status = 'active' if rng.random() < 0.9 else 'pending'
+            users.append({
+                'id': user_id, 'name': f'Correspondente {i + 1}',
+                'email': f'correspondente{user_id}@carga.jurisconnect.test',
+                'password_hash': password_hash, 'role': 'correspondent', 'status': status,
+                'phone': f'(21) 9{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}',
+                'created_at': created_at, 'updated_at': created_at,
+            })
+            home_city, home_state, _ = pick_location()
+            locations = {(home_city, home_state)}
+            locations.update((city, state) for city, state, _ in rng.sample(LOCATIONS, 2) if state == home_state)
+            rates = {service_type: round(price * rng.uniform(0.35, 0.65), 2)
+                     for service_type, (_, price) in SERVICE_TYPES.items() if rng.random() < 0.85}
+            correspondents.append({
+                'id': correspondent_id, 'user_id': user_id,
+                'document': f'{rng.randint(100, 999)}.{rng.randint(100, 999)}.{rng.randint(100, 999)}-{rng.randint(10, 99)}',
+                'oab_number': f'{home_state}{rng.randint(100000, 999999)}',
+                'specialties': json.dumps(rng.sample(SPECIALTIES, rng.randint(1, 3))),
+                'locations': json.dumps([{'city': city, 'state': state} for city, state in sorted(locations)]),
+                'rates': json.dumps(rates),
+                'bank_info': json.dumps({'bank': 'Banco Exemplo', 'agency': '0001',
+                                         'account': str(rng.randint(10000, 99999)), 'account_type': 'corrente'}),
+                'average_rating': round(rng.uniform(3.5, 5.0), 1),
+                'total_services': 0,
+            })
+            if status == 'active':
+                for city, state in locations:
+                    by_state.setdefault(state, []).append(correspondent_id)
+                rates_by_id[correspondent_id] = rates
+            user_by_id[correspondent_id] = user_id
+            user_id += 1
+            correspondent_id += 1
+        _insert(User, users)
+        _insert(Correspondent, correspondents)
+
+    return by_state, rates_by_id, user_by_id
+
+
+def generate_service_requests(rng, count, company_ids, correspondents, now, days, batch_size, documents_per_request):
+    by_state, rates_by_id, user_by_id = correspondents
+    pick_location = _choices(rng, LOCATIONS)
+    pick_service_type = _choices(rng, [(name, weight) for name, (weight, _) in SERVICE_TYPES.items()])
+    pick_past_status = _choices(rng, PAST_STATUS_MIX)
+    pick_future_status = _choices(rng, FUTURE_STATUS_MIX)
+    request_id = _next_id(ServiceRequest)
+    document_id = _next_id(Document)
+    total_documents = 0
+
+    for start, size in _batches(count, batch_size):
+        requests, documents = [], []
+        for _ in range(size):
+            city, state, _ = pick_location()
+            service_type = pick_service_type()
+            # 90% do histórico no passado, 10% agendado para os próximos 60 dias
+            if rng.random() < 0.9:
+                date_time = now - timedelta(days=rng.uniform(0, days))
+                status = pick_past_status()
+            else:
+                date_time = now + timedelta(days=rng.uniform(0, 60))
+                status = pick_future_status()
+            date_time = date_time.replace(hour=rng.randint(8, 17), minute=rng.choice([0, 15, 30, 45]),
+                                          second=0, microsecond=0)
+            created_at = date_time - timedelta(days=rng.uniform(2, 30))
+
+            company_value = correspondent_value = profit_margin = correspondent_id = None
+            if status != 'pending_approval':
+                company_value = round(SERVICE_TYPES[service_type][1] * rng.uniform(0.8, 1.3), 2)
+            if status in ('assigned', 'accepted', 'in_progress', 'completed'):
+                candidates = [c for c in rng.sample(by_state.get(state, []), min(5, len(by_state.get(state, []))))
+                              if service_type in rates_by_id[c]]
+                if candidates:
+                    correspondent_id = candidates[0]
+                    correspondent_value = rates_by_id[correspondent_id][service_type]
+                    profit_margin = round(company_value - correspondent_value, 2)
+                else:
+                    status = 'approved'
+
+            updated_at = min(now, date_time + timedelta(days=1)) if status == 'completed' else created_at
+            requests.append({
+                'id': request_id, 'company_id': rng.choice(company_ids),
+                'correspondent_id': correspondent_id, 'service_type': service_type,
+                'location': json.dumps({'city': city, 'state': state}), 'city': city, 'state': state,
+                'date_time': date_time, 'status': status,
+                'company_value': company_value, 'correspondent_value': correspondent_value,
+                'profit_margin': profit_margin,
+                'details': f'{service_type.replace("_", " ").capitalize()} no processo nº '
+                           f'{rng.randint(1000000, 9999999)}-{rng.randint(10, 99)}.{date_time.year}.8.26.0100',
+                'instructions': 'Comparecer com 30 minutos de antecedência.' if correspondent_id else None,
+                'deadline': date_time + timedelta(days=3),
+                'created_at': created_at, 'updated_at': updated_at,
+            })
+
+            if status == 'completed':
+                for _ in range(rng.randint(0, documents_per_request * 2)):
+                    file_size = int(rng.lognormvariate(13, 1.2))
+                    documents.append({
+                        'id': document_id, 'service_request_id': request_id,
+                        'type': rng.choice(DOCUMENT_TYPES),
+                        'file_name': f'documento_{request_id}_{document_id}.pdf',
+                        'file_path': f'/uploads/documents/documento_{request_id}_{document_id}.pdf',
+                        'file_size': file_size, 'uploaded_by': user_by_id[correspondent_id],
+                        'status': 'approved', 'created_at': updated_at, 'updated_at': updated_at,
+                    })
+                    document_id += 1
+            request_id += 1
+
+        _insert(ServiceRequest, requests)
+        _insert(Document, documents)
+        total_documents += len(documents)
+        print(f"  {start + size}/{count} solicitações")
+
+    return total_documents
+
+
+def generate_dataset(scale=1.0, companies=None, correspondents=None, requests=None, seed=42,
+                     days=730, batch_size=BATCH_SIZE, documents_per_request=1):
+    """
+    Gera uma massa de dados sintética e determinística para testes de capacidade
+    """
+    rng = random.Random(seed)
+    # Datas relativas ao início do dia atual: mesma semente gera os mesmos dados no mesmo dia
+    now = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    companies = companies if companies is not None else int(BASE_COMPANIES * scale)
+    correspondents = correspondents if correspondents is not None else int(BASE_CORRESPONDENTS * scale)
+    requests = requests if requests is not None else int(BASE_REQUESTS * scale)
+
+    # Um único hash para todos os usuários gerados (senha: carga123)
+    password_hash = generate_password_hash('carga123')
+
+    started = time.perf_counter()
+    db.create_all()
+
+    print(f"Gerando {companies} empresas...")
+    company_ids = generate_users_and_companies(rng, max(1, companies), password_hash, now, batch_size)
+    print(f"Gerando {correspondents} correspondentes...")
+    correspondent_data = generate_users_and_correspondents(rng, max(1, correspondents), password_hash, now, batch_size)
+    print(f"Gerando {requests} solicitações...")
+    documents = generate_service_requests(rng, requests, company_ids, correspondent_data, now, days,
+                                          batch_size, documents_per_request)
+    print("Indexando a busca textual...")
+    rebuild_search_index(batch_size)
+
+    print(f"Massa de dados gerada em {time.perf_counter() - started:.1f}s "
+          f"({len(company_ids)} empresas, {len(correspondent_data[2])} correspondentes, "
+          f"{requests} solicitações, {documents} documentos).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera uma massa de dados sintética em volume de produção')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help=f'Fator sobre {BASE_COMPANIES} empresas, {BASE_CORRESPONDENTS} correspondentes '
+                             f'e {BASE_REQUESTS} solicitações')
+    parser.add_argument('--companies', type=int)
+    parser.add_argument('--correspondents', type=int)
+    parser.add_argument('--requests', type=int)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--days', type=int, default=730, help='Dias de histórico')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--documents-per-request', type=int, default=1,
+                        help='Média de documentos por solicitação concluída')
+    args = parser.parse_args()
+
+    with create_app().app_context():
+        generate_dataset(scale=args.scale, companies=args.companies, correspondents=args.correspondents,
+                         requests=args.requests, seed=args.seed, days=args.days, batch_size=args.batch_size,
+                         documents_per_request=args.documents_per_request)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+import os
+import time
+
+# Aplicação criada pela fábrica; com preload_app ela é carregada uma vez no
+# processo mestre e os workers já nascem com tudo importado (boot mais rápido)
+wsgi_app = 'src:create_app()'
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+bind = f":{os.getenv('PORT', '8080')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '0'))
+
+
+def pre_fork(server, worker):
+    worker.boot_started = time.monotonic()
+
+
+def post_fork(server, worker):
+    # Conexões abertas pelo mestre durante o preload não podem ser compartilhadas
+    if preload_app:
+        from src.extensions import dispose_engines
+        dispose_engines(worker.app.wsgi())
+
+
+def post_worker_init(worker):
+    # Tempo entre o fork e o worker pronto para atender
+    elapsed = (time.monotonic() - worker.boot_started) * 1000
+    worker.log.info('Worker %s pronto em %.1fms (preload=%s)', worker.pid, elapsed, preload_app)
@@ -1,4 +1,4 @@
-from src import db
+from src import create_app, db
 from src.models.user import User
 from src.models.company import Company
 from src.models.correspondent import Correspondent
@@ -194,7 +194,7 @@ def initialize_database():
         company_id=company1.id,
         correspondent_id=correspondent1.id,
         service_type='audiencia_conciliacao',
-        location=json.dumps({'city': 'São Paulo', 'state': 'SP'}),
+        location_dict={'city': 'São Paulo', 'state': 'SP'},
         date_time=future_date,
         status='assigned',
         company_value=300.00,
@@ -209,7 +209,7 @@ def initialize_database():
     service_request2 = ServiceRequest(
         company_id=company2.id,
         service_type='copia_processos',
-        location=json.dumps({'city': 'Belo Horizonte', 'state': 'MG'}),
+        location_dict={'city': 'Belo Horizonte', 'state': 'MG'},
         date_time=datetime.utcnow() + timedelta(days=3),
         status='pending_approval',
         details='Obter cópia integral do processo nº 9876543-21.2023.8.13.0024',
@@ -235,4 +235,5 @@ def initialize_database():
 
 if __name__ == '__main__':
     create_placeholder_images()
-    initialize_database()
+    with create_app().app_context():
+        initialize_database()
@@ -0,0 +1,141 @@
+from src import create_app, db
+from src.models.service_request import ServiceRequest, normalize_state
+from src.models.document import Document
+from src.models.job import Job
+from src.models.user import User
+from src.models.search_entry import SearchEntry
+from src.models.stored_blob import StoredBlob
+from src.services.search import rebuild_search_index
+from sqlalchemy import inspect, text
+from datetime import datetime
+import json
+
+BATCH_SIZE = 5000
+
+
+def _add_column(table, column):
+    """
+    Adiciona uma coluna à tabela caso ela ainda não exista
+    """
+    existing = {c['name'] for c in inspect(db.engine).get_columns(table.name)}
+    if column.name in existing:
+        return False
+    column_type = column.type.compile(dialect=db.engine.dialect)
+    db.session.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+    db.session.commit()
+    return True
+
+
+def _create_indexes(table):
+    """
+    Cria os índices declarados no modelo que ainda não existem no banco
+    """
+    existing = {i['name'] for i in inspect(db.engine).get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(bind=db.engine)
+
+
+def _create_index(name, *columns):
+    """
+    Cria um índice em uma tabela cujo modelo não o declara
+    """
+    table = columns[0].table
+    if name not in {i['name'] for i in inspect(db.engine).get_indexes(table.name)}:
+        db.Index(name, *columns).create(bind=db.engine)
+
+
+def _require_value(table, column, fallback=None):
+    """
+    Preenche os valores nulos de uma coluna usada na paginação keyset (com a
+    coluna fallback ou o horário atual) e a torna NOT NULL: a comparação do
+    cursor não encontra linhas com NULL
+    """
+    source = f'COALESCE({fallback}, :now)' if fallback else ':now'
+    db.session.execute(text(f'UPDATE {table.name} SET {column.name} = {source} WHERE {column.name} IS NULL'),
+                       {'now': datetime.utcnow()})
+    db.session.commit()
+
+    # O SQLite não altera colunas existentes; o preenchimento acima já basta
+    nullable = {c['name']: c['nullable'] for c in inspect(db.engine).get_columns(table.name)}
+    if nullable.get(column.name) and db.engine.dialect.name == 'mysql':
+        column_type = column.type.compile(dialect=db.engine.dialect)
+        db.session.execute(text(f'ALTER TABLE {table.name} MODIFY {column.name} {column_type} NOT NULL'))
+        db.session.commit()
+
+
+def migrate_keyset_columns():
+    users = User.__table__
+    _require_value(users, users.c.created_at, 'updated_at')
+    _require_value(ServiceRequest.__table__, ServiceRequest.__table__.c.created_at, 'updated_at')
+    _require_value(Document.__table__, Document.__table__.c.created_at, 'updated_at')
+    _require_value(Job.__table__, Job.__table__.c.created_at, 'run_at')
+
+    # Listas de empresas/correspondentes (admin), com e sem filtro de status
+    _create_index('ix_users_created_at_id', users.c.created_at, users.c.id)
+    _create_index('ix_users_status_created_at_id', users.c.status, users.c.created_at, users.c.id)
+
+
+def migrate_service_request_location():
+    """
+    Cria as colunas city/state em service_requests e preenche a partir do JSON de location
+    """
+    table = ServiceRequest.__table__
+    _add_column(table, table.c.city)
+    _add_column(table, table.c.state)
+
+    # Preencher em lotes, percorrendo por id para não carregar a tabela inteira
+    last_id = 0
+    total = 0
+    while True:
+        rows = db.session.execute(
+            text('SELECT id, location FROM service_requests '
+                 'WHERE state IS NULL AND id > :last_id ORDER BY id LIMIT :limit'),
+            {'last_id': last_id, 'limit': BATCH_SIZE}
+        ).fetchall()
+        if not rows:
+            break
+
+        updates = []
+        for row_id, location in rows:
+            try:
+                location = json.loads(location) if location else {}
+            except ValueError:
+                location = {}
+            if not isinstance(location, dict):
+                location = {}
+            updates.append({
+                'row_id': row_id,
+                'city': location.get('city'),
+                'state': normalize_state(location.get('state'))
+            })
+
+        db.session.execute(
+            text('UPDATE service_requests SET city = :city, state = :state WHERE id = :row_id'),
+            updates
+        )
+        db.session.commit()
+
+        last_id = rows[-1][0]
+        total += len(rows)
+
+    print(f"Localização normalizada em {total} solicitações.")
+
+
+def run_migrations():
+    db.create_all()
+    migrate_service_request_location()
+    _add_column(Document.__table__, Document.__table__.c.checksum)
+    _add_column(StoredBlob.__table__, StoredBlob.__table__.c.released_at)
+    _create_indexes(ServiceRequest.__table__)
+    _create_indexes(Document.__table__)
+    migrate_keyset_columns()
+    
+    # Índice de busca textual criado agora: preencher com as solicitações existentes
+    if not db.session.query(SearchEntry.service_request_id).first():
+        print(f"Busca textual indexada para {rebuild_search_index()} solicitações.")
+
+
+if __name__ == '__main__':
+    with create_app().app_context():
+        run_migrations()
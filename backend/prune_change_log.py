@@ -0,0 +1,8 @@
+from src import create_app, db
+from src.services.changes import prune_change_log
+
+if __name__ == '__main__':
+    with create_app().app_context():
+        db.create_all()
+        removed = prune_change_log()
+        print(f"{removed} entradas antigas do change_log removidas.")
@@ -0,0 +1,9 @@
+from src import create_app, db
+from src.models.financial_rollup import FinancialRollup
+from src.services.rollups import rebuild_rollups
+
+if __name__ == '__main__':
+    with create_app().app_context():
+        db.create_all()
+        rebuild_rollups()
+        print(f"Consolidação financeira recalculada: {FinancialRollup.query.count()} linhas.")
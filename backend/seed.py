@@ -1,4 +1,4 @@
-from src import db
+from src import create_app, db
 import json
 from werkzeug.security import generate_password_hash
 from datetime import datetime, timedelta
@@ -168,7 +168,7 @@ def seed_database():
         company_id=company1.id,
         correspondent_id=correspondent1.id,
         service_type='audiencia_conciliacao',
-        location=json.dumps({'city': 'São Paulo', 'state': 'SP'}),
+        location_dict={'city': 'São Paulo', 'state': 'SP'},
         date_time=future_date,
         status='assigned',
         company_value=300.00,
@@ -183,7 +183,7 @@ def seed_database():
     service_request2 = ServiceRequest(
         company_id=company2.id,
         service_type='copia_processos',
-        location=json.dumps({'city': 'Belo Horizonte', 'state': 'MG'}),
+        location_dict={'city': 'Belo Horizonte', 'state': 'MG'},
         date_time=datetime.utcnow() + timedelta(days=3),
         status='pending_approval',
         details='Obter cópia integral do processo nº 9876543-21.2023.8.13.0024',
@@ -208,4 +208,5 @@ def seed_database():
     print("Banco de dados populado com sucesso!")
 
 if __name__ == '__main__':
-    seed_database()
+    with create_app().app_context():
+        seed_database()
@@ -0,0 +1,7 @@
+from src import create_app
+from src.services.uploads import sweep_uploads
+
+if __name__ == '__main__':
+    with create_app().app_context():
+        removed = sweep_uploads()
+        print(f"{removed} envios abandonados removidos.")
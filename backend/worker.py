@@ -0,0 +1,19 @@
+from src import create_app, db
+from src.services.jobs import Worker
+import argparse
+import logging
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Executa as tarefas em segundo plano da fila do banco')
+    parser.add_argument('--processes', type=int, help='Processos do pool (padrão: JOB_WORKER_PROCESSES)')
+    parser.add_argument('--poll-interval', type=float, help='Segundos entre consultas à fila vazia')
+    parser.add_argument('--visibility-timeout', type=int, help='Segundos de reserva de cada tarefa')
+    parser.add_argument('--burst', action='store_true', help='Encerrar quando a fila estiver vazia')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+
+    with create_app().app_context():
+        db.create_all()
+        Worker(processes=args.processes, poll_interval=args.poll_interval,
+               visibility_timeout=args.visibility_timeout).run(burst=args.burst)